@@ -0,0 +1,113 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from ..models import CustomUser
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Uses double hashing on a single blake2b digest, so each lookup costs one
+    hash computation regardless of the number of probes.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class AvailabilityFilter:
+    """
+    Bloom filter of the lowercase usernames and emails already taken.
+
+    A miss means the value is definitely free and is answered without touching
+    the database; a hit only means "probably taken" and falls through to an
+    exact lookup on the unique index. The filter is built from the database on
+    first use, extended as users are saved, and rebuilt every
+    ``AVAILABILITY_FILTER_REBUILD_INTERVAL`` seconds so values taken through
+    other workers are picked up.
+    """
+
+    FIELDS = ("username", "email")
+
+    def __init__(self):
+        self._filter = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(field, value):
+        return f"{field}:{value.strip().lower()}"
+
+    def _expired(self):
+        age = time.monotonic() - self._built_at
+        return age > settings.AVAILABILITY_FILTER_REBUILD_INTERVAL
+
+    def rebuild(self):
+        users = CustomUser.objects.values_list(*self.FIELDS)
+        capacity = max(users.count() * 2, settings.AVAILABILITY_FILTER_MIN_CAPACITY)
+        bloom = BloomFilter(capacity, settings.AVAILABILITY_FILTER_ERROR_RATE)
+        for row in users.iterator(chunk_size=2000):
+            for field, value in zip(self.FIELDS, row):
+                if value:
+                    bloom.add(self._key(field, value))
+        self._filter = bloom
+        self._built_at = time.monotonic()
+
+    def _get_filter(self):
+        if self._filter is None or self._expired():
+            with self._lock:
+                if self._filter is None or self._expired():
+                    self.rebuild()
+        return self._filter
+
+    def add_user(self, user):
+        """
+        Records the username and email of a saved user. No-op until the
+        filter has been built, since the build reads them from the database.
+        """
+        bloom = self._filter
+        if bloom is None:
+            return
+        for field in self.FIELDS:
+            value = getattr(user, field)
+            if value:
+                bloom.add(self._key(field, value))
+
+    def is_available(self, field, value):
+        if self._key(field, value) not in self._get_filter():
+            return True
+        # Stored usernames and emails keep the case they were signed up with;
+        # comparing Lower(field) uses the functional indexes on both.
+        return not (
+            CustomUser.objects.annotate(lowered=Lower(field))
+            .filter(lowered=value.strip().lower())
+            .exists()
+        )
+
+
+availability_filter = AvailabilityFilter()
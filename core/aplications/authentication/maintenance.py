@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from core.maintenance import delete_in_batches, maintenance_task
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .models import CodesVerification, Reset_password
+
+
+@maintenance_task(interval=3600)
+def purge_expired_password_resets():
+    return delete_in_batches(Reset_password.objects.filter(expired_at__lt=timezone.now()))
+
+
+@maintenance_task(interval=900)
+def purge_used_codes():
+    # Un código validado se conserva un tiempo para poder completar el reset.
+    cutoff = timezone.now() - timedelta(seconds=settings.USED_CODE_RETENTION)
+    return delete_in_batches(
+        CodesVerification.objects.filter(
+            Q(used_at__lt=cutoff) | Q(is_used=True, used_at__isnull=True)
+        )
+    )
+
+
+@maintenance_task(interval=3600)
+def purge_expired_tokens():
+    # Los BlacklistedToken asociados se eliminan en cascada.
+    return delete_in_batches(OutstandingToken.objects.filter(expires_at__lt=timezone.now()))
@@ -0,0 +1,22 @@
+from core.cache import cache_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra los aciertos (en memoria del proceso y en Redis) y fallos de "
+        "caché acumulados por namespace."
+    )
+
+    def handle(self, *args, **options):
+        for name, row in cache_stats().items():
+            self.stdout.write(
+                f"{name}: near_hits={row['near_hits']} hits={row['hits']} "
+                f"misses={row['misses']} stale={row['stale']} early={row['early']} "
+                f"near_evictions={row['near_evictions']} "
+                f"hit_ratio={self._ratio(row['hit_ratio'])} "
+                f"near_hit_ratio={self._ratio(row['near_hit_ratio'])}"
+            )
+
+    def _ratio(self, value):
+        return "-" if value is None else f"{value:.2%}"
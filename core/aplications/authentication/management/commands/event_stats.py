@@ -0,0 +1,17 @@
+from core.events import event_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra las conexiones abiertas a los streams de eventos y los "
+        "contadores de los procesos que han informado recientemente."
+    )
+
+    def handle(self, *args, **options):
+        stats = event_stats()
+        self.stdout.write(
+            f"processes={stats['processes']} connections={stats['connections']} "
+            f"opened={stats['opened']} closed={stats['closed']} "
+            f"dropped={stats['dropped']} delivered={stats['delivered']}"
+        )
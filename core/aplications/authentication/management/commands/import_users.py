@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from core.workers import init_django_worker
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from ...models import CustomUser
+
+FIELDS = ("email", "username", "first_name", "last_name", "password")
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa usuarios desde un fichero CSV o JSONL. Las contraseñas se "
+        "hashean en paralelo y los usuarios se insertan por lotes con bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero .csv o .jsonl con los usuarios")
+        parser.add_argument("--format", choices=("csv", "jsonl"), default=None)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Procesos dedicados a hashear contraseñas",
+        )
+        parser.add_argument(
+            "--report",
+            default=None,
+            help="Fichero CSV donde escribir las filas omitidas y el motivo",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+        fmt = options["format"] or path.suffix.lstrip(".").lower()
+        if fmt not in ("csv", "jsonl"):
+            raise CommandError("Use --format to choose between csv and jsonl")
+        if options["batch_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--batch-size and --workers must be positive")
+
+        report_file = open(options["report"], "w", newline="") if options["report"] else None
+        report = csv.writer(report_file) if report_file else None
+        if report:
+            report.writerow(("line", "email", "username", "reason"))
+
+        self.processed = self.created = self.skipped = 0
+        started = time.monotonic()
+        try:
+            with path.open(newline="") as handle, ProcessPoolExecutor(
+                max_workers=options["workers"],
+                initializer=init_django_worker,
+                initargs=(os.environ["DJANGO_SETTINGS_MODULE"],),
+            ) as pool:
+                rows = self._read_rows(handle, fmt)
+                while batch := list(islice(rows, options["batch_size"])):
+                    self._import_batch(batch, pool, options["workers"], report)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"{self.processed} rows | {self.created} created | "
+                        f"{self.skipped} skipped | {self.processed / elapsed:.0f} rows/s"
+                    )
+        finally:
+            if report_file:
+                report_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.created} users, skipped {self.skipped} "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def _read_rows(self, handle, fmt):
+        """
+        Yields ``(line_number, row)`` pairs without loading the whole file.
+        ``row`` is ``None`` for JSONL lines that are not a valid user object.
+        """
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(handle, start=1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                # Valid JSON that is not an object of strings is rejected too.
+                if not isinstance(row, dict) or not all(
+                    isinstance(row.get(field), (str, type(None))) for field in FIELDS
+                ):
+                    row = None
+                yield line_number, row
+
+    def _import_batch(self, batch, pool, workers, report):
+        self.processed += len(batch)
+        accepted = []
+        emails, usernames = set(), set()
+
+        for line_number, row in batch:
+            if row is None:
+                row = {"email": "", "username": None}
+                self._accept_or_skip(accepted, line_number, row, "invalid row", report)
+                continue
+            row = {field: (row.get(field) or "").strip() for field in FIELDS}
+            row["email"] = row["email"].lower()
+            row["username"] = row["username"].lower() or None
+            if not row["email"]:
+                reason = "missing email"
+            elif row["email"] in emails:
+                reason = "duplicate email in file"
+            elif row["username"] and row["username"] in usernames:
+                reason = "duplicate username in file"
+            else:
+                reason = None
+                emails.add(row["email"])
+                if row["username"]:
+                    usernames.add(row["username"])
+            self._accept_or_skip(accepted, line_number, row, reason, report)
+
+        # Earlier batches are already committed, so this also catches
+        # duplicates spread across the file without keeping a global set.
+        # Signup lowercases emails and usernames, but accounts created with
+        # create_user()/createsuperuser only have the domain normalised, so
+        # existing values are compared case-insensitively.
+        taken_emails = set(
+            CustomUser.objects.annotate(lower=Lower("email"))
+            .filter(lower__in=emails)
+            .values_list("lower", flat=True)
+        )
+        taken_usernames = set(
+            CustomUser.objects.annotate(lower=Lower("username"))
+            .filter(lower__in=usernames)
+            .values_list("lower", flat=True)
+        )
+        candidates, accepted = accepted, []
+        for line_number, row in candidates:
+            if row["email"] in taken_emails:
+                reason = "email already exists"
+            elif row["username"] in taken_usernames:
+                reason = "username already exists"
+            else:
+                reason = None
+            self._accept_or_skip(accepted, line_number, row, reason, report)
+
+        if not accepted:
+            return
+        passwords = [row["password"] or None for _, row in accepted]
+        hashes = pool.map(
+            make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))
+        )
+        users = [
+            CustomUser(
+                email=row["email"],
+                username=row["username"],
+                first_name=row["first_name"],
+                last_name=row["last_name"],
+                password=password_hash,
+            )
+            for (_, row), password_hash in zip(accepted, hashes)
+        ]
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users, ignore_conflicts=True)
+            # ignore_conflicts drops rows taken concurrently without telling
+            # which; every password hash is salted, so the ones found are ours.
+            created = set(
+                CustomUser.objects.filter(
+                    email__in=[user.email for user in users],
+                    password__in=[user.password for user in users],
+                ).values_list("email", flat=True)
+            )
+        self.created += len(created)
+        for line_number, row in accepted:
+            if row["email"] not in created:
+                self._accept_or_skip([], line_number, row, "conflict while inserting", report)
+
+    def _accept_or_skip(self, accepted, line_number, row, reason, report):
+        if reason is None:
+            accepted.append((line_number, row))
+            return
+        self.skipped += 1
+        if report:
+            report.writerow((line_number, row["email"], row["username"] or "", reason))
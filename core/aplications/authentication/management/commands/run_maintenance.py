@@ -0,0 +1,66 @@
+import time
+
+from core.maintenance import get_tasks
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta periódicamente las tareas de mantenimiento registradas "
+        "(limpieza de tokens, códigos y filas caducadas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Ejecuta cada tarea una vez y termina",
+        )
+        parser.add_argument(
+            "--task",
+            action="append",
+            dest="tasks",
+            default=None,
+            help="Limita la ejecución a la tarea indicada (repetible)",
+        )
+
+    def handle(self, *args, **options):
+        tasks = get_tasks()
+        if options["tasks"]:
+            unknown = set(options["tasks"]) - {task.name for task in tasks}
+            if unknown:
+                raise CommandError(f"Unknown tasks: {', '.join(sorted(unknown))}")
+            tasks = [task for task in tasks if task.name in options["tasks"]]
+        if not tasks:
+            raise CommandError("No maintenance tasks registered")
+
+        if options["once"]:
+            for task in tasks:
+                self._run(task)
+            return
+
+        next_run = {task.name: time.monotonic() for task in tasks}
+        self.stdout.write(f"Scheduling {len(tasks)} maintenance tasks")
+        try:
+            while True:
+                now = time.monotonic()
+                for task in tasks:
+                    if next_run[task.name] <= now:
+                        self._run(task)
+                        next_run[task.name] = time.monotonic() + task.interval
+                time.sleep(max(0.0, min(next_run.values()) - time.monotonic()))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping maintenance runner")
+
+    def _run(self, task):
+        close_old_connections()
+        started = time.monotonic()
+        try:
+            removed = task.func()
+        except Exception as exc:  # una tarea fallida no detiene al resto
+            self.stderr.write(f"{task.name}: failed: {exc!r}")
+            return
+        self.stdout.write(
+            f"{task.name}: removed {removed} in {time.monotonic() - started:.2f}s"
+        )
@@ -10,4 +10,6 @@ CHANGED_PASSWORD_ERROR = {'Message':'Something went wrong'}
 
 PASSWORD_MUST_BE_SAME = {"Message":"The new password must be the same as the old one"}
 
-NOT_FOUND_USER = {"Message":"User not found"}
\ No newline at end of file
+NOT_FOUND_USER = {"Message":"User not found"}
+
+AVAILABILITY_PARAMS_REQUIRED_ERROR = {"Message":"username or email is required"}
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_customuser_lower_indexes'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesverification',
+            name='used_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reset_password',
+            name='expired_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        # OutstandingToken pertenece a simplejwt: el índice para purgar tokens
+        # caducados se crea aquí.
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS "token_blacklist_outstandingtoken_expires_at_idx" '
+            'ON "token_blacklist_outstandingtoken" ("expires_at");',
+            reverse_sql='DROP INDEX IF EXISTS "token_blacklist_outstandingtoken_expires_at_idx";',
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_FIELDS = ("username", "first_name", "last_name")
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Los índices GIN solo existen en Postgres; SQLite usa la búsqueda por icontains.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "authentication_customuser_{field}_trgm" '
+            f'ON "authentication_customuser" USING gin ("{field}" gin_trgm_ops);'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS "authentication_customuser_{field}_trgm";'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0013_maintenance_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:21
+
+import aplications.authentication.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0015_customuser_profile_photo_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', aplications.authentication.models.CustomUserManager()),
+            ],
+        ),
+    ]
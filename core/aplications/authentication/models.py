@@ -1,8 +1,18 @@
-from django.contrib.auth.models import AbstractUser
+from core.querycache import CachedManagerMixin, CachedQuerySet
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
+class CustomUserManager(CachedManagerMixin, UserManager.from_queryset(CachedQuerySet)):
+    """
+    ``UserManager`` con ``.cache()`` (ver ``core.querycache``).
+    """
+
+    use_in_migrations = True
+
+
 class CustomUser(AbstractUser):
     username = models.CharField(max_length=100, unique=True, null=True, blank=True)
     first_name = models.CharField(max_length=50, null=False)
@@ -13,6 +23,12 @@ class CustomUser(AbstractUser):
     phone = models.CharField(max_length=20, null=True, blank=True)
     house_number = models.CharField(max_length=10, null=True, blank=True)
     profile_photo = models.ImageField(upload_to="profile_photos", null=True, blank=True)
+    profile_photo_width = models.PositiveIntegerField(null=True, editable=False)
+    profile_photo_height = models.PositiveIntegerField(null=True, editable=False)
+    profile_photo_blurhash = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+    profile_photo_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_checked = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
     following = models.ManyToManyField(
@@ -22,10 +38,20 @@ class CustomUser(AbstractUser):
         related_name="followers",
     )
 
+    objects = CustomUserManager()
+
     USERNAME_FIELD = "email"
 
     REQUIRED_FIELDS = ["username", "password"]
 
+    class Meta(AbstractUser.Meta):
+        # Emails y usernames conservan sus mayúsculas: las búsquedas que no
+        # las distinguen comparan Lower(...).
+        indexes = [
+            models.Index(Lower("email"), name="customuser_email_lower_idx"),
+            models.Index(Lower("username"), name="customuser_username_lower_idx"),
+        ]
+
     def __str__(self):
         return f"{self.get_full_name()}"
 
@@ -33,7 +59,7 @@ class CustomUser(AbstractUser):
 class Reset_password(models.Model):
     user_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     token = models.CharField(max_length=10, unique=True)
-    expired_at = models.DateTimeField()
+    expired_at = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return f"{self.user_id}"
@@ -43,5 +69,7 @@ class CodesVerification(models.Model):
     changePasswordCode = models.CharField(max_length=10, unique=True)
     user = models.ForeignKey(CustomUser, null=True, on_delete=models.SET_NULL)
     is_used = models.BooleanField(default=False)
+    used_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
     def __str__(self):
         return f"{self.user}"
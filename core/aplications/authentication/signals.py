@@ -0,0 +1,16 @@
+from aplications.media.helpers.pipeline import track_image_field
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .helpers.bloom import availability_filter
+from .models import CustomUser
+
+track_image_field(CustomUser, "profile_photo")
+
+
+@receiver(post_save, sender=CustomUser)
+def track_taken_identifiers(sender, instance, **kwargs):
+    """
+    Keeps the availability filter in sync with signups and profile updates.
+    """
+    availability_filter.add_user(instance)
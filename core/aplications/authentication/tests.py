@@ -1,7 +1,26 @@
+import asyncio
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from core.cache import CacheNamespace, apply_invalidation, cache_stats, clear_near_caches
+from core.events import Subscription, connection_count, event_stats, publish
+from core.prefix_index import PrefixIndex
+from core.throttling import LoginRateThrottle
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import CodesVerification, CustomUser, Reset_password
@@ -12,6 +31,7 @@ from .models import CodesVerification, CustomUser, Reset_password
 class AuthenticationTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()  # El fallback de throttling guarda el historial en la caché
         self.client = APIClient()
         self.user = CustomUser.objects.create_user(
             username="testuser",
@@ -60,6 +80,235 @@ class AuthenticationTestCase(APITestCase):
             "invalid credentials",
         )
 
+    def test_login_throttled_per_ip(self):
+        # Without REDIS_URL the login throttle falls back to the local cache
+        with mock.patch.dict(LoginRateThrottle.THROTTLE_RATES, {"login": "2/min"}):
+            for _ in range(2):
+                response = self._login_user(password="wrongpassword")
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self._login_user()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_availability_check(self):
+        url = reverse("availability")
+        response = self.client.get(
+            url, {"username": "TestUser", "email": "free@example.com"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["username"]["available"])
+        self.assertTrue(response.data["email"]["available"])
+
+        # Definite misses in the Bloom filter never reach the database
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"username": "someone-new"})
+        self.assertTrue(response.data["username"]["available"])
+
+        # New signups are added to the filter right away
+        CustomUser.objects.create_user(
+            username="someone-new", email="new@example.com", password="x"
+        )
+        response = self.client.get(url, {"username": "someone-new"})
+        self.assertFalse(response.data["username"]["available"])
+
+        # Names stored with capitals are taken whatever the case of the query
+        CustomUser.objects.create_user(
+            username="MixedCase", email="Mixed@Example.com", password="x"
+        )
+        response = self.client.get(
+            url, {"username": "mixedcase", "email": "MIXED@example.com"}
+        )
+        self.assertFalse(response.data["username"]["available"])
+        self.assertFalse(response.data["email"]["available"])
+
+    def test_import_users_skips_duplicates(self):
+        # createsuperuser solo normaliza el dominio del email.
+        CustomUser.objects.create_user(
+            username="Admin", email="Admin@Example.com", password="x"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "users.csv"
+            source.write_text(
+                "email,username,first_name,last_name,password\n"
+                "new1@example.com,New1,New,One,secret123\n"
+                "TestUser@example.com,other,Dup,Email,secret123\n"
+                "new2@example.com,new1,Dup,Username,secret123\n"
+                "new3@example.com,new3,New,Three,\n"
+                "admin@example.com,admin2,Dup,Email,secret123\n"
+                "new4@example.com,admin,Dup,Username,secret123\n"
+            )
+            report = Path(tmp) / "report.csv"
+            out = StringIO()
+            call_command(
+                "import_users",
+                str(source),
+                workers=1,
+                batch_size=2,
+                report=str(report),
+                stdout=out,
+            )
+            skipped = report.read_text().splitlines()
+
+        self.assertEqual(len(skipped), 5)  # cabecera + 4 duplicados
+        self.assertIn("Imported 2 users, skipped 4", out.getvalue())
+        self.assertFalse(CustomUser.objects.filter(email="new4@example.com").exists())
+        imported = CustomUser.objects.get(email="new1@example.com")
+        self.assertEqual(imported.username, "new1")
+        self.assertTrue(imported.check_password("secret123"))
+        self.assertFalse(
+            CustomUser.objects.get(email="new3@example.com").has_usable_password()
+        )
+
+    def test_import_users_rejects_invalid_jsonl_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "users.jsonl"
+            source.write_text(
+                '{"email": "json1@example.com", "username": "json1"}\n'
+                '["not", "an", "object"]\n'
+                "42\n"
+                "{broken\n"
+                '{"email": 7, "username": "number"}\n'
+            )
+            report = Path(tmp) / "report.csv"
+            out = StringIO()
+            call_command(
+                "import_users", str(source), workers=1, report=str(report), stdout=out
+            )
+            skipped = report.read_text().splitlines()[1:]
+
+        self.assertIn("Imported 1 users, skipped 4", out.getvalue())
+        self.assertEqual(
+            [line.split(",")[0] for line in skipped if line.endswith("invalid row")],
+            ["2", "3", "4", "5"],
+        )
+        self.assertTrue(CustomUser.objects.filter(email="json1@example.com").exists())
+
+    def test_run_maintenance_purges_expired_rows(self):
+        now = timezone.now()
+        Reset_password.objects.create(
+            user_id=self.user, token="old", expired_at=now - timedelta(days=1)
+        )
+        Reset_password.objects.create(
+            user_id=self.user, token="new", expired_at=now + timedelta(days=1)
+        )
+        CodesVerification.objects.create(
+            changePasswordCode="1111",
+            user=self.user,
+            is_used=True,
+            used_at=now - timedelta(days=1),
+        )
+        CodesVerification.objects.create(
+            changePasswordCode="2222", user=self.user, is_used=True, used_at=now
+        )
+        CodesVerification.objects.create(changePasswordCode="3333", user=self.user)
+        expired = OutstandingToken.objects.create(
+            jti="expired", token="t", expires_at=now - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=expired)
+        OutstandingToken.objects.create(
+            jti="valid", token="t", expires_at=now + timedelta(days=1)
+        )
+
+        out = StringIO()
+        call_command("run_maintenance", once=True, stdout=out)
+
+        self.assertEqual(
+            list(Reset_password.objects.values_list("token", flat=True)), ["new"]
+        )
+        self.assertEqual(
+            sorted(CodesVerification.objects.values_list("changePasswordCode", flat=True)),
+            ["2222", "3333"],
+        )
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)), ["valid"]
+        )
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertIn("authentication.purge_expired_tokens: removed 1", out.getvalue())
+
+    def test_cache_namespace_versions_and_stats(self):
+        namespace = CacheNamespace("test-namespace", timeout=60)
+        namespace.set_many({1: "a", 2: "b"}, group="g")
+        self.assertEqual(namespace.get_many([1, 2, 3], group="g"), {1: "a", 2: "b"})
+        version = namespace.version("g")
+        namespace.invalidate("g")
+        self.assertNotEqual(namespace.version("g"), version)
+        self.assertEqual(namespace.get_many([1, 2], group="g"), {})
+
+        # Solo el primero de varios lectores simultáneos recalcula el valor.
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            threading.Event().wait(0.2)
+            return "fresh"
+
+        results = []
+        worker = threading.Thread(
+            target=lambda: results.append(namespace.get_or_set("key", compute))
+        )
+        worker.start()
+        started.wait(1)
+        results.append(namespace.get_or_set("key", compute))
+        worker.join()
+        self.assertEqual(results, ["fresh", "fresh"])
+        self.assertEqual(len(calls), 1)
+
+        out = StringIO()
+        call_command("cache_stats", stdout=out)
+        self.assertIn("test-namespace: near_hits=0 hits=2 misses=5", out.getvalue())
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "shared",
+            },
+            "local": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "process",
+            },
+        }
+    )
+    def test_cache_writes_during_redis_outage_are_flushed_on_recovery(self):
+        # "default" hace de Redis y "local" de la caché del proceso.
+        available = [True]
+        namespace = CacheNamespace("test-outage", timeout=60)
+        untouched = CacheNamespace("test-outage-untouched", timeout=60)
+        with mock.patch("core.cache._uses_redis", return_value=True), mock.patch(
+            "core.cache.redis_available", side_effect=lambda: available[0]
+        ):
+            namespace.set("a", 1, group="g")
+            untouched.set("b", 2)
+            available[0] = False
+            namespace.invalidate("g")  # Solo llega a la caché local
+            self.assertIsNone(namespace.get("a", group="g"))
+
+            available[0] = True
+            self.assertIsNone(namespace.get("a", group="g"))
+            self.assertEqual(untouched.get("b"), 2)
+
+        with self.assertRaises(ValueError):
+            CacheNamespace("test-outlives-version", timeout=30 * 24 * 3600)
+
+    def test_near_cache_tier(self):
+        namespace = CacheNamespace(
+            "test-near", timeout=60, near_timeout=30, near_max_entries=3
+        )
+        namespace.set("a", 1, group="g")
+        cache.clear()  # Lo que queda está solo en la memoria del proceso
+        self.assertEqual(namespace.get("a", group="g"), 1)
+
+        # Un mensaje de otro proceso invalida el grupo: se vuelve a leer la
+        # versión compartida, que ya no es la que tenía en memoria.
+        apply_invalidation({"namespace": "test-near", "groups": ["g"]})
+        self.assertIsNone(namespace.get("a", group="g"))
+
+        namespace.set_many({"b": 2, "c": 3, "d": 4})
+        stats = cache_stats()["test-near"]
+        self.assertEqual(stats["near_hits"], 1)
+        self.assertGreater(stats["near_evictions"], 0)
+
     def sign_up(self):
         # Test the signup functionality
         url = reverse("signup")
@@ -74,6 +323,103 @@ class AuthenticationTestCase(APITestCase):
         self.assertIn("user", response.data)
         self.assertIn("message", response.data)
 
+    def test_query_cache(self):
+        clear_near_caches()
+        # Da por confirmadas las escrituras de setUp.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        users = CustomUser.objects.cache()
+        # Solo se guarda al confirmar la transacción.
+        users.get(username="testuser")
+        with self.assertNumQueries(1):
+            users.get(username="testuser")
+        with self.captureOnCommitCallbacks(execute=True):
+            users.get(username="testuser")
+        with self.assertNumQueries(0):
+            self.assertEqual(users.get(username="testuser").pk, self.user.pk)
+            users.get(pk=str(self.user.pk)).first_name = "modificado"
+            self.assertEqual(users.get(pk=self.user.pk).first_name, "")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = "renamed"
+            self.user.save()
+        with self.assertRaises(CustomUser.DoesNotExist):
+            users.get(username="testuser")
+        self.assertEqual(users.get(username="renamed").pk, self.user.pk)
+
+        def unchecked():
+            return list(users.filter(is_checked=False).values_list("username", flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(unchecked(), ["renamed"])
+        with self.assertNumQueries(0):
+            self.assertEqual(unchecked(), ["renamed"])
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(is_checked=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(unchecked(), [])
+        # Las consultas con joins no se guardan.
+        with self.captureOnCommitCallbacks(execute=True):
+            list(users.filter(followers__username="renamed"))
+        with self.assertNumQueries(1):
+            list(users.filter(followers__username="renamed"))
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    async def test_event_broker_drops_slow_subscribers(self):
+        connections = connection_count()
+        fast = Subscription(["comments:1"])
+        slow = Subscription(["comments:1", "comments:2"])
+        self.assertEqual(connection_count(), connections + 2)
+        for i in range(3):
+            publish("comments:1", {"type": "comment", "id": i})
+            self.assertEqual((await fast.get(1))["id"], i)
+        # La tercera no cabía: la cola queda solo con el aviso y se cierra.
+        self.assertTrue(slow.dropped)
+        self.assertEqual(await slow.get(1), {"type": "overflow"})
+        self.assertEqual(connection_count(), connections + 1)
+        publish("comments:2", {"type": "comment", "id": 3})
+        await asyncio.sleep(0)
+        self.assertTrue(slow.queue.empty())
+
+        fast.close()
+        stats = event_stats()
+        self.assertEqual(stats["connections"], connections)
+        self.assertGreaterEqual(stats["dropped"], 1)
+
+    def test_prefix_index_keeps_top_keys_per_prefix(self):
+        index = PrefixIndex(
+            [
+                ("Django", 5, "django", "framework"),
+                ("djangocon", 3, "djangocon", "event"),
+                ("djangogirls", 1, "djangogirls"),
+                ("dart", 4, "dart"),
+            ],
+            max_size=5,
+            top_k=3,
+            depth=2,
+        )
+        self.assertEqual(index.search("d"), ["django", "dart", "djangocon"])
+        self.assertEqual(index.search("DJANGO", limit=10), ["django", "djangocon", "djangogirls"])
+        self.assertEqual(index.search("dj", group="event"), ["djangocon"])
+
+        # Subir un peso lo recoloca; bajarlo o quitarlo rellena las tablas.
+        index.upsert("djangogirls", 6, "djangogirls")
+        self.assertEqual(index.search("d"), ["djangogirls", "django", "dart"])
+        index.upsert("djangogirls", 0, "djangogirls")
+        self.assertEqual(index.search("d"), ["django", "dart", "djangocon"])
+        index.upsert("dart", 4, "dart", "language")
+        self.assertEqual(index.search("da", group="language"), ["dart"])
+
+        # Lleno: entra desalojando a la más ligera, si pesa más que ella.
+        index.upsert("deno", 2, "deno")
+        index.upsert("dash", 0, "dash")
+        self.assertIsNone(index.get("dash"))
+        index.upsert("dask", 7, "dask")
+        self.assertIsNone(index.get("djangogirls"))
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.search("d", limit=10), ["dask", "django", "dart"])
+        self.assertEqual(index.search("djangog"), [])
+
     def test_logout(self):
         # Test the logout functionality
         response = self._login_user()
@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
 
+    AvailabilityView,
     LoginView,
     LogoutView,
     ResetPasswordView,
@@ -15,6 +16,7 @@ urlpatterns = [
     path("login/", LoginView.as_view(), name="login"),
     path("logout/", LogoutView.as_view(), name="logout"),
     path("signup/", SignUpView.as_view(), name="signup"),
+    path("availability/", AvailabilityView.as_view(), name="availability"),
     path("send-code/", SendCodeResetPassword.as_view(), name="send-code"),
     path("validate-code/", ValidationCodeView.as_view(), name="validate-code"),
     path("reset-password/", ResetPasswordView.as_view(), name="reset-password"),
@@ -1,19 +1,26 @@
-from datetime import datetime
-
+from core.throttling import (
+    AvailabilityRateThrottle,
+    LoginRateThrottle,
+    SendCodeRateThrottle,
+)
 from django.contrib.auth import authenticate
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated,AllowAny
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from settings.base import EMAIL_HOST_USER
 
+from .helpers.bloom import availability_filter
 from .helpers.content_emails import get_email_content
 from .helpers.randCodes import generatedCode
 from .messages.responses_error import (
+    AVAILABILITY_PARAMS_REQUIRED_ERROR,
     CHANGED_PASSWORD_ERROR,
     CODER_VERIFICATION_ERROR,
     LOGIN_CREDENTIALS_ERROR,
@@ -46,6 +53,7 @@ from .serializers import (
 
 class LoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [*api_settings.DEFAULT_THROTTLE_CLASSES, LoginRateThrottle]
 
     @swagger_auto_schema(
         operation_summary="Login",
@@ -134,6 +142,63 @@ class SignUpView(generics.GenericAPIView):
         )
 
 
+class AvailabilityView(generics.GenericAPIView):
+    """
+    Vista para comprobar si un username o email están libres mientras el usuario
+    rellena el formulario de registro.
+    """
+
+    permission_classes = [AllowAny]
+    throttle_classes = [AvailabilityRateThrottle]
+
+    @swagger_auto_schema(
+        operation_summary="Comprobar disponibilidad",
+        operation_description="Indica si el username y/o el email indicados están disponibles para registrarse.",
+        manual_parameters=[
+            openapi.Parameter(
+                "username",
+                openapi.IN_QUERY,
+                description="Username a comprobar",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "email",
+                openapi.IN_QUERY,
+                description="Email a comprobar",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Disponibilidad",
+                examples={
+                    "application/json": {
+                        "username": {"value": "rootnet", "available": True}
+                    }
+                },
+            ),
+            400: openapi.Response(description="Faltan parámetros"),
+        },
+    )
+    def get(self, request):
+        """
+        Los valores que no están en el filtro Bloom se responden sin consultar la base de datos.
+        """
+        data = {}
+        for field in availability_filter.FIELDS:
+            value = request.query_params.get(field, "").strip()
+            if value:
+                data[field] = {
+                    "value": value.lower(),
+                    "available": availability_filter.is_available(field, value),
+                }
+        if not data:
+            return Response(
+                AVAILABILITY_PARAMS_REQUIRED_ERROR, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class LogoutView(generics.GenericAPIView):
     
 
@@ -210,6 +275,7 @@ class SendCodeResetPassword(generics.GenericAPIView):
     Vista para enviar un código de recuperación de contraseña al correo del usuario.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [*api_settings.DEFAULT_THROTTLE_CLASSES, SendCodeRateThrottle]
 
     @swagger_auto_schema(
         operation_summary="Enviar código de recuperación",
@@ -287,7 +353,7 @@ class ValidationCodeView(generics.GenericAPIView):
             )
             # Marca el código como validado (usado)
             code_database.is_used = True
-            code_database.dateUsed = datetime.now()
+            code_database.used_at = timezone.now()
             code_database.save()
 
             serializerValidate = ValidateCodeSerializer(code_database)
@@ -0,0 +1,36 @@
+"""
+Nombres de los ficheros direccionados por contenido.
+
+Un fichero se guarda como ``blobs/ab/cd/<sha256><ext>``: los dos primeros
+niveles repartan los ficheros en 65.536 directorios para que ninguno crezca
+demasiado. Sin dependencias de Django, para usarlo desde los procesos del
+pipeline de imágenes.
+"""
+
+import hashlib
+import os
+
+BLOB_PREFIX = "blobs"
+BLOCK_SIZE = 64 * 1024
+EXTENSION_ALIASES = {".jpeg": ".jpg", ".jpe": ".jpg"}
+
+
+def normalize_extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return EXTENSION_ALIASES.get(extension, extension)
+
+
+def blob_name(digest, extension):
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f"{BLOB_PREFIX}/")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
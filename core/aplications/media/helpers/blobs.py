@@ -0,0 +1,92 @@
+"""
+Contadores de referencias de los ficheros direccionados por contenido.
+
+Cada campo de imagen registrado en el pipeline suma una referencia al blob al
+que apunta y la resta al cambiar de fichero o al borrarse la fila. Los blobs
+sin referencias se borran (fichero y variantes) pasado ``MEDIA_BLOB_GRACE``
+desde la última vez que se subió su contenido, para no llevarse uno que una
+petición en curso acaba de guardar y aún no ha asignado.
+"""
+
+import glob
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import MediaBlob
+from .addressing import is_blob_name
+
+
+def touch_blob(digest, name, size):
+    """
+    Registra una subida del contenido ``digest`` y devuelve el nombre con el
+    que está guardado (el del primer fichero con ese contenido).
+    """
+    with transaction.atomic():
+        if not MediaBlob.objects.filter(sha256=digest).update(touched_at=timezone.now()):
+            MediaBlob.objects.bulk_create(
+                [MediaBlob(sha256=digest, name=name, size=size)], ignore_conflicts=True
+            )
+        return MediaBlob.objects.values_list("name", flat=True).get(sha256=digest)
+
+
+def _add_reference(name, delta):
+    if is_blob_name(name):
+        MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + delta)
+
+
+def acquire(name):
+    _add_reference(name, 1)
+
+
+def release(name):
+    _add_reference(name, -1)
+
+
+def cached_metadata(name):
+    """
+    Resultado del pipeline para un contenido ya procesado, o ``None``.
+    """
+    if not is_blob_name(name):
+        return None
+    metadata = MediaBlob.objects.filter(name=name).values_list("metadata", flat=True).first()
+    return metadata or None
+
+
+def remember_metadata(names, metadata):
+    MediaBlob.objects.filter(name__in=[name for name in names if is_blob_name(name)]).update(
+        metadata=metadata
+    )
+
+
+def _delete_files(name):
+    default_storage.delete(name)
+    stem = os.path.splitext(default_storage.path(name))[0]
+    for variant in glob.glob(f"{glob.escape(stem)}_*w.*"):
+        os.remove(variant)
+
+
+def collect_blobs(names=None, batch_size=None):
+    """
+    Borra hasta ``batch_size`` blobs sin referencias (de entre ``names`` si se
+    indica) y devuelve cuántos eliminó. Las filas se bloquean mientras se
+    borran sus ficheros, así que una subida simultánea del mismo contenido
+    espera y vuelve a escribir el fichero.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_BLOB_GRACE)
+    with transaction.atomic():
+        blobs = MediaBlob.objects.select_for_update().filter(
+            refcount__lte=0, touched_at__lt=cutoff
+        )
+        if names is not None:
+            blobs = blobs.filter(name__in=names)
+        blobs = list(blobs.order_by("touched_at")[: batch_size or settings.MAINTENANCE_BATCH_SIZE])
+        for blob in blobs:
+            _delete_files(blob.name)
+        MediaBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+    return len(blobs)
@@ -0,0 +1,220 @@
+"""
+Operaciones con Pillow del pipeline de imágenes.
+
+Este módulo no importa Django: sus funciones se ejecutan en los procesos de un
+``ProcessPoolExecutor`` y reciben rutas y opciones como argumentos.
+"""
+
+import math
+import os
+
+from PIL import Image, ImageOps
+
+from .addressing import blob_name, file_digest, is_blob_name, normalize_extension
+
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+SAVE_OPTIONS = {
+    "jpeg": {"optimize": True, "progressive": True},
+    "webp": {"method": 4},
+}
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def inspect_image(fileobj, allowed_formats, max_pixels):
+    """
+    Comprueba que ``fileobj`` sea una imagen íntegra de un formato permitido y
+    de un tamaño razonable, leyendo solo la cabecera antes de ``verify()``.
+    Devuelve ``(formato, ancho, alto)``.
+    """
+    try:
+        with Image.open(fileobj) as image:
+            if image.format not in allowed_formats:
+                raise InvalidImage(f"Unsupported image format: {image.format}")
+            width, height = image.size
+            if width * height > max_pixels:
+                raise InvalidImage("Image dimensions are too large.")
+            image.verify()
+            return image.format, width, height
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise InvalidImage("Invalid image file.") from exc
+    finally:
+        fileobj.seek(0)
+
+
+def _flatten(image):
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_variants(root, name, widths, formats, quality, max_pixels):
+    """
+    Procesa el fichero ``name`` (relativo a ``root``):
+
+    * lo orienta según EXIF y lo reescribe sin metadatos si los tenía (con
+      otro nombre si está direccionado por contenido);
+    * genera una variante por ancho de ``widths`` (sin ampliar) en cada
+      formato de ``formats``, junto al original;
+    * calcula su blurhash.
+
+    Devuelve ``{"name", "width", "height", "blurhash", "variants"}``, con
+    ``variants = {"<ancho>": {"<formato>": nombre}}``.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    path = os.path.join(root, name)
+    with Image.open(path) as original:
+        source_format = original.format
+        animated = getattr(original, "is_animated", False)
+        has_metadata = bool(original.getexif()) or any(
+            key in original.info for key in ("exif", "xmp", "XML:com.adobe.xmp")
+        )
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    if has_metadata and not animated:
+        # Se escribe aparte y se renombra para no dejar el original a medias.
+        # En el almacenamiento por contenido el fichero limpio es otro blob.
+        temporary = f"{path}.{os.getpid()}.tmp"
+        options = {"quality": 95} if source_format == "JPEG" else {}
+        image.save(temporary, format=source_format, **options)
+        if is_blob_name(name):
+            name = blob_name(file_digest(temporary), normalize_extension(name))
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary, path)
+
+    opaque = _flatten(image)
+    rgba = image.convert("RGBA") if image.mode in ("RGBA", "LA", "P") else opaque
+    stem = os.path.splitext(name)[0]
+    variants = {}
+    # De mayor a menor, redimensionando cada variante desde la anterior.
+    current = {"jpeg": opaque, "webp": rgba}
+    for width in sorted({min(width, image.width) for width in widths}, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        variants[str(width)] = {}
+        for fmt in formats:
+            resized = current[fmt]
+            if resized.size != (width, height):
+                resized = resized.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+                current[fmt] = resized
+            variant = f"{stem}_{width}w.{EXTENSIONS[fmt]}"
+            resized.save(
+                os.path.join(root, variant), format=fmt.upper(), quality=quality,
+                **SAVE_OPTIONS[fmt],
+            )
+            variants[str(width)][fmt] = variant
+    return {
+        "name": name,
+        "width": image.width,
+        "height": image.height,
+        "blurhash": blurhash(opaque),
+        "variants": variants,
+    }
+
+
+def render_transform(source, target, width, height, fmt, quality, max_pixels):
+    """
+    Escribe en ``target`` la imagen ``source`` reducida para caber en
+    ``width`` x ``height`` (cualquiera puede ser ``None``), sin ampliarla.
+    Los JPEG se decodifican ya reducidos con ``draft``.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    box = (width or max_pixels, height or max_pixels)
+    with Image.open(source) as original:
+        if original.format == "JPEG":
+            # La orientación EXIF puede intercambiar los ejes.
+            side = min(box)
+            original.draft("RGB", (side, side))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    image.thumbnail(box, Image.LANCZOS, reducing_gap=3.0)
+    if fmt == "jpeg":
+        image = _flatten(image)
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.mode in ("LA", "P") else "RGB")
+    temporary = f"{target}.{os.getpid()}.tmp"
+    image.save(temporary, format=fmt.upper(), quality=quality, **SAVE_OPTIONS[fmt])
+    os.replace(temporary, target)
+    return os.path.getsize(target)
+
+
+def _srgb_to_linear(value):
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _encode83(value, length):
+    return "".join(
+        BASE83[value // 83 ** (length - digit) % 83] for digit in range(1, length + 1)
+    )
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """
+    Codifica ``image`` en un blurhash (https://blurha.sh) a partir de una
+    miniatura de 32 px, suficiente para el degradado que representa.
+    """
+    small = image.convert("RGB")
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [
+        tuple(_srgb_to_linear(channel) for channel in pixel)
+        for pixel in small.getdata()
+    ]
+    cos_x = [
+        [math.cos(math.pi * i * x / width) for x in range(width)]
+        for i in range(x_components)
+    ]
+    cos_y = [
+        [math.cos(math.pi * j * y / height) for y in range(height)]
+        for j in range(y_components)
+    ]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            red = green = blue = 0.0
+            for y in range(height):
+                row, weight_y = y * width, cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * weight_y
+                    r, g, b = pixels[row + x]
+                    red += basis * r
+                    green += basis * g
+                    blue += basis * b
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised = max(0, min(82, int(max(abs(v) for f in ac for v in f) * 166 - 0.5)))
+        maximum = (quantised + 1) / 166
+    else:
+        quantised, maximum = 0, 1
+    result += _encode83(quantised, 1)
+    result += _encode83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]),
+        4,
+    )
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, int(math.copysign(abs(v / maximum) ** 0.5, v) * 9 + 9.5)))
+            for v in factor
+        )
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
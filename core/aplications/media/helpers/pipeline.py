@@ -0,0 +1,250 @@
+"""
+Pipeline de imágenes en segundo plano.
+
+Al guardar un modelo con una imagen nueva en un campo registrado con
+``track_image_field`` se vacían sus metadatos (``<campo>_width``,
+``<campo>_height``, ``<campo>_blurhash`` y ``<campo>_variants``) y, cuando la
+transacción se confirma, el fichero se envía a un pool de procesos que genera
+las variantes con Pillow. La respuesta de la subida no espera al resultado.
+
+Una imagen sin ``<campo>_width`` está pendiente; si el proceso web muere antes
+de terminar, la tarea de mantenimiento ``media.process_pending_images`` la
+vuelve a procesar.
+
+Los mismos signals mantienen los contadores de referencias de ``MediaBlob``
+y reutilizan el resultado cuando el contenido ya se había procesado.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal
+from PIL import Image
+
+from .addressing import is_blob_name
+from .blobs import acquire, cached_metadata, collect_blobs, release, remember_metadata, touch_blob
+from .images import InvalidImage, inspect_image, render_variants
+
+logger = logging.getLogger(__name__)
+
+# ``save_result`` guarda los metadatos con update(), sin post_save: quien
+# cachee datos de la imagen escucha este signal (sender=modelo, pk, field_name).
+image_processed = Signal()
+
+_tracked = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def metadata_fields(field_name):
+    return {
+        "width": f"{field_name}_width",
+        "height": f"{field_name}_height",
+        "blurhash": f"{field_name}_blurhash",
+        "variants": f"{field_name}_variants",
+    }
+
+
+def validate_image_upload(upload):
+    """
+    Valida una imagen subida antes de guardarla: tamaño, formato, dimensiones
+    e integridad. Lanza ``InvalidImage`` con un mensaje para el cliente.
+    """
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise InvalidImage("Image file is too large.")
+    return inspect_image(upload, settings.IMAGE_ALLOWED_FORMATS, settings.IMAGE_MAX_PIXELS)
+
+
+def variant_urls(variants):
+    """
+    Convierte ``{"<ancho>": {"<formato>": nombre}}`` en las URLs públicas.
+    """
+    return {
+        width: {fmt: default_storage.url(name) for fmt, name in formats.items()}
+        for width, formats in (variants or {}).items()
+    }
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # "spawn": los hilos del servidor no se heredan en los procesos hijos.
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def _render_args(name):
+    return (
+        str(settings.MEDIA_ROOT),
+        name,
+        settings.IMAGE_VARIANT_WIDTHS,
+        settings.IMAGE_VARIANT_FORMATS,
+        settings.IMAGE_VARIANT_QUALITY,
+        settings.IMAGE_MAX_PIXELS,
+    )
+
+
+def save_result(model, pk, field_name, name, result):
+    """
+    Guarda los metadatos si el campo sigue apuntando a ``name``; si la imagen
+    se cambió entretanto, el resultado se descarta. Un fallo se marca con
+    dimensiones 0 para no reintentarlo indefinidamente. Si el pipeline
+    reescribió el fichero con otro nombre, el campo pasa a apuntar a él.
+    """
+    fields = metadata_fields(field_name)
+    if result is None:
+        result = {"width": 0, "height": 0, "blurhash": "", "variants": {}}
+    new_name = result.get("name", name)
+    values = {fields[key]: result[key] for key in ("width", "height", "blurhash", "variants")}
+    with transaction.atomic():
+        if new_name != name:
+            values[field_name] = new_name
+            if is_blob_name(new_name):
+                digest = new_name.rsplit("/", 1)[-1].split(".")[0]
+                touch_blob(digest, new_name, default_storage.size(new_name))
+        updated = model._default_manager.filter(pk=pk, **{field_name: name}).update(**values)
+        if updated:
+            image_processed.send(sender=model, pk=pk, field_name=field_name)
+        if updated and new_name != name:
+            acquire(new_name)
+            release(name)
+            _collect_on_commit(name)
+        if "name" in result:
+            remember_metadata({name, new_name}, result)
+
+
+def process_image(model, pk, field_name, name):
+    """
+    Procesa la imagen en el proceso actual (tareas de mantenimiento, tests).
+    """
+    try:
+        result = render_variants(*_render_args(name))
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not process image %s: %r", name, exc)
+        result = None
+    save_result(model, pk, field_name, name, result)
+
+
+def schedule(model, pk, field_name, name):
+    cached = cached_metadata(name)
+    if cached and default_storage.exists(cached["name"]):
+        # Mismo contenido ya procesado: no hace falta volver a generar nada.
+        save_result(model, pk, field_name, name, cached)
+        return
+    if not settings.IMAGE_PIPELINE_WORKERS:
+        process_image(model, pk, field_name, name)
+        return
+
+    future = _get_executor().submit(render_variants, *_render_args(name))
+
+    def done(future):
+        # Se ejecuta en un hilo del executor, con su propia conexión.
+        try:
+            result = future.result()
+        except Exception as exc:  # el fichero puede estar corrupto o haberse borrado
+            logger.warning("Could not process image %s: %r", name, exc)
+            result = None
+        try:
+            save_result(model, pk, field_name, name, result)
+        finally:
+            close_old_connections()
+
+    future.add_done_callback(done)
+
+
+def _remember_files(sender, instance, **kwargs):
+    instance._stored_files = {
+        field_name: instance.__dict__.get(field_name) for field_name in _tracked[sender]
+    }
+
+
+def _stored_name(value):
+    return getattr(value, "name", value) or ""
+
+
+def _reset_metadata(sender, instance, update_fields=None, **kwargs):
+    pending, replaced = [], {}
+    stored = instance.__dict__.get("_stored_files", {})
+    for field_name in _tracked[sender]:
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        file = getattr(instance, field_name)
+        # Un fichero sin confirmar es una subida nueva que FileField guardará
+        # a continuación; sin fichero tampoco hay metadatos que conservar.
+        if file and file._committed:
+            continue
+        if not file and not _stored_name(stored.get(field_name)):
+            continue
+        for attname in metadata_fields(field_name).values():
+            setattr(instance, attname, instance._meta.get_field(attname).get_default())
+        if file:
+            pending.append(field_name)
+        if instance.pk is not None:
+            # Se consulta el nombre guardado: el de memoria puede ser
+            # anterior a que el pipeline renombrara el fichero.
+            replaced[field_name] = (
+                sender._base_manager.filter(pk=instance.pk)
+                .values_list(field_name, flat=True)
+                .first()
+            )
+    instance._pending_images = pending
+    instance._replaced_files = replaced
+
+
+def _after_save(sender, instance, **kwargs):
+    for field_name, old in instance.__dict__.pop("_replaced_files", {}).items():
+        new = getattr(instance, field_name).name or ""
+        if old and old != new:
+            release(old)
+            _collect_on_commit(old)
+    for field_name in instance.__dict__.pop("_pending_images", ()):
+        name = getattr(instance, field_name).name
+        acquire(name)
+        transaction.on_commit(
+            lambda pk=instance.pk, field_name=field_name, name=name: schedule(
+                sender, pk, field_name, name
+            )
+        )
+    _remember_files(sender, instance)
+
+
+def _after_delete(sender, instance, **kwargs):
+    for field_name in _tracked[sender]:
+        name = getattr(instance, field_name).name
+        release(name)
+        _collect_on_commit(name)
+
+
+def _collect_on_commit(name):
+    if is_blob_name(name):
+        transaction.on_commit(lambda: collect_blobs([name]))
+
+
+def track_image_field(model, field_name):
+    """
+    Activa el pipeline para ``model.<field_name>``. El modelo debe tener los
+    campos de ``metadata_fields(field_name)``.
+    """
+    if model not in _tracked:
+        _tracked[model] = []
+        post_init.connect(_remember_files, sender=model, weak=False)
+        pre_save.connect(_reset_metadata, sender=model, weak=False)
+        post_save.connect(_after_save, sender=model, weak=False)
+        post_delete.connect(_after_delete, sender=model, weak=False)
+    if field_name not in _tracked[model]:
+        _tracked[model].append(field_name)
+
+
+def tracked_fields():
+    return [(model, field) for model, fields in _tracked.items() for field in fields]
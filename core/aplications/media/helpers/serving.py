@@ -0,0 +1,70 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.utils.http import quote_etag
+
+from .addressing import is_blob_name
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CONTENT_TYPES = {".webp": "image/webp", ".avif": "image/avif"}
+
+
+def content_type(name):
+    extension = os.path.splitext(name)[1].lower()
+    return (
+        CONTENT_TYPES.get(extension)
+        or mimetypes.guess_type(name)[0]
+        or "application/octet-stream"
+    )
+
+
+def validators(name, stat):
+    """
+    Devuelve ``(etag, last_modified, cache_control)``. En los ficheros
+    direccionados por contenido (originales y variantes) el nombre ya
+    identifica los bytes: el ETag es fuerte y la caché, permanente.
+    """
+    if is_blob_name(name):
+        etag = quote_etag(os.path.basename(name).split(".")[0])
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        cache_control = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    return etag, int(stat.st_mtime), cache_control
+
+
+def parse_range(header, size):
+    """
+    Interpreta un único rango ``bytes=inicio-fin`` (o ``bytes=-sufijo``) y
+    devuelve ``(inicio, fin)`` inclusivos, ``None`` si no hay un rango
+    utilizable (se sirve el fichero completo) o ``False`` si no es
+    satisfacible.
+    """
+    match = RANGE_RE.match(header or "")
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def iter_range(path, start, length, block_size=64 * 1024):
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        while length > 0:
+            block = handle.read(min(block_size, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
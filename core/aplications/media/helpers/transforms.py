@@ -0,0 +1,193 @@
+"""
+Redimensionado bajo demanda con caché LRU en disco.
+
+Cada combinación de fichero, tamaño y formato se renderiza una sola vez en el
+pool del pipeline y se guarda en ``MEDIA_TRANSFORM_CACHE_DIR`` (dentro de
+MEDIA_ROOT, para poder servirla con sendfile). Un acierto actualiza el mtime
+del fichero, y al superar ``MEDIA_TRANSFORM_CACHE_MAX_BYTES`` se borran los de
+mtime más antiguo.
+
+Las peticiones simultáneas de la misma variante se agrupan con ``flock`` sobre
+uno de 256 ficheros de bloqueo (según el prefijo de la clave): la primera la
+renderiza y el resto espera y la lee de la caché, aunque estén en otros
+procesos.
+"""
+
+import fcntl
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .images import EXTENSIONS, render_transform
+from .pipeline import _get_executor
+
+_written = 0
+_written_lock = threading.Lock()
+
+
+class TransformError(ValueError):
+    pass
+
+
+def parse_transform(params):
+    """
+    Valida ``w``, ``h`` y ``fmt`` contra las listas permitidas y devuelve
+    ``(width, height, fmt)``.
+    """
+    sizes = settings.MEDIA_TRANSFORM_SIZES
+    try:
+        width = int(params["w"]) if params.get("w") else None
+        height = int(params["h"]) if params.get("h") else None
+    except ValueError:
+        raise TransformError("w and h must be integers.")
+    if width is None and height is None:
+        raise TransformError("Provide w or h.")
+    if (width and width not in sizes) or (height and height not in sizes):
+        raise TransformError(f"Allowed sizes: {', '.join(map(str, sizes))}.")
+    fmt = params.get("fmt", "webp").lower()
+    if fmt not in settings.MEDIA_TRANSFORM_FORMATS:
+        raise TransformError(
+            f"Allowed formats: {', '.join(settings.MEDIA_TRANSFORM_FORMATS)}."
+        )
+    return width, height, fmt
+
+
+def _cache_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.MEDIA_TRANSFORM_CACHE_DIR)
+
+
+def cache_name(name, stat, width, height, fmt):
+    """
+    Nombre (relativo a MEDIA_ROOT) de la variante en caché. La clave incluye
+    el mtime y tamaño del original, así que al cambiar el fichero la variante
+    anterior deja de usarse y acaba desalojada.
+    """
+    key = hashlib.sha256(
+        f"{name}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{height}|{fmt}|"
+        f"{settings.IMAGE_VARIANT_QUALITY}".encode()
+    ).hexdigest()
+    return f"{settings.MEDIA_TRANSFORM_CACHE_DIR}/{key[:2]}/{key}.{EXTENSIONS[fmt]}"
+
+
+def source_path(name):
+    """
+    Ruta del original ``name``. Lanza ``FileNotFoundError`` si no es un
+    fichero o si está dentro de la caché de variantes: transformar una
+    variante generaría otra nueva en cada petición.
+    """
+    source = os.path.realpath(default_storage.path(name))
+    root = os.path.realpath(_cache_root())
+    if os.path.commonpath([source, root]) == root or not os.path.isfile(source):
+        raise FileNotFoundError(name)
+    return source
+
+
+def cached_transform(name, width, height, fmt):
+    """
+    Devuelve ``(nombre, ruta)`` de la variante si ya está en caché, o
+    ``None`` si habría que renderizarla.
+    """
+    cached = cache_name(name, os.stat(source_path(name)), width, height, fmt)
+    target = default_storage.path(cached)
+    if _touch(target):
+        return cached, target
+    return None
+
+
+def get_transform(name, width, height, fmt):
+    """
+    Devuelve la ruta de la variante pedida, renderizándola si no está en
+    caché. Lanza ``FileNotFoundError`` si el original no existe.
+    """
+    source = source_path(name)
+    stat = os.stat(source)
+    cached = cache_name(name, stat, width, height, fmt)
+    target = default_storage.path(cached)
+    if _touch(target):
+        return cached, target
+
+    locks = os.path.join(_cache_root(), "locks")
+    os.makedirs(locks, exist_ok=True)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    key = os.path.basename(cached)
+    with open(os.path.join(locks, key[:2]), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Quien tenía el bloqueo puede haberla renderizado ya.
+            if _touch(target):
+                return cached, target
+            args = (
+                source,
+                target,
+                width,
+                height,
+                fmt,
+                settings.IMAGE_VARIANT_QUALITY,
+                settings.IMAGE_MAX_PIXELS,
+            )
+            if settings.IMAGE_PIPELINE_WORKERS:
+                size = _get_executor().submit(render_transform, *args).result()
+            else:
+                size = render_transform(*args)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    _account(size)
+    return cached, target
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _account(size):
+    # Cada proceso recorre la caché cuando ha escrito un 10 % de su tamaño
+    # máximo desde la última vez; la tarea de mantenimiento cubre el resto.
+    global _written
+    with _written_lock:
+        _written += size
+        if _written < settings.MEDIA_TRANSFORM_CACHE_MAX_BYTES // 10:
+            return
+        _written = 0
+    trim_cache()
+
+
+def trim_cache(max_bytes=None):
+    """
+    Borra las variantes usadas hace más tiempo hasta dejar la caché en el 90 %
+    de ``max_bytes``. Devuelve cuántas eliminó.
+    """
+    max_bytes = settings.MEDIA_TRANSFORM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    root = _cache_root()
+    entries, total = [], 0
+    for directory, _, files in os.walk(root):
+        if os.path.basename(directory) == "locks":
+            continue
+        for filename in files:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
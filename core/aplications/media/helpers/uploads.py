@@ -0,0 +1,217 @@
+"""
+Subidas por partes reanudables.
+
+El cliente crea una sesión anunciando el tamaño total y envía el fichero en
+partes consecutivas con ``PUT`` y ``Content-Range``. Cada parte se escribe en
+disco a medida que llega, en bloques de ``BLOCK_SIZE``, sin cargarla entera en
+memoria, y solo avanza ``received`` si su SHA-256 coincide con el anunciado.
+Si la conexión se corta basta con consultar ``received`` y seguir desde ahí.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import uuid
+from datetime import timedelta
+
+from aplications.authentication.models import CustomUser
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import UploadSession
+
+BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+# Clave del advisory lock de Postgres que protege las reservas de espacio.
+RESERVATION_LOCK_ID = 0x5550_4C44
+
+
+class UploadError(Exception):
+    """
+    Error del protocolo de subida, con el código HTTP que debe devolverse.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AssembledFile(File):
+    """
+    Fichero ya completo en disco. ``FileSystemStorage`` lo mueve a su destino
+    con ``rename`` en lugar de copiarlo porque expone ``temporary_file_path``.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _lock_reservations():
+    """
+    Serializa las reservas de espacio de todos los usuarios hasta el final de
+    la transacción. SQLite ya admite un solo escritor a la vez.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [RESERVATION_LOCK_ID])
+
+
+def create_session(user, filename, size, sha256=""):
+    if size <= 0 or size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise UploadError("Invalid upload size.")
+    with transaction.atomic():
+        # Las sesiones del usuario se cuentan con su fila bloqueada, así que
+        # dos peticiones simultáneas no superan el límite.
+        list(CustomUser.objects.select_for_update().filter(pk=user.pk).values_list("pk"))
+        if user.upload_sessions.count() >= settings.UPLOAD_MAX_SESSIONS_PER_USER:
+            raise UploadError("Too many uploads in progress.", 429)
+        # El espacio se reserva al crear la sesión, así que el directorio
+        # temporal nunca supera UPLOAD_TEMP_MAX_BYTES aunque todas terminen a
+        # la vez.
+        _lock_reservations()
+        reserved = UploadSession.objects.aggregate(total=Sum("size"))["total"] or 0
+        if reserved + size > settings.UPLOAD_TEMP_MAX_BYTES:
+            raise UploadError("Upload storage is full, try again later.", 507)
+        session = UploadSession.objects.create(
+            user=user, filename=os.path.basename(filename)[:255], size=size, sha256=sha256
+        )
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(session.path, "wb"):
+        pass
+    return session
+
+
+def parse_content_range(header, length):
+    match = CONTENT_RANGE_RE.match(header or "")
+    if not match:
+        raise UploadError("Missing or invalid Content-Range header.")
+    start, end, total = map(int, match.groups())
+    if end < start or end - start + 1 != length:
+        raise UploadError("Content-Range does not match Content-Length.")
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError("Chunk is too large.", 413)
+    return start, end, total
+
+
+def write_chunk(session, stream, content_range, length, checksum):
+    """
+    Escribe la parte ``content_range`` leída de ``stream`` y devuelve el nuevo
+    ``received``. Un ``flock`` sobre el fichero temporal impide que dos
+    peticiones escriban a la vez en la misma sesión sin mantener una
+    transacción abierta mientras llegan los datos.
+    """
+    start, end, total = parse_content_range(content_range, length)
+    if total != session.size or end >= session.size:
+        raise UploadError("Content-Range exceeds the upload size.")
+    if not checksum:
+        raise UploadError("Missing X-Chunk-SHA256 header.")
+
+    fd = os.open(session.path, os.O_WRONLY)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk is being written.", 409)
+        received = UploadSession.objects.values_list("received", flat=True).get(
+            pk=session.pk
+        )
+        if start != received:
+            raise UploadError(f"Expected chunk starting at {received}.", 409)
+
+        digest = hashlib.sha256()
+        os.lseek(fd, start, os.SEEK_SET)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise UploadError("Incomplete chunk.")
+            digest.update(block)
+            os.write(fd, block)
+            remaining -= len(block)
+        if digest.hexdigest() != checksum.lower():
+            # Los bytes escritos se sobrescribirán con el reintento.
+            raise UploadError("Chunk checksum mismatch.", 422)
+        os.fsync(fd)
+        UploadSession.objects.filter(pk=session.pk).update(
+            received=F("received") + length, updated_at=timezone.now()
+        )
+        return received + length
+    finally:
+        os.close(fd)
+
+
+def assembled_file(session):
+    """
+    Comprueba que la subida esté completa (y su SHA-256 si se anunció) y
+    devuelve el fichero listo para asignarlo a un ``FileField``.
+    """
+    session.refresh_from_db(fields=["received"])
+    if session.received != session.size:
+        raise UploadError(f"Upload incomplete: {session.received}/{session.size} bytes.", 409)
+    handle = open(session.path, "rb")
+    if session.sha256:
+        digest = hashlib.sha256()
+        for block in iter(lambda: handle.read(BLOCK_SIZE), b""):
+            digest.update(block)
+        handle.seek(0)
+        if digest.hexdigest() != session.sha256.lower():
+            handle.close()
+            raise UploadError("File checksum mismatch.", 422)
+    upload = AssembledFile(handle, name=session.filename)
+    upload.size = session.size
+    return upload
+
+
+def discard_session(session):
+    try:
+        os.remove(session.path)
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_stale_sessions():
+    """
+    Borra las sesiones sin actividad en ``UPLOAD_SESSION_TTL`` segundos y los
+    ficheros temporales que ya no tienen sesión. Devuelve cuántos eliminó.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    removed = 0
+    for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+        discard_session(session)
+        removed += 1
+
+    if not os.path.isdir(settings.UPLOAD_TEMP_DIR):
+        return removed
+    cutoff_timestamp = cutoff.timestamp()
+    with os.scandir(settings.UPLOAD_TEMP_DIR) as entries:
+        orphans = {
+            entry.name.removesuffix(".part"): entry.path
+            for entry in entries
+            if entry.name.endswith(".part") and entry.stat().st_mtime < cutoff_timestamp
+        }
+    alive = {
+        str(pk)
+        for pk in UploadSession.objects.filter(pk__in=_valid_uuids(orphans)).values_list(
+            "pk", flat=True
+        )
+    }
+    for name, path in orphans.items():
+        if name not in alive:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _valid_uuids(names):
+    valid = []
+    for name in names:
+        try:
+            valid.append(uuid.UUID(name))
+        except ValueError:
+            pass
+    return valid
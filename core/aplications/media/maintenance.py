@@ -0,0 +1,50 @@
+from core.maintenance import maintenance_task
+from django.conf import settings
+
+from .helpers.blobs import collect_blobs
+from .helpers.pipeline import metadata_fields, process_image, tracked_fields
+from .helpers.transforms import trim_cache
+from .helpers.uploads import purge_stale_sessions
+
+
+@maintenance_task(interval=600)
+def process_pending_images():
+    """
+    Procesa las imágenes que siguen sin metadatos, por ejemplo porque el
+    proceso web se reinició con el trabajo en cola. Una imagen recién subida
+    puede procesarse dos veces; el resultado es el mismo.
+    """
+    processed = 0
+    for model, field_name in tracked_fields():
+        pending = (
+            model._default_manager.filter(
+                **{f"{metadata_fields(field_name)['width']}__isnull": True}
+            )
+            .exclude(**{f"{field_name}__isnull": True})
+            .exclude(**{field_name: ""})
+            .values_list("pk", field_name)[: settings.MAINTENANCE_BATCH_SIZE]
+        )
+        for pk, name in pending:
+            process_image(model, pk, field_name, name)
+            processed += 1
+    return processed
+
+
+@maintenance_task(interval=3600)
+def purge_stale_uploads():
+    return purge_stale_sessions()
+
+
+@maintenance_task(interval=600)
+def collect_unreferenced_blobs():
+    removed = 0
+    while True:
+        batch = collect_blobs()
+        removed += batch
+        if batch < settings.MAINTENANCE_BATCH_SIZE:
+            return removed
+
+
+@maintenance_task(interval=900)
+def trim_transform_cache():
+    return trim_cache()
@@ -0,0 +1,78 @@
+import os
+import uuid
+
+from aplications.authentication.models import CustomUser
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class UploadSession(models.Model):
+    """
+    Represents a resumable, chunked upload in progress.
+
+    Fields:
+        id (UUIDField): Public identifier of the session.
+        user (ForeignKey): Owner of the upload.
+        filename (CharField): Original file name sent by the client.
+        size (BigIntegerField): Total size announced when the session was created.
+        received (BigIntegerField): Bytes written so far; the next chunk must start here.
+        sha256 (CharField): Optional checksum of the whole file, checked on completion.
+        created_at (DateTimeField): Timestamp when the session was created.
+        updated_at (DateTimeField): Timestamp of the last chunk, used to expire
+            abandoned sessions.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f"{self.id}.part")
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class MediaBlob(models.Model):
+    """
+    Represents a content-addressed file in media storage.
+
+    Fields:
+        sha256 (CharField): Checksum of the content, which also names the file.
+        name (CharField): Storage name, ``blobs/ab/cd/<sha256><ext>``.
+        size (BigIntegerField): Size in bytes.
+        refcount (IntegerField): Number of model fields pointing at the file.
+        metadata (JSONField): Image pipeline result, reused when the same
+            content is uploaded again.
+        touched_at (DateTimeField): Last time the content was uploaded; blobs
+            without references are only collected after a grace period.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    metadata = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["touched_at"],
+                condition=models.Q(refcount__lte=0),
+                name="media_blob_unreferenced_idx",
+            )
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$", required=False, allow_blank=True
+    )
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ("id", "filename", "size", "sha256", "received", "chunk_size")
+        read_only_fields = ("id", "received")
+
+    def get_chunk_size(self, obj):
+        return settings.UPLOAD_CHUNK_SIZE
+
+
+class CompleteUploadSerializer(serializers.Serializer):
+    """
+    Destino del fichero: una publicación existente del usuario (``post_id``)
+    o una nueva con ``content`` y ``tag_names``.
+    """
+
+    post_id = serializers.IntegerField(required=False)
+    content = serializers.CharField(required=False)
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=50), required=False
+    )
+
+    def validate(self, attrs):
+        if "post_id" not in attrs and "content" not in attrs:
+            raise serializers.ValidationError("Provide post_id or content.")
+        return attrs
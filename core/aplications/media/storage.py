@@ -0,0 +1,47 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+from .helpers.addressing import BLOCK_SIZE, blob_name, normalize_extension
+from .helpers.blobs import touch_blob
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Almacenamiento que nombra cada fichero por el SHA-256 de su contenido, en
+    ``blobs/ab/cd/<sha256><ext>``, e ignora el ``upload_to`` del campo. Un
+    contenido que ya existe no se vuelve a escribir: se devuelve el nombre
+    existente y su ``MediaBlob`` se reutiliza.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo depende del contenido y se calcula en _save.
+        return name
+
+    def _digest(self, content):
+        digest = hashlib.sha256()
+        if hasattr(content, "temporary_file_path"):
+            with open(content.temporary_file_path(), "rb") as handle:
+                for block in iter(lambda: handle.read(BLOCK_SIZE), b""):
+                    digest.update(block)
+        else:
+            content.seek(0)
+            for chunk in content.chunks():
+                digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+            content.seek(0)
+        return digest.hexdigest()
+
+    def _save(self, name, content):
+        digest = self._digest(content)
+        # Primero se registra el blob: si la recolección lo está borrando,
+        # espera a que termine y después se comprueba si el fichero existe.
+        name = touch_blob(digest, blob_name(digest, normalize_extension(name)), content.size)
+        if self.exists(name):
+            return name
+        # Se escribe con otro nombre y se renombra, para que nunca se vea un
+        # fichero a medias con el nombre del hash.
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.partial", content)
+        os.replace(self.path(partial), self.path(name))
+        return name
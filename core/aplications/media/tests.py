@@ -0,0 +1,449 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from aplications.authentication.models import CustomUser
+from aplications.posts.models import Post
+from core.throttling import PostCreateRateThrottle, TransformRenderRateThrottle
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .helpers.images import InvalidImage
+from .helpers.pipeline import validate_image_upload
+from .maintenance import (
+    collect_unreferenced_blobs,
+    process_pending_images,
+    purge_stale_uploads,
+    trim_transform_cache,
+)
+from .helpers.addressing import blob_name
+from .models import MediaBlob, UploadSession
+
+
+def make_image(size=(800, 600), fmt="JPEG", orientation=None):
+    buffer = BytesIO()
+    image = Image.new("RGB", size, (200, 40, 40))
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010F] = "Camera"
+        options["exif"] = exif
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_is_processed_after_commit(self):
+        upload = SimpleUploadedFile(
+            "photo.jpg", make_image(orientation=6), content_type="image/jpeg"
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("post-create"),
+                {"author": self.user.username, "content": "foto", "image": upload},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # La respuesta no espera al procesado.
+        self.assertIsNone(response.data["image_width"])
+        self.assertEqual(response.data["image_variants"], {})
+
+        for callback in callbacks:
+            callback()
+        post = Post.objects.get(pk=response.data["id"])
+        # Orientación 6: la imagen se gira 90 grados.
+        self.assertEqual((post.image_width, post.image_height), (600, 800))
+        self.assertEqual(len(post.image_blurhash), 28)
+        self.assertEqual(sorted(post.image_variants), ["320", "600"])
+        self.assertEqual(sorted(post.image_variants["320"]), ["jpeg", "webp"])
+        with Image.open(post.image.path) as original:
+            self.assertEqual(len(original.getexif()), 0)
+            self.assertEqual(original.size, (600, 800))
+        with Image.open(
+            f"{self.media_root}/{post.image_variants['320']['webp']}"
+        ) as variant:
+            self.assertEqual((variant.format, variant.size), ("WEBP", (320, 427)))
+
+        response = self.client.get(reverse("post-owner"), {"user_id": self.user.id})
+        self.assertTrue(
+            response.data[0]["image_variants"]["320"]["jpeg"].startswith(
+                "/media/blobs/"
+            )
+        )
+
+    def test_invalid_uploads_are_rejected(self):
+        with self.assertRaises(InvalidImage):
+            validate_image_upload(SimpleUploadedFile("a.jpg", b"not an image"))
+        with override_settings(IMAGE_ALLOWED_FORMATS=("JPEG",)):
+            with self.assertRaises(InvalidImage):
+                validate_image_upload(SimpleUploadedFile("a.png", make_image(fmt="PNG")))
+        with override_settings(IMAGE_MAX_PIXELS=1000):
+            with self.assertRaises(InvalidImage):
+                validate_image_upload(SimpleUploadedFile("a.jpg", make_image()))
+
+    def test_pending_images_are_picked_up_by_maintenance(self):
+        post = Post(author=self.user, content="foto")
+        post.image.save("photo.png", SimpleUploadedFile("photo.png", make_image(fmt="PNG")))
+        self.assertIsNone(post.image_width)
+
+        self.assertEqual(process_pending_images(), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 800)
+        self.assertEqual(process_pending_images(), 0)
+
+
+@override_settings(MEDIA_BLOB_GRACE=0)
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+
+    def _post(self, data, filename="photo.jpeg"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                author=self.user,
+                content="foto",
+                image=SimpleUploadedFile(filename, data),
+            )
+
+    def test_identical_uploads_share_one_blob(self):
+        data = make_image()
+        digest = hashlib.sha256(data).hexdigest()
+        first, second = self._post(data), self._post(data, "other.jpg")
+        self.assertEqual(first.image.name, blob_name(digest, ".jpg"))
+        self.assertEqual(second.image.name, first.image.name)
+        blob = MediaBlob.objects.get()
+        self.assertEqual((blob.refcount, blob.size), (2, len(data)))
+        # El segundo reutiliza el resultado del pipeline.
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants, first.image_variants)
+        directory = os.path.join(self.media_root, "blobs", digest[:2], digest[2:4])
+        self.assertEqual(len(os.listdir(directory)), 7)  # original y 3 anchos x 2 formatos
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_replaced_and_rewritten_files_are_released(self):
+        original = make_image(orientation=6)
+        post = self._post(original)
+        # Sin EXIF el contenido cambia: la imagen pasa a otro blob y el
+        # original, ya sin referencias, se borra.
+        post.refresh_from_db()
+        clean = MediaBlob.objects.get()
+        self.assertEqual((clean.name, clean.refcount), (post.image.name, 1))
+        self.assertNotEqual(clean.sha256, hashlib.sha256(original).hexdigest())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.image = SimpleUploadedFile("new.png", make_image(fmt="PNG"))
+            post.save()
+        self.assertEqual(list(MediaBlob.objects.values_list("name", flat=True)), [post.image.name])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, clean.name)))
+        self.assertEqual(collect_unreferenced_blobs(), 0)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_TEMP_DIR=os.path.join(self.media_root, "tmp"),
+            IMAGE_PIPELINE_WORKERS=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = make_image()
+
+    def _create_session(self, **extra):
+        return self.client.post(
+            reverse("upload-create"),
+            {"filename": "photo.jpg", "size": len(self.data), **extra},
+            format="json",
+        )
+
+    def _put(self, session_id, start, end, checksum=None):
+        chunk = self.data[start : end + 1]
+        return self.client.put(
+            reverse("upload-session", args=[session_id]),
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.data)}",
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_resumable_upload_creates_post(self):
+        response = self._create_session(sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        session_id = response.data["id"]
+        middle = len(self.data) // 2
+
+        self.assertEqual(self._put(session_id, 0, middle - 1).data["received"], middle)
+        # Reintento de la misma parte: ya recibida.
+        self.assertEqual(self._put(session_id, 0, middle - 1).status_code, status.HTTP_409_CONFLICT)
+        bad = self._put(session_id, middle, len(self.data) - 1, checksum="0" * 64)
+        self.assertEqual(bad.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        early = self.client.post(
+            reverse("upload-complete", args=[session_id]), {"content": "x"}, format="json"
+        )
+        self.assertEqual(early.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.get(reverse("upload-session", args=[session_id]))
+        self.assertEqual(response.data["received"], middle)
+        response = self._put(session_id, middle, len(self.data) - 1)
+        self.assertEqual(response.data["received"], len(self.data))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("upload-complete", args=[session_id]),
+                {"content": "foto #viaje", "tag_names": ["fotos"]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sorted(response.data["tags_names"]), ["fotos", "viaje"])
+        post = Post.objects.get(pk=response.data["id"])
+        with post.image.open("rb") as image:
+            self.assertEqual(image.read(), self.data)
+        self.assertEqual(post.image_width, 800)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "tmp")), [])
+
+    def test_attach_to_existing_post(self):
+        post = Post.objects.create(author=self.user, content="sin foto")
+        session_id = self._create_session().data["id"]
+        self._put(session_id, 0, len(self.data) - 1)
+        response = self.client.post(
+            reverse("upload-complete", args=[session_id]), {"post_id": post.id}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.startswith("blobs/"))
+
+    def test_completion_follows_post_rules(self):
+        old = Post.objects.create(author=self.user, content="antigua")
+        Post.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        session_id = self._create_session().data["id"]
+        self._put(session_id, 0, len(self.data) - 1)
+        url = reverse("upload-complete", args=[session_id])
+        response = self.client.post(url, {"post_id": old.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch.dict(PostCreateRateThrottle.THROTTLE_RATES, {"post_create": "0/hour"}):
+            response = self.client.post(url, {"content": "otra"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertTrue(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_session_limits(self):
+        with override_settings(UPLOAD_TEMP_MAX_BYTES=len(self.data) + 10):
+            self.assertEqual(self._create_session().status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self._create_session().status_code, 507)
+        with override_settings(IMAGE_MAX_UPLOAD_SIZE=10):
+            self.assertEqual(self._create_session().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stale_sessions_are_purged(self):
+        session_id = self._create_session().data["id"]
+        fresh_id = self._create_session().data["id"]
+        UploadSession.objects.filter(pk=session_id).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+        orphan = os.path.join(self.media_root, "tmp", "orphan.part")
+        open(orphan, "wb").close()
+        os.utime(orphan, (0, 0))
+
+        self.assertEqual(purge_stale_uploads(), 2)
+        self.assertEqual(
+            list(UploadSession.objects.values_list("pk", flat=True)),
+            [UploadSession.objects.get(pk=fresh_id).pk],
+        )
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "tmp")), [f"{fresh_id}.part"])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.data = make_image()
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.name = blob_name(digest, ".jpg")
+        os.makedirs(os.path.dirname(os.path.join(self.media_root, self.name)))
+        with open(os.path.join(self.media_root, self.name), "wb") as handle:
+            handle.write(self.data)
+        self.url = f"/media/{self.name}"
+        self.etag = f'"{digest}"'
+
+    def test_full_and_conditional_responses(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+
+        # Con un If-Range desactualizado se envía el fichero completo.
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_offload_and_missing_files(self):
+        with override_settings(MEDIA_SENDFILE_BACKEND="nginx"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], self.etag)
+
+        self.assertEqual(self.client.get("/media/blobs/missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/../settings/base.py").status_code, 404)
+
+        os.makedirs(os.path.join(self.media_root, "posts"))
+        with open(os.path.join(self.media_root, "posts", "mi foto#1.jpg"), "wb") as handle:
+            handle.write(self.data)
+        with override_settings(MEDIA_SENDFILE_BACKEND="nginx"):
+            response = self.client.get("/media/posts/mi%20foto%231.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/posts/mi%20foto%231.jpg")
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class ImageTransformTests(MediaServingTests):
+    def setUp(self):
+        super().setUp()
+        caches["local"].clear()
+
+    def transform_url(self, query, name=None):
+        return f"{reverse('media-transform', args=[name or self.name])}?{query}"
+
+    def cached_files(self):
+        root = os.path.join(self.media_root, "cache", "transforms")
+        return [
+            os.path.join(directory, filename)
+            for directory, _, files in os.walk(root)
+            if os.path.basename(directory) != "locks"
+            for filename in files
+        ]
+
+    def test_renders_once_and_serves_from_cache(self):
+        response = self.client.get(self.transform_url("w=320"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 240))
+        self.assertEqual(len(self.cached_files()), 1)
+
+        etag = response["ETag"]
+        response = self.client.get(self.transform_url("w=320"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.cached_files()), 1)
+
+        response = self.client.get(self.transform_url("h=128&fmt=jpeg"))
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (171, 128))
+        self.assertEqual(len(self.cached_files()), 2)
+
+    def test_rejects_sizes_and_formats_outside_the_allow_list(self):
+        for query in ("", "w=321", "w=abc", "w=320&fmt=gif"):
+            self.assertEqual(self.client.get(self.transform_url(query)).status_code, 400)
+        response = self.client.get(
+            reverse("media-transform", args=["blobs/missing.jpg"]) + "?w=320"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_variants_are_not_sources(self):
+        self.client.get(self.transform_url("w=640"))
+        (variant,) = self.cached_files()
+        name = os.path.relpath(variant, self.media_root)
+        response = self.client.get(self.transform_url("w=320", name=name))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_renders_are_throttled_per_client(self):
+        rates = {"media_transform": "1/hour"}
+        with mock.patch.dict(TransformRenderRateThrottle.THROTTLE_RATES, rates):
+            self.assertEqual(self.client.get(self.transform_url("w=320")).status_code, 200)
+            response = self.client.get(self.transform_url("w=640"))
+            self.assertEqual(response.status_code, 429)
+            self.assertIn("Retry-After", response)
+            # Las variantes ya en caché se siguen sirviendo.
+            self.assertEqual(self.client.get(self.transform_url("w=320")).status_code, 200)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_never_upscales(self):
+        response = self.client.get(self.transform_url("w=1920"))
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (800, 600))
+
+    def test_trim_evicts_least_recently_used(self):
+        self.client.get(self.transform_url("w=320"))
+        self.client.get(self.transform_url("w=640"))
+        older, newer = sorted(self.cached_files(), key=os.path.getsize)
+        os.utime(older, (1, 1))
+        # Cabe la más reciente, con margen hasta el 90 %, pero no las dos.
+        max_bytes = os.path.getsize(newer) * 10 // 9 + 1
+        self.assertLess(max_bytes, os.path.getsize(older) + os.path.getsize(newer))
+        with override_settings(MEDIA_TRANSFORM_CACHE_MAX_BYTES=max_bytes):
+            self.assertEqual(trim_transform_cache(), 1)
+        self.assertEqual(self.cached_files(), [newer])
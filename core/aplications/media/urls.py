@@ -0,0 +1,19 @@
+from django.urls import path
+
+from .views import (
+    UploadCompleteView,
+    UploadSessionCreateView,
+    UploadSessionView,
+    transform_media,
+)
+
+urlpatterns = [
+    path("uploads/", UploadSessionCreateView.as_view(), name="upload-create"),
+    path("uploads/<uuid:session_id>/", UploadSessionView.as_view(), name="upload-session"),
+    path(
+        "uploads/<uuid:session_id>/complete/",
+        UploadCompleteView.as_view(),
+        name="upload-complete",
+    ),
+    path("transform/<path:name>", transform_media, name="media-transform"),
+]
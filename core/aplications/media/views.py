@@ -0,0 +1,347 @@
+import math
+import os
+from urllib.parse import quote
+
+from aplications.posts.helpers.editing import EDIT_WINDOW_ERROR, edit_window_closed
+from aplications.posts.helpers.search import index_posts
+from aplications.posts.models import Post
+from aplications.posts.serializers import PostSerializer
+from core.throttling import PostCreateRateThrottle, TransformRenderRateThrottle
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from PIL import Image
+from rest_framework.views import APIView
+
+from .helpers.pipeline import InvalidImage, validate_image_upload
+from .helpers.serving import content_type, iter_range, parse_range, validators
+from .helpers.transforms import (
+    TransformError,
+    cached_transform,
+    get_transform,
+    parse_transform,
+)
+from .helpers.uploads import (
+    UploadError,
+    assembled_file,
+    create_session,
+    discard_session,
+    write_chunk,
+)
+from .models import UploadSession
+from .serializers import CompleteUploadSerializer, UploadSessionSerializer
+
+
+def error_response(exc):
+    return Response({"error": str(exc)}, status=exc.status_code)
+
+
+class UploadSessionCreateView(APIView):
+    """
+    Vista para iniciar una subida por partes.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Iniciar subida por partes",
+        operation_description="Crea una sesión de subida reanudable para un fichero del tamaño indicado. Requiere un token JWT válido.",
+        request_body=UploadSessionSerializer,
+        responses={
+            201: UploadSessionSerializer,
+            400: openapi.Response(description="Solicitud incorrecta"),
+            429: openapi.Response(description="Demasiadas subidas en curso"),
+            507: openapi.Response(description="Espacio temporal agotado"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = create_session(request.user, **serializer.validated_data)
+        except UploadError as exc:
+            return error_response(exc)
+        return Response(
+            UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED
+        )
+
+
+class UploadSessionView(APIView):
+    """
+    Vista para consultar, enviar partes o cancelar una subida.
+    """
+
+    def get_session(self, request, session_id):
+        return get_object_or_404(UploadSession, pk=session_id, user=request.user)
+
+    @swagger_auto_schema(
+        operation_summary="Estado de una subida",
+        operation_description="Devuelve cuántos bytes se han recibido, para reanudar la subida desde ahí. Requiere un token JWT válido.",
+        responses={200: UploadSessionSerializer},
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, session_id, *args, **kwargs):
+        return Response(
+            UploadSessionSerializer(self.get_session(request, session_id)).data,
+            status=status.HTTP_200_OK,
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Enviar una parte",
+        operation_description="Escribe los bytes del cuerpo en la posición indicada por Content-Range (bytes inicio-fin/total). La parte debe empezar en el último byte recibido y llevar su SHA-256 en la cabecera X-Chunk-SHA256. Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "Content-Range",
+                openapi.IN_HEADER,
+                description="Rango de la parte: bytes inicio-fin/total",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "X-Chunk-SHA256",
+                openapi.IN_HEADER,
+                description="SHA-256 en hexadecimal de la parte",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        responses={
+            200: UploadSessionSerializer,
+            409: openapi.Response(description="La parte no empieza en el último byte recibido"),
+            422: openapi.Response(description="El checksum no coincide"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def put(self, request, session_id, *args, **kwargs):
+        """
+        El cuerpo se lee por bloques directamente del stream de la petición.
+        """
+        session = self.get_session(request, session_id)
+        try:
+            session.received = write_chunk(
+                session,
+                request.stream,
+                request.headers.get("Content-Range"),
+                int(request.headers.get("Content-Length") or 0),
+                request.headers.get("X-Chunk-SHA256"),
+            )
+        except UploadError as exc:
+            return error_response(exc)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Cancelar una subida",
+        operation_description="Elimina la sesión y los datos recibidos. Requiere un token JWT válido.",
+        responses={204: openapi.Response(description="Subida cancelada")},
+        security=[{"Bearer": []}],
+    )
+    def delete(self, request, session_id, *args, **kwargs):
+        discard_session(self.get_session(request, session_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadCompleteView(APIView):
+    """
+    Vista para finalizar una subida y asociar el fichero a una publicación.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Finalizar subida por partes",
+        operation_description="Comprueba que el fichero esté completo y sea una imagen válida y lo asigna como imagen de la publicación indicada (post_id) o de una nueva (content, tag_names). Requiere un token JWT válido.",
+        request_body=CompleteUploadSerializer,
+        responses={
+            200: PostSerializer,
+            201: PostSerializer,
+            400: openapi.Response(description="Solicitud incorrecta"),
+            409: openapi.Response(description="Subida incompleta"),
+            429: openapi.Response(description="Demasiadas publicaciones"),
+        },
+        security=[{"Bearer": []}],
+    )
+    @transaction.atomic
+    def post(self, request, session_id, *args, **kwargs):
+        """
+        Aplica las mismas reglas que crear (límite ``post_create``) o editar
+        (ventana de 24 horas) una publicación, y todo en una transacción.
+        """
+        session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+        target = CompleteUploadSerializer(data=request.data)
+        target.is_valid(raise_exception=True)
+        post = None
+        if "post_id" in target.validated_data:
+            post = get_object_or_404(
+                Post, pk=target.validated_data["post_id"], author=request.user
+            )
+            if edit_window_closed(post):
+                return Response(
+                    {"error": EDIT_WINDOW_ERROR}, status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            throttle = PostCreateRateThrottle()
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+            serializer = PostSerializer(
+                data={
+                    "author": request.user.username,
+                    "content": target.validated_data["content"],
+                    "tag_names": target.validated_data.get("tag_names", []),
+                },
+                context={"request": request},
+            )
+            serializer.is_valid(raise_exception=True)
+
+        try:
+            upload = assembled_file(session)
+        except UploadError as exc:
+            return error_response(exc)
+        with upload:
+            try:
+                validate_image_upload(upload)
+            except InvalidImage as exc:
+                return Response({"image": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+            # Al guardar, el fichero temporal se mueve a MEDIA_ROOT sin copiarlo.
+            if post is None:
+                post = serializer.save(image=upload)
+                index_posts([post.id])
+                response_status = status.HTTP_201_CREATED
+            else:
+                post.image = upload
+                post.save()
+                response_status = status.HTTP_200_OK
+        discard_session(session)
+        return Response(PostSerializer(post).data, status=response_status)
+
+
+@require_safe
+def serve_media(request, name):
+    """
+    Sirve un fichero de MEDIA_ROOT con ETag, Last-Modified y Cache-Control,
+    respondiendo 304 a las peticiones condicionales y 206 a las de rango.
+
+    Con ``MEDIA_SENDFILE_BACKEND`` la vista solo valida la petición y delega
+    el envío de los bytes en el proxy (``X-Accel-Redirect`` en nginx,
+    ``X-Sendfile`` en Apache/lighttpd), que también atiende los rangos. Sin
+    él, ``FileResponse`` entrega el descriptor al servidor WSGI, que puede
+    usar ``sendfile``.
+    """
+    try:
+        path = default_storage.path(name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404("File not found.")
+    if not os.path.isfile(path):
+        raise Http404("File not found.")
+
+    return _serve_file(request, name, path, stat.st_size, *validators(name, stat))
+
+
+@require_safe
+def transform_media(request, name):
+    """
+    Sirve ``name`` redimensionada a ``?w=`` y/o ``?h=`` en el formato
+    ``?fmt=`` (``webp`` por defecto). Solo se aceptan los tamaños de
+    ``MEDIA_TRANSFORM_SIZES``, para que la caché no crezca con combinaciones
+    arbitrarias. La primera petición renderiza la variante en el pool del
+    pipeline; las siguientes la sirven desde la caché en disco. Las
+    variantes en caché no se aceptan como original, y los renderizados de
+    cada cliente están limitados por ``TransformRenderRateThrottle``.
+    """
+    try:
+        width, height, fmt = parse_transform(request.GET)
+    except TransformError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    try:
+        hit = cached_transform(name, width, height, fmt)
+        if hit is None:
+            throttle = TransformRenderRateThrottle()
+            if not throttle.allow_request(request, None):
+                response = JsonResponse(
+                    {"error": "Too many image transformations. Try again later."},
+                    status=429,
+                )
+                response["Retry-After"] = str(math.ceil(throttle.wait() or 1))
+                return response
+        cached, path = hit or get_transform(name, width, height, fmt)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404("File not found.")
+    except (OSError, Image.DecompressionBombError):
+        return JsonResponse({"error": "File is not a valid image."}, status=400)
+
+    # El mtime de la variante cambia con cada acierto de la caché, así que
+    # los validadores salen de la clave y del original.
+    source = os.stat(default_storage.path(name))
+    _, last_modified, cache_control = validators(name, source)
+    etag = quote_etag(os.path.basename(cached).split(".")[0])
+    return _serve_file(
+        request, cached, path, os.path.getsize(path), etag, last_modified, cache_control
+    )
+
+
+def _serve_file(request, name, path, size, etag, last_modified, cache_control):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _file_response(request, name, path, size, etag, last_modified)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def _file_response(request, name, path, size, etag, last_modified):
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend == "nginx":
+        response = HttpResponse(content_type=content_type(name))
+        response["X-Accel-Redirect"] = settings.MEDIA_SENDFILE_PREFIX + quote(name)
+        return response
+    if backend == "xsendfile":
+        response = HttpResponse(content_type=content_type(name))
+        response["X-Sendfile"] = path
+        return response
+
+    byte_range = None
+    if _range_applies(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(path, start, end - start + 1),
+            status=206,
+            content_type=content_type(name),
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type(name))
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _range_applies(request, etag, last_modified):
+    # If-Range: el rango solo vale si el fichero no ha cambiado.
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
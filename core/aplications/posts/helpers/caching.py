@@ -0,0 +1,145 @@
+"""
+Cachés de lectura de publicaciones sobre ``core.cache``.
+
+Los listados guardan solo ids ordenados y cada entidad se guarda una vez:
+
+* ``feeds``: los ids del feed de cada usuario (grupo = id del usuario). Una
+  publicación nueva o borrada cambia el feed de su autor y de sus
+  seguidores; seguir o dejar de seguir, el de quien sigue.
+* ``post_lists``: páginas de ids (y la posición de la siguiente) de las
+  publicaciones de un autor (grupo ``author:<id>``) o de una etiqueta
+  (grupo ``tag:<id>``).
+* ``post_records``, ``author_records`` y ``tag_records``: una entrada por
+  publicación (con sus contadores), por autor y por etiqueta. Editar una
+  entidad, o darle like, solo borra su propia entrada: los listados que la
+  incluyen siguen siendo válidos.
+* ``comment_lists``: los comentarios de cada publicación (grupo = id de la
+  publicación), con el id del autor; su nombre sale de ``author_records``.
+
+Al invalidar se renuevan también los validadores HTTP (``core.conditional``)
+de las respuestas afectadas: ``feed:<usuario>`` (a quién sigue),
+``posts:<autor>`` (sus publicaciones, con contadores y nombre),
+``comments:<publicación>``, ``author:<autor>`` (su entrada en
+``author_records``) y ``tags``. El feed se valida al leerlo con
+``feed:<usuario>`` y el ``posts:<autor>`` de cada autor que incluye, así
+que un like solo renueva el validador de su autor y no el de cada seguidor.
+
+Las invalidaciones se acumulan por hilo y se aplican al confirmar la
+transacción, de modo que borrar una publicación con miles de likes en
+cascada cuesta dos consultas y una escritura en la caché, no una por fila.
+"""
+
+import threading
+
+from aplications.users.models import Follow
+from core.cache import CacheNamespace
+from core.conditional import bump
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Post
+
+feeds = CacheNamespace("feeds", timeout=settings.FEED_CACHE_TIMEOUT)
+post_lists = CacheNamespace("post-lists", timeout=settings.POST_LIST_CACHE_TIMEOUT)
+post_records = CacheNamespace("post-records", timeout=settings.ENTITY_CACHE_TIMEOUT)
+author_records = CacheNamespace("author-records", timeout=settings.ENTITY_CACHE_TIMEOUT)
+tag_records = CacheNamespace("tag-records", timeout=settings.ENTITY_CACHE_TIMEOUT)
+comment_lists = CacheNamespace("comments", timeout=settings.COMMENTS_CACHE_TIMEOUT)
+
+_pending = threading.local()
+
+
+def _pending_sets():
+    if not hasattr(_pending, "users"):
+        _pending.users = set()
+        _pending.authors = set()
+        _pending.tags = set()
+        _pending.comment_posts = set()
+        _pending.post_records = set()
+        _pending.author_records = set()
+        _pending.tag_records = set()
+    return _pending
+
+
+def invalidate_feeds(user_ids=(), author_ids=(), tag_ids=(), comment_post_ids=()):
+    """
+    Programa para después del commit la invalidación de los feeds de
+    ``user_ids``, de los listados de ``author_ids`` (sus publicaciones y los
+    feeds de sus seguidores), de los de ``tag_ids`` y de los comentarios de
+    ``comment_post_ids``.
+    """
+    pending = _pending_sets()
+    pending.users.update(user_ids)
+    pending.authors.update(author_ids)
+    pending.tags.update(tag_ids)
+    pending.comment_posts.update(comment_post_ids)
+    # Cada commit vacía lo acumulado; los callbacks siguientes no hacen nada.
+    # Lo que quede de una transacción revertida se aplica en la siguiente.
+    transaction.on_commit(_flush)
+
+
+def invalidate_records(post_ids=(), author_ids=(), tag_ids=()):
+    """
+    Programa para después del commit el borrado de las entradas de esas
+    publicaciones, autores y etiquetas, sin tocar los listados.
+    """
+    pending = _pending_sets()
+    pending.post_records.update(post_ids)
+    pending.author_records.update(author_ids)
+    pending.tag_records.update(tag_ids)
+    transaction.on_commit(_flush)
+
+
+def _take(values):
+    taken = set(values)
+    values.clear()
+    return taken
+
+
+def _flush():
+    pending = _pending_sets()
+    users, authors, tags = (
+        _take(pending.users),
+        _take(pending.authors),
+        _take(pending.tags),
+    )
+    comment_posts = _take(pending.comment_posts)
+    changed_posts = _take(pending.post_records)
+    changed_authors = _take(pending.author_records)
+    author_keys = [f"author:{pk}" for pk in changed_authors]
+    changed_tags = _take(pending.tag_records)
+    for namespace, keys in (
+        (post_records, changed_posts),
+        (author_records, changed_authors),
+        (tag_records, changed_tags),
+    ):
+        if keys:
+            namespace.delete_many(list(keys))
+    if changed_posts:
+        changed_authors.update(
+            Post.objects.filter(pk__in=changed_posts).values_list("author_id", flat=True)
+        )
+    changed_authors.update(authors)
+    feed_users = users | authors
+    if authors:
+        feed_users.update(
+            Follow.objects.filter(followed_id__in=authors).values_list(
+                "follower_id", flat=True
+            )
+        )
+    if feed_users:
+        feeds.invalidate(*feed_users)
+    groups = [f"author:{pk}" for pk in authors] + [f"tag:{pk}" for pk in tags]
+    if groups:
+        post_lists.invalidate(*groups)
+    if comment_posts:
+        comment_lists.invalidate(*comment_posts)
+
+    # Validadores HTTP, una vez invalidados los datos.
+    keys = [f"feed:{pk}" for pk in users] + author_keys
+    keys += [f"posts:{pk}" for pk in changed_authors]
+    keys += [f"comments:{pk}" for pk in comment_posts]
+    if changed_tags:
+        keys.append("tags")
+    if keys:
+        bump(*keys)
@@ -0,0 +1,20 @@
+"""
+Reglas para modificar una publicación ya creada, compartidas por las vistas
+que la editan.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+EDIT_WINDOW = timedelta(hours=24)
+EDIT_WINDOW_ERROR = (
+    "No se puede actualizar la publicación después de 24 horas de su creación."
+)
+
+
+def edit_window_closed(post):
+    """
+    ``True`` si han pasado más de ``EDIT_WINDOW`` desde que se creó ``post``.
+    """
+    return timezone.now() > post.created_at + EDIT_WINDOW
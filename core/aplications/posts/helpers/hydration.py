@@ -0,0 +1,207 @@
+from aplications.authentication.models import CustomUser
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ..models import Comment, Favorite, Like, Post, Tags
+from ..serializers import (
+    CommentSerializer,
+    KeysetPagination,
+    PostRecordSerializer,
+    PostSerializer,
+)
+from .caching import (
+    author_records,
+    comment_lists,
+    post_lists,
+    post_records,
+    tag_records,
+)
+
+
+def _count(model):
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def with_post_relations(queryset):
+    """
+    Carga autor, etiquetas y contadores de una vez para que ``PostSerializer``
+    no haga consultas por publicación.
+    """
+    return (
+        queryset.select_related("author")
+        .prefetch_related("tag")
+        .annotate(
+            comments_total=_count(Comment),
+            favorites_total=_count(Favorite),
+            likes_total=_count(Like),
+        )
+    )
+
+
+def _author_record(author):
+    return {
+        "username": author.username,
+        "first_name": author.first_name,
+        "last_name": author.last_name,
+    }
+
+
+def _load_author_records(author_ids):
+    return {
+        author.pk: _author_record(author)
+        for author in CustomUser.objects.filter(pk__in=author_ids).only(
+            "username", "first_name", "last_name"
+        )
+    }
+
+
+def _cached_records(namespace, keys, load):
+    """
+    Entradas de ``keys`` en ``namespace``: una lectura múltiple y una sola
+    consulta, ``load(missing)``, para las que falten.
+    """
+    records = namespace.get_many(keys) if keys else {}
+    missing = [key for key in keys if key not in records]
+    if missing:
+        loaded = load(missing)
+        namespace.set_many(loaded)
+        records.update(loaded)
+    return records
+
+
+def _load_post_records(post_ids, authors, tags):
+    """
+    Carga las publicaciones de ``post_ids`` con su autor y sus etiquetas, y
+    guarda de paso sus entradas en ``authors`` y ``tags``.
+    """
+    records, pending = {}, {}
+    for post in with_post_relations(Post.objects.filter(pk__in=post_ids)):
+        record = dict(PostRecordSerializer(post).data)
+        # Las variantes de la imagen llegan sin pasar por save().
+        if post.image and post.image_width is None:
+            pending[post.pk] = record
+        else:
+            records[post.pk] = record
+        authors[post.author_id] = _author_record(post.author)
+        tags.update((tag.pk, tag.name) for tag in post.tag.all())
+    post_records.set_many(records)
+    post_records.set_many(pending, timeout=settings.POST_RECORD_PENDING_TIMEOUT)
+    author_records.set_many(authors)
+    tag_records.set_many(tags)
+    return {**records, **pending}
+
+
+def serialize_posts(post_ids):
+    """
+    Datos de ``PostSerializer`` de las publicaciones de ``post_ids``, en ese
+    orden, a partir de las entradas de publicación, autor y etiqueta en
+    caché. Las que falten se cargan con una consulta por tipo de entidad; las
+    publicaciones que ya no existen se omiten.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    authors, tags = {}, {}
+    posts = post_records.get_many(post_ids) if post_ids else {}
+    missing = [post_id for post_id in post_ids if post_id not in posts]
+    if missing:
+        posts.update(_load_post_records(missing, authors, tags))
+    author_ids = {post["author_id"] for post in posts.values()}
+    authors.update(
+        _cached_records(
+            author_records, list(author_ids - authors.keys()), _load_author_records
+        )
+    )
+    tag_ids = {tag_id for post in posts.values() for tag_id in post["tag_ids"]}
+    tags.update(
+        _cached_records(
+            tag_records,
+            list(tag_ids - tags.keys()),
+            lambda missing: dict(
+                Tags.objects.filter(pk__in=missing).values_list("id", "name")
+            ),
+        )
+    )
+    return [
+        _combine(posts[post_id], authors, tags)
+        for post_id in post_ids
+        if post_id in posts and posts[post_id]["author_id"] in authors
+    ]
+
+
+def _combine(record, authors, tags):
+    author = authors[record["author_id"]]
+    data = {
+        **record,
+        "author": author["username"],
+        "author_first_name": author["first_name"],
+        "author_last_name": author["last_name"],
+        "tags_names": [tags[tag_id] for tag_id in record["tag_ids"] if tag_id in tags],
+    }
+    return {field: data[field] for field in PostSerializer.Meta.fields if field in data}
+
+
+def comment_records(post):
+    """
+    Comentarios de ``post`` en ``comment_lists``, con el id del autor en
+    ``author``: el nombre sale de ``author_records`` al serializarlos, así
+    que cambiarlo no deja la lista desactualizada.
+    """
+
+    def load():
+        comments = list(Comment.objects.filter(post=post).select_related("author"))
+        return [
+            {**data, "author": comment.author_id}
+            for comment, data in zip(comments, CommentSerializer(comments, many=True).data)
+        ]
+
+    return comment_lists.get_or_set(post.pk, load, group=post.pk)
+
+
+def serialize_comments(records):
+    """
+    Datos de ``CommentSerializer`` de ``records`` (de ``comment_records``).
+    """
+    authors = _cached_records(
+        author_records,
+        list({record["author"] for record in records}),
+        _load_author_records,
+    )
+    return [
+        {**record, "author": authors[record["author"]]["username"]}
+        for record in records
+        if record["author"] in authors
+    ]
+
+
+def paginate_post_ids(
+    request, queryset, group, ordering=("-created_at", "-id"), page_size=None
+):
+    """
+    Página de ids de publicaciones de ``queryset`` con ``KeysetPagination``.
+    Cada página (la primera o la de cada cursor) se guarda en ``post_lists``
+    bajo ``group`` hasta que se publique o borre algo en ese listado.
+    ``queryset`` debe dar el id de la publicación como última columna de
+    ``ordering``.
+    """
+    paginator = KeysetPagination(ordering=ordering, page_size=page_size)
+    paginator.request = request
+    # Un cursor inválido da 404 antes de tocar la caché.
+    paginator.decode_cursor(request)
+    fields = [field.lstrip("-") for field in paginator.ordering]
+
+    def load():
+        rows = paginator.paginate_queryset(queryset.values(*fields), request)
+        return [row[fields[-1]] for row in rows], paginator.next_position
+
+    cursor = request.query_params.get(paginator.cursor_query_param, "")
+    post_ids, paginator.next_position = post_lists.get_or_set(
+        (paginator.page_size, cursor), load, group=group
+    )
+    return paginator, post_ids
@@ -0,0 +1,65 @@
+import re
+
+from django.db.models.functions import Lower
+
+from aplications.authentication.models import CustomUser
+
+from ..models import Mention, Tags
+
+TAG_MAX_LENGTH = Tags._meta.get_field("name").max_length
+
+# Una etiqueta necesita al menos una letra ("#1" no lo es) y no puede ir
+# pegada a otra palabra, a otra "#" ni a "&" (entidades HTML como "&#39;").
+HASHTAG_RE = re.compile(r"(?<![\w#&])#(\w*[^\W\d]\w*)")
+# Un punto final no forma parte del nombre.
+MENTION_RE = re.compile(r"(?<![\w@])@(\w+(?:\.\w+)*)")
+
+
+def extract_hashtags(content):
+    """
+    Nombres de las ``#etiquetas`` de ``content`` en orden de aparición.
+    """
+    return list(
+        dict.fromkeys(
+            match.lower()
+            for match in HASHTAG_RE.findall(content)
+            if len(match) <= TAG_MAX_LENGTH
+        )
+    )
+
+
+def extract_mentions(content):
+    """
+    Usernames mencionados con ``@`` en ``content`` en orden de aparición.
+    """
+    return list(dict.fromkeys(match.lower() for match in MENTION_RE.findall(content)))
+
+
+def sync_mentions(post, created=False):
+    """
+    Ajusta las menciones de ``post`` a su contenido actual: resuelve todos los
+    usernames en una consulta, inserta las nuevas en bloque y borra las que
+    ya no aparecen. Con ``created`` se omite la lectura de las existentes.
+    """
+    usernames = extract_mentions(post.content)
+    # Los usernames conservan sus mayúsculas, así que se comparan en minúsculas.
+    user_ids = set(
+        CustomUser.objects.annotate(username_lower=Lower("username"))
+        .filter(username_lower__in=usernames, is_active=True)
+        .values_list("id", flat=True)
+        if usernames
+        else ()
+    )
+    existing = set() if created else set(post.mentions.values_list("user_id", flat=True))
+    stale = existing - user_ids
+    if stale:
+        post.mentions.filter(user_id__in=stale).delete()
+    new = user_ids - existing
+    if new:
+        Mention.objects.bulk_create(
+            [
+                Mention(post=post, user_id=user_id, created_at=post.created_at)
+                for user_id in new
+            ],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import IntegerField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from ..models import Post
+from .tags import normalize_tag_name
+
+FTS_TABLE = "posts_post_fts"
+
+
+def _fts5_query(query):
+    # Cada término entre comillas para que la entrada del usuario no se
+    # interprete como sintaxis de FTS5.
+    return " ".join('"%s"' % term.replace('"', '""') for term in query.split())
+
+
+def index_posts(post_ids):
+    """
+    Actualiza el índice de búsqueda de las publicaciones indicadas: la columna
+    ``search_vector`` en Postgres o la tabla FTS5 en SQLite.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchVector
+
+        Post.objects.filter(pk__in=post_ids).update(
+            search_vector=SearchVector("content", config=settings.POST_SEARCH_CONFIG)
+        )
+        return
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", post_ids
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, content) "
+            f"SELECT id, content FROM posts_post WHERE id IN ({placeholders})",
+            post_ids,
+        )
+
+
+def unindex_posts(post_ids):
+    """
+    Quita del índice de SQLite las publicaciones borradas. En Postgres el
+    índice es una columna de la propia fila y desaparece con ella.
+    """
+    post_ids = list(post_ids)
+    if not post_ids or connection.vendor == "postgresql":
+        return
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", post_ids
+        )
+
+
+def search_posts(query, tag=None, author=None):
+    """
+    Publicaciones que coinciden con ``query`` anotadas con ``rank`` (entero,
+    mayor es mejor) para paginarlas por ``("-rank", "-id")``.
+    """
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config=settings.POST_SEARCH_CONFIG, search_type="websearch"
+        )
+        posts = Post.objects.filter(search_vector=search_query).annotate(
+            rank=Cast(SearchRank("search_vector", search_query) * 1_000_000, IntegerField())
+        )
+    else:
+        match = _fts5_query(query)
+        posts = Post.objects.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        ).annotate(
+            rank=RawSQL(
+                f"SELECT CAST(-bm25({FTS_TABLE}) * 1000000 AS INTEGER) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = posts_post.id",
+                (match,),
+                output_field=IntegerField(),
+            )
+        )
+    if tag:
+        posts = posts.filter(tag__name=normalize_tag_name(tag))
+    if author:
+        posts = posts.filter(author__username=author)
+    return posts
@@ -0,0 +1,208 @@
+import threading
+from collections import Counter, OrderedDict
+
+from core.prefix_index import PrefixIndex, RefreshedPrefixIndex
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from ..models import PostTag, Tags
+from .caching import invalidate_feeds
+
+
+def normalize_tag_name(name):
+    """
+    Forma canónica de una etiqueta: sin espacios ni ``#`` inicial y en
+    minúsculas, para que "Django" y "#django" sean la misma fila.
+    """
+    return name.strip().lstrip("#").strip().lower()
+
+
+class TagIdCache:
+    """
+    LRU acotado de nombre normalizado -> id compartido por los hilos del
+    worker. Las etiquetas casi nunca se borran, así que basta con invalidar
+    la entrada en ``post_delete``.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        found = {}
+        with self._lock:
+            for name in names:
+                tag_id = self._entries.get(name)
+                if tag_id is not None:
+                    self._entries.move_to_end(name)
+                    found[name] = tag_id
+        return found
+
+    def set_many(self, mapping):
+        max_size = self.max_size or settings.TAG_ID_CACHE_SIZE
+        with self._lock:
+            for name, tag_id in mapping.items():
+                self._entries[name] = tag_id
+                self._entries.move_to_end(name)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tag_ids = TagIdCache()
+
+
+class TagAutocompleteIndex(RefreshedPrefixIndex):
+    """
+    Índice en memoria de las ``TAG_AUTOCOMPLETE_SIZE`` etiquetas más usadas,
+    ponderadas por número de publicaciones y agrupadas por tipo. Se
+    reconstruye en segundo plano cada ``TAG_AUTOCOMPLETE_REFRESH`` segundos
+    y entre medias se actualiza en el sitio: las altas al crear la etiqueta y
+    los usos acumulados, de una vez, en la siguiente búsqueda.
+    """
+
+    thread_name = "tag-autocomplete"
+
+    def __init__(self):
+        super().__init__()
+        self._pending = Counter()
+        self._pending_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def refresh_interval(self):
+        return settings.TAG_AUTOCOMPLETE_REFRESH
+
+    @staticmethod
+    def _entry(name, tag_type, count):
+        return name, count, {"name": name, "type": tag_type, "count": count}, tag_type
+
+    def entries(self):
+        tags = (
+            Tags.objects.annotate(usage=Count("posttag"))
+            .order_by("-usage", "id")
+            .values_list("name", "type", "usage")[: settings.TAG_AUTOCOMPLETE_SIZE]
+        )
+        return (self._entry(*row) for row in tags.iterator(chunk_size=5000))
+
+    def make_index(self, entries):
+        return PrefixIndex(entries, max_size=settings.TAG_AUTOCOMPLETE_SIZE)
+
+    def search(self, prefix, limit, tag_type=None):
+        prefix = normalize_tag_name(prefix)
+        index = self.index()
+        if index is None:
+            tags = Tags.objects.filter(name__startswith=prefix)
+            if tag_type is not None:
+                tags = tags.filter(type=tag_type)
+            tags = tags.annotate(usage=Count("posttag")).order_by("-usage", "id")
+            return [
+                self._entry(*row)[2]
+                for row in tags.values_list("name", "type", "usage")[:limit]
+            ]
+        self._apply_usage(index)
+        return index.search(prefix, limit, group=tag_type)
+
+    def add(self, name, tag_type=None):
+        """
+        Inserta una etiqueta nueva. No hace nada si el índice aún no se ha
+        construido: la primera reconstrucción ya la incluirá.
+        """
+        index = self._index
+        if index is None:
+            return
+        with self._update_lock:
+            current = index.get(name)
+            count = 0 if current is None else current[0]
+            index.upsert(*self._entry(name, tag_type, count))
+
+    def count_usage(self, names):
+        """
+        Suma un uso a cada etiqueta de ``names``. Solo se acumula: se aplica
+        al índice en la siguiente búsqueda.
+        """
+        if self._index is None:
+            return
+        with self._pending_lock:
+            self._pending.update(names)
+
+    def _apply_usage(self, index):
+        if not self._pending:
+            return
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+        with self._update_lock:
+            entries = []
+            for name, used in pending.items():
+                current = index.get(name)
+                if current is None:
+                    entries.append(self._entry(name, None, used))
+                else:
+                    count, payload = current
+                    entries.append(self._entry(name, payload["type"], count + used))
+            index.upsert_many(entries)
+
+
+tag_autocomplete = TagAutocompleteIndex()
+
+
+def resolve_tags(names):
+    """
+    Devuelve ``{nombre: id}`` para los nombres ya normalizados, creando los
+    que falten. Como máximo tres consultas para cualquier número de etiquetas:
+    un ``SELECT ... IN``, un ``INSERT`` de las nuevas y otro ``SELECT`` para
+    sus ids (``ignore_conflicts`` no los devuelve en todos los motores).
+    """
+    resolved = tag_ids.get_many(names)
+    missing = [name for name in names if name not in resolved]
+    if missing:
+        found = dict(
+            Tags.objects.filter(name__in=missing).values_list("name", "id")
+        )
+        tag_ids.set_many(found)
+        resolved.update(found)
+        new = [name for name in missing if name not in found]
+        if new:
+            # Otro worker puede crear la misma etiqueta a la vez; el conflicto
+            # se ignora y el id se lee después.
+            Tags.objects.bulk_create(
+                [Tags(name=name) for name in new], ignore_conflicts=True
+            )
+            created = dict(Tags.objects.filter(name__in=new).values_list("name", "id"))
+            resolved.update(created)
+            # Si la transacción se deshace, esos ids no deben quedar en caché.
+            transaction.on_commit(lambda: tag_ids.set_many(created))
+    return resolved
+
+
+def attach_tags(post, names):
+    """
+    Asocia las etiquetas ``names`` a ``post`` con una sola inserción en la
+    tabla intermedia. Devuelve los nombres normalizados, sin duplicados.
+    """
+    names = list(dict.fromkeys(filter(None, map(normalize_tag_name, names))))
+    if not names:
+        return names
+    resolved = resolve_tags(names)
+    PostTag.objects.bulk_create(
+        [
+            PostTag(post=post, tag_id=resolved[name], created_at=post.created_at)
+            for name in names
+        ],
+        ignore_conflicts=True,
+    )
+    invalidate_feeds(tag_ids=[resolved[name] for name in names])
+    transaction.on_commit(lambda: _count_usage(names))
+    return names
+
+
+def _count_usage(names):
+    tag_autocomplete.count_usage(names)
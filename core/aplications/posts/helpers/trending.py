@@ -0,0 +1,225 @@
+"""
+Etiquetas en tendencia con contadores de decaimiento exponencial.
+
+Cada uso de una etiqueta suma ``2 ** ((bucket - epoch) / half_life)``, donde
+``bucket`` es el inicio del intervalo fijo de ``TRENDING_TAGS_BUCKET`` segundos
+en el que ocurrió y ``epoch`` un instante de referencia. Como todas las
+puntuaciones decaen al mismo ritmo, el orden relativo no cambia con el paso
+del tiempo: basta con sumar al registrar un uso y dividir por
+``2 ** ((now - epoch) / half_life)`` al leer. No hace falta recalcular nada ni
+hacer un ``GROUP BY`` sobre ``posts_post_tag``.
+
+Con Redis las puntuaciones viven en un sorted set compartido por todos los
+workers (``ZINCRBY`` al escribir, ``ZREVRANGE`` al leer: O(log N + K)). Sin
+Redis cada proceso mantiene su propio contador y un top-K en memoria, y
+olvida las etiquetas cuyo peso actual baja de ``TRENDING_TAGS_MIN_SCORE`` al
+cambiar de época o cuando guarda más de ``TRENDING_TAGS_LOCAL_MAX``.
+"""
+
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+
+import redis
+from core.cache import CacheNamespace
+from core.redis_client import get_redis, mark_unavailable
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import PostTag
+
+rankings = CacheNamespace(
+    "trending",
+    timeout=settings.TRENDING_TAGS_CACHE_TIMEOUT,
+    near_timeout=settings.TRENDING_TAGS_CACHE_TIMEOUT,
+)
+
+# Cada época dura 64 vidas medias para que los pesos no desborden. En Redis
+# cada uso se suma también, con el peso relativo a su inicio, al sorted set de
+# la época siguiente, que así ya tiene el historial reciente cuando empieza.
+EPOCH_HALF_LIVES = 64
+
+
+def _epoch_length():
+    return settings.TRENDING_TAGS_HALF_LIFE * EPOCH_HALF_LIVES
+
+
+def _epoch_start(now):
+    return now - now % _epoch_length()
+
+
+def _weight(timestamp, epoch_start):
+    bucket = timestamp - timestamp % settings.TRENDING_TAGS_BUCKET
+    return 2 ** ((bucket - epoch_start) / settings.TRENDING_TAGS_HALF_LIFE)
+
+
+def _decay(now, epoch_start):
+    return 2 ** ((now - epoch_start) / settings.TRENDING_TAGS_HALF_LIFE)
+
+
+class LocalTrendingTags:
+    """
+    Contadores por proceso con el top-K mantenido de forma incremental.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._scores = {}
+        self._top = {}
+        self._ranking = None
+        self.warmed = False
+
+    def record(self, names, timestamp):
+        with self._lock:
+            epoch = _epoch_start(time.time())
+            if epoch != self._epoch:
+                self._rebase(epoch)
+            weight = _weight(timestamp, epoch)
+            for name in names:
+                score = self._scores.get(name, 0.0) + weight
+                self._scores[name] = score
+                self._promote(name, score)
+            if len(self._scores) > settings.TRENDING_TAGS_LOCAL_MAX:
+                self._prune()
+            self._ranking = None
+
+    def _rebase(self, epoch):
+        if self._epoch is not None:
+            factor = 2 ** ((self._epoch - epoch) / settings.TRENDING_TAGS_HALF_LIFE)
+            self._scores = {name: score * factor for name, score in self._scores.items()}
+            self._top = {name: score * factor for name, score in self._top.items()}
+        self._epoch = epoch
+        self._prune()
+
+    def _prune(self):
+        """
+        Olvida las etiquetas con un peso actual despreciable y, si siguen
+        siendo demasiadas, se queda con la mitad más pesada. Es O(n), pero
+        solo ocurre al cambiar de época o al llegar al límite.
+        """
+        threshold = settings.TRENDING_TAGS_MIN_SCORE * _decay(time.time(), self._epoch)
+        scores = {name: score for name, score in self._scores.items() if score >= threshold}
+        if len(scores) > settings.TRENDING_TAGS_LOCAL_MAX:
+            scores = dict(
+                heapq.nlargest(
+                    settings.TRENDING_TAGS_LOCAL_MAX // 2,
+                    scores.items(),
+                    key=lambda item: item[1],
+                )
+            )
+        self._scores = scores
+        self._top = dict(
+            heapq.nlargest(
+                settings.TRENDING_TAGS_TOP_K, scores.items(), key=lambda item: item[1]
+            )
+        )
+
+    def _promote(self, name, score):
+        # Las puntuaciones solo crecen, así que una etiqueta entra en el
+        # top-K únicamente cuando supera a la más baja del top.
+        if name in self._top or len(self._top) < settings.TRENDING_TAGS_TOP_K:
+            self._top[name] = score
+            return
+        lowest = min(self._top, key=self._top.get)
+        if score > self._top[lowest]:
+            del self._top[lowest]
+            self._top[name] = score
+
+    def warm(self):
+        """
+        Carga los usos recientes al arrancar el proceso. Solo recorre las
+        publicaciones de las últimas vidas medias, no toda la tabla.
+        """
+        self.warmed = True
+        cutoff = timezone.now() - timedelta(seconds=settings.TRENDING_TAGS_HALF_LIFE * 4)
+        rows = (
+            PostTag.objects.filter(created_at__gte=cutoff)
+            .values_list("tag__name", "created_at")
+            .iterator(chunk_size=2000)
+        )
+        for name, created_at in rows:
+            self.record([name], created_at.timestamp())
+
+    def top(self, limit):
+        with self._lock:
+            if self._epoch is None:
+                return []
+            if self._ranking is None:
+                self._ranking = sorted(
+                    self._top.items(), key=lambda item: (-item[1], item[0])
+                )
+            ranking, epoch = self._ranking, self._epoch
+        decay = _decay(time.time(), epoch)
+        return [
+            {"name": name, "score": round(score / decay, 4)}
+            for name, score in ranking[:limit]
+        ]
+
+
+class TrendingTags:
+    key_prefix = "trending:tags"
+
+    def __init__(self):
+        self.local = LocalTrendingTags()
+
+    def _key(self, epoch):
+        return f"{self.key_prefix}:{int(epoch)}"
+
+    def record(self, names, timestamp=None):
+        names = list(dict.fromkeys(names))
+        if not names:
+            return
+        timestamp = timestamp or time.time()
+        client = get_redis()
+        if client is not None:
+            epoch = _epoch_start(time.time())
+            try:
+                with client.pipeline(transaction=False) as pipe:
+                    for start in (epoch, epoch + _epoch_length()):
+                        key, weight = self._key(start), _weight(timestamp, start)
+                        for name in names:
+                            pipe.zincrby(key, weight, name)
+                        pipe.expire(key, math.ceil(_epoch_length() * 2))
+                    pipe.execute()
+                return
+            except redis.RedisError as exc:
+                mark_unavailable(exc)
+        if not self.local.warmed:
+            # La carga inicial ya incluye esta publicación, que está confirmada.
+            self.local.warm()
+            return
+        self.local.record(names, timestamp)
+
+    def top(self, limit=None):
+        """
+        Ranking actual. Se consulta a menudo y cambia despacio, así que se
+        reutiliza durante ``TRENDING_TAGS_CACHE_TIMEOUT`` segundos desde la
+        memoria de cada proceso.
+        """
+        limit = min(limit or settings.TRENDING_TAGS_TOP_K, settings.TRENDING_TAGS_TOP_K)
+        return rankings.get_or_set(limit, lambda: self._top(limit))
+
+    def _top(self, limit):
+        client = get_redis()
+        if client is not None:
+            now = time.time()
+            epoch = _epoch_start(now)
+            try:
+                rows = client.zrevrange(self._key(epoch), 0, limit - 1, withscores=True)
+            except redis.RedisError as exc:
+                mark_unavailable(exc)
+            else:
+                decay = _decay(now, epoch)
+                return [
+                    {"name": name.decode(), "score": round(score / decay, 4)}
+                    for name, score in rows
+                ]
+        if not self.local.warmed:
+            self.local.warm()
+        return self.local.top(limit)
+
+
+trending_tags = TrendingTags()
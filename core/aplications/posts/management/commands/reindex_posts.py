@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...helpers.search import index_posts
+from ...models import Post
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de publicaciones recorriéndolas por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Reanuda el reindexado a partir de este id",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        last_id = options["start_id"]
+        total = 0
+        while True:
+            # Keyset sobre id: cada lote es un rango del índice primario.
+            ids = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[: options["chunk_size"]]
+            )
+            if not ids:
+                break
+            index_posts(ids)
+            total += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Indexed {total} posts (last id {last_id})")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reindexed {total} posts in {time.monotonic() - started:.1f}s"
+            )
+        )
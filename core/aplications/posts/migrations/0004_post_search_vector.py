@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:17
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Postgres: índice GIN sobre el tsvector. SQLite: tabla FTS5 auxiliar.
+    # El contenido existente se indexa con `manage.py reindex_posts`.
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS "posts_post_search_vector_gin" '
+            'ON "posts_post" USING gin ("search_vector");'
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS "posts_post_fts" USING fts5(content);'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute('DROP INDEX IF EXISTS "posts_post_search_vector_gin";')
+    elif vendor == "sqlite":
+        schema_editor.execute('DROP TABLE IF EXISTS "posts_post_fts";')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_alter_post_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
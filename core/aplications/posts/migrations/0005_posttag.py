@@ -0,0 +1,57 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_created_at(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    PostTag = apps.get_model("posts", "PostTag")
+    PostTag.objects.update(
+        created_at=Subquery(
+            Post.objects.filter(pk=OuterRef("post_id")).values("created_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_search_vector'),
+    ]
+
+    operations = [
+        # La tabla posts_post_tag ya existe (la creó el ManyToManyField
+        # implícito): solo se registra el modelo intermedio en el estado.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='posts.post')),
+                        ('tag', models.ForeignKey(db_column='tags_id', on_delete=django.db.models.deletion.CASCADE, to='posts.tags')),
+                    ],
+                    options={
+                        'db_table': 'posts_post_tag',
+                        'unique_together': {('post', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='tag',
+                    field=models.ManyToManyField(blank=True, through='posts.PostTag', to='posts.tags', verbose_name='tags'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='posttag',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_post_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', 'created_at', 'post'], name='posts_posttag_feed_idx'),
+        ),
+    ]
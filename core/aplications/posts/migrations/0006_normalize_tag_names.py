@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def normalize_tag_names(apps, schema_editor):
+    """
+    Une las etiquetas que solo difieren en mayúsculas o ``#`` inicial en la
+    de menor id y las renombra a su forma normalizada.
+    """
+    Tags = apps.get_model("posts", "Tags")
+    PostTag = apps.get_model("posts", "PostTag")
+
+    groups = {}
+    for tag_id, name in Tags.objects.order_by("id").values_list("id", "name"):
+        groups.setdefault(name.strip().lstrip("#").strip().lower(), []).append(tag_id)
+
+    for name, (keep, *duplicates) in groups.items():
+        if duplicates:
+            posts_with_keep = PostTag.objects.filter(tag_id=keep).values("post_id")
+            PostTag.objects.filter(tag_id__in=duplicates, post_id__in=posts_with_keep).delete()
+            # Un post puede tener varias variantes de la misma etiqueta.
+            seen = set()
+            for row in PostTag.objects.filter(tag_id__in=duplicates).order_by("id"):
+                if row.post_id in seen:
+                    row.delete()
+                else:
+                    seen.add(row.post_id)
+                    row.tag_id = keep
+                    row.save(update_fields=["tag"])
+            Tags.objects.filter(id__in=duplicates).delete()
+        Tags.objects.filter(id=keep).exclude(name=name).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0005_posttag"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_tag_names, migrations.RunPython.noop),
+    ]
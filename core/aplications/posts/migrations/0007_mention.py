@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:26
+
+import re
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+MENTION_RE = re.compile(r"(?<![\w@])@(\w+(?:\.\w+)*)")
+
+
+def backfill_mentions(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Mention = apps.get_model("posts", "Mention")
+    CustomUser = apps.get_model("authentication", "CustomUser")
+
+    posts = (
+        Post.objects.filter(content__contains="@")
+        .values_list("id", "content", "created_at")
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for post_id, content, created_at in posts:
+        names = {name.lower() for name in MENTION_RE.findall(content)}
+        batch.append((post_id, names, created_at))
+        if len(batch) >= 2000:
+            _create_mentions(batch, CustomUser, Mention)
+            batch = []
+    _create_mentions(batch, CustomUser, Mention)
+
+
+def _create_mentions(batch, CustomUser, Mention):
+    usernames = set().union(*(names for _, names, _ in batch)) if batch else set()
+    if not usernames:
+        return
+    user_ids = dict(
+        CustomUser.objects.filter(username__in=usernames).values_list("username", "id")
+    )
+    Mention.objects.bulk_create(
+        [
+            Mention(post_id=post_id, user_id=user_ids[name], created_at=created_at)
+            for post_id, names, created_at in batch
+            for name in names
+            if name in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_normalize_tag_names'),
+        ('authentication', '0014_customuser_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentioned_in', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'post'], name='posts_mention_feed_idx')],
+                'unique_together': {('post', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_mentions, migrations.RunPython.noop),
+    ]
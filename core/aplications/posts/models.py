@@ -1,5 +1,8 @@
 from aplications.authentication.models import CustomUser
+from core.querycache import CachedManager
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -12,17 +15,36 @@ class Post(models.Model):
         content (TextField): The main content of the post.
         author (ForeignKey): Reference to the CustomUser who created the post.
         image (ImageField): Optional image associated with the post.
+        image_width, image_height, image_blurhash, image_variants: Filled in by
+            the media pipeline once the image has been processed.
         tag (ManyToManyField): Tags associated with the post.
         created_at (DateTimeField): Timestamp when the post was created.
         updated_at (DateTimeField): Timestamp when the post was last updated.
+        search_vector (SearchVectorField): Full-text index of the content (Postgres only).
     """
 
     content = models.TextField()
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     image = models.ImageField(upload_to="posts/images/", null=True, blank=True)
-    tag = models.ManyToManyField("Tags", blank=True, verbose_name="tags")
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_blurhash = models.CharField(max_length=64, blank=True, default="", editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    tag = models.ManyToManyField(
+        "Tags", through="PostTag", blank=True, verbose_name="tags"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = CachedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["author", "created_at", "id"], name="posts_post_author_feed_idx"
+            )
+        ]
 
     def __str__(self):
         return self.author.username
@@ -46,6 +68,8 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CachedManager()
+
     def __str__(self):
         return f"Comment by {self.author} on {self.post}"
 
@@ -100,3 +124,60 @@ class Tags(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class PostTag(models.Model):
+    """
+    Through table between Post and Tags.
+
+    Fields:
+        post (ForeignKey): The tagged post.
+        tag (ForeignKey): The tag applied to the post.
+        created_at (DateTimeField): Copy of the post's created_at, so the newest
+            posts of a tag are a single range scan on (tag, created_at, post).
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tags, on_delete=models.CASCADE, db_column="tags_id")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "posts_post_tag"
+        unique_together = ("post", "tag")
+        indexes = [
+            models.Index(
+                fields=["tag", "created_at", "post"], name="posts_posttag_feed_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.tag} on {self.post_id}"
+
+
+class Mention(models.Model):
+    """
+    Represents a user mentioned with @username in a post.
+
+    Fields:
+        post (ForeignKey): The post containing the mention.
+        user (ForeignKey): The mentioned user.
+        created_at (DateTimeField): Copy of the post's created_at, so the posts
+            mentioning a user are a single range scan on (user, created_at, post).
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="mentions")
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="mentioned_in"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("post", "user")
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "post"], name="posts_mention_feed_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.post_id}"
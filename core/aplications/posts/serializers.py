@@ -1,8 +1,25 @@
+import base64
+import json
+
 from aplications.authentication.models import CustomUser
+from aplications.media.helpers.pipeline import (
+    InvalidImage,
+    validate_image_upload,
+    variant_urls,
+)
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Comment, Favorite, Like, Post, Tags
+from .helpers.mentions import extract_hashtags, sync_mentions
+from .helpers.tags import attach_tags, normalize_tag_name
+from .helpers.trending import trending_tags
+from .models import Comment, Favorite, Like, Post
 
 
 class PostSerializer(serializers.ModelSerializer):
@@ -10,7 +27,7 @@ class PostSerializer(serializers.ModelSerializer):
         slug_field="username", queryset=CustomUser.objects.all()
     )
     tag_names = serializers.ListField(
-        child=serializers.CharField(), write_only=True, required=False
+        child=serializers.CharField(max_length=50), write_only=True, required=False
     )
     author_first_name = serializers.SerializerMethodField()
     author_last_name = serializers.SerializerMethodField()
@@ -20,6 +37,8 @@ class PostSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%d/%m/%y/%H/%M", read_only=True)
     updated_at = serializers.DateTimeField(format="%d/%m/%y/%H/%M", read_only=True)
     tags_names = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Post
         fields = [
@@ -29,6 +48,10 @@ class PostSerializer(serializers.ModelSerializer):
             "author_last_name",
             "content",
             "image",
+            "image_width",
+            "image_height",
+            "image_blurhash",
+            "image_variants",
             "created_at",
             "updated_at",
             "comments_count",
@@ -40,20 +63,36 @@ class PostSerializer(serializers.ModelSerializer):
         extra_fields = ["tag_names"]
         read_only_fields = ["created_at", "updated_at"]
 
+    def validate_image(self, value):
+        if value:
+            try:
+                validate_image_upload(value)
+            except InvalidImage as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants)
+
     def get_author_first_name(self, obj):
         return obj.author.first_name
 
     def get_author_last_name(self, obj):
         return obj.author.last_name
 
+    # Los contadores vienen anotados cuando el queryset pasa por
+    # helpers.hydration.with_post_relations; si no, se consultan.
     def get_comments_count(self, obj):
-        return obj.comments.count()
+        count = getattr(obj, "comments_total", None)
+        return obj.comments.count() if count is None else count
 
     def get_favorites_count(self, obj):
-        return obj.favorites.count()
+        count = getattr(obj, "favorites_total", None)
+        return obj.favorites.count() if count is None else count
 
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        count = getattr(obj, "likes_total", None)
+        return obj.likes.count() if count is None else count
 
     def get_tags_names(self, obj):
         return [tag.name for tag in obj.tag.all()]
@@ -61,14 +100,63 @@ class PostSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         tags_data = validated_data.pop("tag_names", [])
         post = super().create(validated_data)
-        for tag_name in tags_data:
-            tag_obj, created = Tags.objects.get_or_create(name=tag_name)
-            post.tag.add(tag_obj)
+        tags_data = attach_tags(post, [*tags_data, *extract_hashtags(post.content)])
+        sync_mentions(post, created=True)
+        if tags_data:
+            created_at = post.created_at.timestamp()
+            transaction.on_commit(lambda: trending_tags.record(tags_data, created_at))
         return post
 
     def update(self, instance, validated_data):
         validated_data.pop("author", None)
-        return super().update(instance, validated_data)
+        validated_data.pop("tag_names", None)
+        post = super().update(instance, validated_data)
+        if "content" in validated_data:
+            # Las etiquetas no se quitan al editar: pueden venir de tag_names.
+            current = {normalize_tag_name(tag.name) for tag in post.tag.all()}
+            attach_tags(
+                post,
+                [name for name in extract_hashtags(post.content) if name not in current],
+            )
+            sync_mentions(post)
+        return post
+
+
+class PostRecordSerializer(PostSerializer):
+    """
+    Entrada de ``post_records``: la publicación sin los datos de su autor ni
+    los nombres de sus etiquetas, que se guardan aparte y se combinan en
+    ``helpers.hydration.serialize_posts``.
+    """
+
+    author = None
+    author_first_name = None
+    author_last_name = None
+    tag_names = None
+    tags_names = None
+    author_id = serializers.IntegerField(read_only=True)
+    tag_ids = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = [
+            "id",
+            "author_id",
+            "content",
+            "image",
+            "image_width",
+            "image_height",
+            "image_blurhash",
+            "image_variants",
+            "created_at",
+            "updated_at",
+            "comments_count",
+            "favorites_count",
+            "likes_count",
+            "tag_ids",
+        ]
+
+    def get_tag_ids(self, obj):
+        return [tag.pk for tag in obj.tag.all()]
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -130,3 +218,95 @@ class SocialMediaCursorPagination(CursorPagination):
     page_size = 10
     ordering = "-created_at"  # Ordena por fecha de creación descendente
     cursor_query_param = "cursor"  # Parámetro que usará el frontend
+
+
+class KeysetPagination:
+    """
+    Paginación por keyset (seek) sobre una ordenación arbitraria.
+
+    A diferencia de ``CursorPagination``, el cursor guarda los valores de todas
+    las columnas de ``ordering`` del último elemento, así que cada página es un
+    único rango sobre el índice aunque haya empates en la primera columna.
+    La última columna debe ser única (normalmente ``id``).
+    """
+
+    page_size = 20
+    ordering = ("-created_at", "-id")
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering=None, page_size=None):
+        self.ordering = ordering or self.ordering
+        self.page_size = page_size or self.page_size
+
+    def _signer(self):
+        # Un cursor solo vale para la ordenación que lo generó.
+        return signing.Signer(salt=f"keyset-cursor:{','.join(self.ordering)}")
+
+    def encode_cursor(self, position):
+        # str() conserva los microsegundos de las fechas (DjangoJSONEncoder los trunca)
+        raw = json.dumps(position, default=str, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+        return self._signer().sign(encoded)
+
+    def decode_cursor(self, request):
+        """
+        Posición del cursor de ``request``. Va firmado: sus valores llegan tal
+        cual a los filtros, así que uno fabricado por el cliente daría un 500
+        en lugar de un 404.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            encoded = self._signer().unsign(cursor)
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            position = json.loads(raw)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def _after(self, position):
+        """
+        Condición "viene después de ``position``" según ``ordering``.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_position(self, item):
+        fields = [field.lstrip("-") for field in self.ordering]
+        if isinstance(item, dict):
+            return [item[field] for field in fields]
+        return [getattr(item, field) for field in fields]
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
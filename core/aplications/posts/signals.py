@@ -0,0 +1,73 @@
+from aplications.media.helpers.pipeline import image_processed, track_image_field
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .helpers.caching import invalidate_feeds, invalidate_records
+from .helpers.search import unindex_posts
+from .helpers.tags import tag_autocomplete, tag_ids
+from .models import Comment, Favorite, Like, Post, Tags
+
+track_image_field(Post, "image")
+
+
+@receiver(post_delete, sender=Tags)
+def forget_deleted_tag(sender, instance, **kwargs):
+    """
+    Evita que la caché de ids devuelva una etiqueta que ya no existe.
+    """
+    tag_ids.discard(instance.name)
+    invalidate_records(tag_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Tags)
+def index_saved_tag(sender, instance, **kwargs):
+    """
+    Las etiquetas creadas o editadas una a una (admin, shell) se reflejan en
+    el autocompletado sin esperar a la siguiente reconstrucción. Las que crea
+    ``attach_tags`` se cuentan al confirmar la publicación.
+    """
+    transaction.on_commit(lambda: tag_autocomplete.add(instance.name, instance.type))
+
+
+@receiver(post_save, sender=Tags)
+def invalidate_saved_tag(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_records(tag_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_caches(sender, instance, created=True, **kwargs):
+    invalidate_records(post_ids=[instance.pk])
+    # Editar una publicación no la mueve de ningún listado.
+    if created:
+        invalidate_feeds(author_ids=[instance.author_id])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    unindex_posts([instance.pk])
+
+
+@receiver(image_processed, sender=Post)
+def invalidate_processed_image(sender, pk, **kwargs):
+    invalidate_records(post_ids=[pk])
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_post_counters(sender, instance, **kwargs):
+    """
+    Los contadores de likes y favoritos van en la entrada de la publicación.
+    """
+    invalidate_records(post_ids=[instance.post_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_caches(sender, instance, **kwargs):
+    invalidate_records(post_ids=[instance.post_id])
+    invalidate_feeds(comment_post_ids=[instance.post_id])
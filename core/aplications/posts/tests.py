@@ -1,16 +1,35 @@
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
 from aplications.authentication.models import CustomUser
+from core.cache import clear_near_caches
+from core.conditional import bump
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Comment, Like, Post, Favorite
+from .helpers.mentions import extract_hashtags, extract_mentions, sync_mentions
+from .helpers.search import FTS_TABLE, index_posts
+from .helpers.tags import attach_tags, tag_autocomplete, tag_ids
+from .helpers.trending import EPOCH_HALF_LIVES, LocalTrendingTags, trending_tags
+from .models import Comment, Like, Mention, Post, Favorite, Tags
+from .serializers import KeysetPagination
 
 # Create your tests here.
 
 
 class PostTests(APITestCase):
     def setUp(self):
+        cache.clear()
+        clear_near_caches()
+        tag_ids.clear()
         self.client = APIClient()
         self.user_data = {
             "email": "testuser@example.com",
@@ -39,6 +58,129 @@ class PostTests(APITestCase):
 
         return response
 
+    def test_async_feed_matches_sync_feed(self):
+        Post.objects.create(author=self.user, content="propia")
+        Post.objects.create(author=self.user_2, content="ajena")
+        self.user.following.add(self.user_2)
+        token = self._login_user().data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        response = self.client.get(reverse("post-list"))
+        async_response = self.client.get(reverse("post-list-async"))
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.content, response.content)
+        self.assertEqual(len(async_response.data), 2)
+        for header in ("ETag", "Cache-Control"):
+            self.assertEqual(async_response[header], response[header])
+        async_response = self.client.get(
+            reverse("post-list-async"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(async_response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(async_response["ETag"], response["ETag"])
+
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        response = self.client.get(reverse("post-list-async"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_feed_and_comments_are_cached_until_invalidated(self):
+        post = Post.objects.create(author=self.user_2, content="hola")
+        self.user.following.add(self.user_2)
+        self.client.force_authenticate(user=self.user)
+
+        self.assertEqual(self.client.get(reverse("post-list")).data[0]["likes_count"], 0)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("post-list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, post=post)
+        self.assertEqual(self.client.get(reverse("post-list")).data[0]["likes_count"], 1)
+
+        url = reverse("comment-service")
+        self.assertEqual(self.client.get(url, {"post_id": post.id}).data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, author=self.user, content="¡Buena!")
+        comments = self.client.get(url, {"post_id": post.id}).data
+        self.assertEqual([comment["content"] for comment in comments], ["¡Buena!"])
+
+    def test_pages_resolve_cached_entities(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(author=self.user_2, content="uno")
+            attach_tags(first, ["django"])
+            Post.objects.create(author=self.user_2, content="dos")
+            self.user.following.add(self.user_2)
+        self.client.force_authenticate(user=self.user)
+        tag_url = reverse("tag-feed", args=["django"])
+
+        feed = self.client.get(reverse("post-list")).data
+        self.assertEqual([post["content"] for post in feed], ["dos", "uno"])
+        self.assertEqual(feed[1]["tags_names"], ["django"])
+        tag_page = self.client.get(tag_url).data["results"]
+        self.assertEqual(tag_page, [feed[1]])
+
+        # Renombrar al autor solo borra su entrada: los ids y las
+        # publicaciones siguen en caché.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_2.first_name = "Ana"
+            self.user_2.save()
+        with self.assertNumQueries(1):
+            feed = self.client.get(reverse("post-list")).data
+        self.assertEqual({post["author_first_name"] for post in feed}, {"Ana"})
+
+        # Un like recarga solo esa publicación (y el prefetch de etiquetas).
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, post=first)
+        with self.assertNumQueries(2):
+            tag_page = self.client.get(tag_url).data["results"]
+        self.assertEqual(tag_page[0]["likes_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attach_tags(Post.objects.create(author=self.user, content="tres"), ["django"])
+        tag_page = self.client.get(tag_url).data["results"]
+        self.assertEqual([post["content"] for post in tag_page], ["tres", "uno"])
+
+    def test_feed_and_comments_answer_conditional_requests(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user_2, content="hola")
+            self.user.following.add(self.user_2)
+        self.client.force_authenticate(user=self.user)
+        url = reverse("post-list")
+
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        # El like no cambia los ids del feed, pero sí su validador. Solo se
+        # renueva el del autor: los feeds de sus seguidores lo leen al validar.
+        with mock.patch(
+            "aplications.posts.helpers.caching.bump", wraps=bump
+        ) as bumped, self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, post=post)
+        bumped.assert_called_once_with(f"posts:{self.user_2.pk}")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["likes_count"], 1)
+        self.assertNotEqual(response["ETag"], etag)
+
+        url = reverse("comment-service")
+        etag = self.client.get(url, {"post_id": post.id})["ETag"]
+        response = self.client.get(url, {"post_id": post.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, author=self.user, content="¡Buena!")
+        response = self.client.get(url, {"post_id": post.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+        # Cambiar el nombre del autor cambia los comentarios ya en caché.
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = "renombrado"
+            self.user.save()
+        response = self.client.get(url, {"post_id": post.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["author"], "renombrado")
+
     def test_create_post_with_jwt(self):
         url = reverse("post-create")
         token_response = self._login_user()
@@ -390,3 +532,232 @@ class PostTests(APITestCase):
 
         self.assertEqual(response.data[0]["content"], post3.content)
         self.assertEqual(response.data[0]["author"], self.user_2.username)
+
+    def test_search_posts(self):
+        token_response = self._login_user()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token_response.data['access']}"}
+        for content in ("Aprendiendo django hoy", "Nada que ver", "Django y más django"):
+            response = self.client.post(
+                reverse("post-create"),
+                {"author": self.user.username, "content": content},
+                format="json",
+                **auth,
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse("post-search"), {"q": "django"}, **auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [post["content"] for post in response.data["results"]],
+            ["Django y más django", "Aprendiendo django hoy"],
+        )
+
+        response = self.client.get(
+            reverse("post-search"), {"q": "django", "author": "testuser2"}, **auth
+        )
+        self.assertEqual(response.data["results"], [])
+
+    def test_reindex_posts_command(self):
+        Post.objects.create(content="indexado por lotes", author=self.user)
+        call_command("reindex_posts", chunk_size=1, stdout=StringIO())
+
+        token_response = self._login_user()
+        response = self.client.get(
+            reverse("post-search"),
+            {"q": "lotes"},
+            HTTP_AUTHORIZATION=f"Bearer {token_response.data['access']}",
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+
+    @skipUnless(connection.vendor == "sqlite", "La tabla FTS5 solo existe en SQLite")
+    def test_deleted_posts_leave_the_search_index(self):
+        post = Post.objects.create(content="borrada del índice", author=self.user)
+        index_posts([post.id])
+        post_id = post.id
+        post.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    @override_settings(TRENDING_TAGS_LOCAL_MAX=4)
+    def test_local_trending_tags_forget_faded_tags(self):
+        local = LocalTrendingTags()
+        now = time.time()
+        half_life = settings.TRENDING_TAGS_HALF_LIFE
+        local.record(["vieja"], now - 20 * half_life)
+        local.record(["nueva"], now)
+        # Al cambiar de época se olvida lo que ya no pesa.
+        later = now + half_life * EPOCH_HALF_LIVES
+        with mock.patch("aplications.posts.helpers.trending.time.time", return_value=later):
+            local.record(["nueva"], later)
+        self.assertNotIn("vieja", local._scores)
+        self.assertEqual([tag["name"] for tag in local.top(10)], ["nueva"])
+
+        # Por encima del límite se queda con las más pesadas.
+        for count, name in enumerate(["a", "b", "c", "d"], start=2):
+            for _ in range(count):
+                local.record([name], later)
+        self.assertLessEqual(len(local._scores), 4)
+        self.assertNotIn("nueva", local._scores)
+        self.assertIn("c", local._scores)
+
+    def test_trending_tags(self):
+        trending_tags.local = LocalTrendingTags()
+        token_response = self._login_user()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token_response.data['access']}"}
+        for tags in (["django"], ["django", "python"], ["python", "django"], ["rust"]):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("post-create"),
+                    {"author": self.user.username, "content": "post", "tag_names": tags},
+                    format="json",
+                    **auth,
+                )
+
+        response = self.client.get(reverse("trending-tags"), {"limit": 2}, **auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag["name"] for tag in response.data], ["django", "python"])
+        self.assertGreater(response.data[0]["score"], response.data[1]["score"])
+
+    def test_attach_tags_batches_and_normalizes(self):
+        Tags.objects.create(name="python")
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(content="post", author=self.user)
+        # SELECT de las que faltan, INSERT de las nuevas, SELECT de sus ids
+        # e INSERT en la tabla intermedia.
+        with self.assertNumQueries(4), self.captureOnCommitCallbacks(execute=True):
+            names = attach_tags(post, ["Django", "#django", " Python ", "rust", ""])
+        self.assertEqual(names, ["django", "python", "rust"])
+        self.assertEqual(
+            sorted(post.tag.values_list("name", flat=True)), ["django", "python", "rust"]
+        )
+        self.assertEqual(Tags.objects.count(), 3)
+
+        other = Post.objects.create(content="otro", author=self.user)
+        with self.assertNumQueries(1):
+            attach_tags(other, ["DJANGO", "rust"])
+
+        Tags.objects.get(name="rust").delete()
+        self.assertEqual(tag_ids.get_many(["rust"]), {})
+
+    def test_tag_autocomplete(self):
+        Tags.objects.create(name="django", type="framework")
+        Tags.objects.create(name="djangocon", type="event")
+        post = Post.objects.create(content="post", author=self.user)
+        attach_tags(post, ["django"])
+
+        token_response = self._login_user()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token_response.data['access']}"}
+        expected = [
+            {"name": "django", "type": "framework", "count": 1},
+            {"name": "djangocon", "type": "event", "count": 0},
+        ]
+        # Mientras se construye el índice en segundo plano se consulta la base de datos.
+        with mock.patch.object(tag_autocomplete, "index", return_value=None):
+            response = self.client.get(reverse("tag-autocomplete"), {"q": "#Dj"}, **auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, expected)
+
+        tag_autocomplete.rebuild()
+        response = self.client.get(reverse("tag-autocomplete"), {"q": "#Dj"}, **auth)
+        self.assertEqual(response.data, expected)
+
+        # Las altas posteriores se incorporan sin reconstruir el índice.
+        other = Post.objects.create(content="otro", author=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            attach_tags(other, ["djangocon", "djangogirls"])
+            attach_tags(post, ["djangocon"])
+        response = self.client.get(
+            reverse("tag-autocomplete"), {"q": "django"}, **auth
+        )
+        self.assertEqual(
+            [(tag["name"], tag["count"]) for tag in response.data],
+            [("djangocon", 2), ("django", 1), ("djangogirls", 1)],
+        )
+        response = self.client.get(
+            reverse("tag-autocomplete"), {"q": "dj", "type": "event"}, **auth
+        )
+        self.assertEqual([tag["name"] for tag in response.data], ["djangocon"])
+
+    def test_extract_hashtags_and_mentions(self):
+        content = "Hola @Ana y @bob.dev. #Django #2024 #django x#no &#39; ¿#año?"
+        self.assertEqual(extract_hashtags(content), ["django", "año"])
+        self.assertEqual(extract_mentions(content), ["ana", "bob.dev"])
+        self.assertEqual(extract_mentions("mail@example.com"), [])
+
+    def test_mentions_match_usernames_with_capitals(self):
+        bob = CustomUser.objects.create_user(
+            username="Bob.Dev", email="bob@example.com", password="testpassword"
+        )
+        post = Post.objects.create(author=self.user, content="Hola @bob.dev y @BOB.DEV")
+        sync_mentions(post, created=True)
+        self.assertEqual(list(post.mentions.values_list("user", flat=True)), [bob.id])
+
+    def test_post_hashtags_and_mentions(self):
+        ana = CustomUser.objects.create_user(
+            username="ana", email="ana@example.com", password="testpassword"
+        )
+        token_response = self._login_user()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token_response.data['access']}"}
+        response = self.client.post(
+            reverse("post-create"),
+            {
+                "author": self.user.username,
+                "content": "Hola @Ana y @nadie #Django",
+                "tag_names": ["python"],
+            },
+            format="json",
+            **auth,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post = Post.objects.get(pk=response.data["id"])
+        self.assertEqual(sorted(response.data["tags_names"]), ["django", "python"])
+        self.assertEqual(list(post.mentions.values_list("user", flat=True)), [ana.id])
+
+        self.client.force_authenticate(ana)
+        response = self.client.get(reverse("mentions-feed"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [post.id])
+
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            reverse("post-update", args=[post.id]),
+            {"content": "Hola @testuser #rust"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(post.tag.values_list("name", flat=True)), ["django", "python", "rust"]
+        )
+        self.assertEqual(
+            list(Mention.objects.filter(post=post).values_list("user", flat=True)),
+            [self.user.id],
+        )
+
+    def test_tag_feed_keyset_pagination(self):
+        tag = Tags.objects.create(name="django")
+        posts = []
+        for number in range(3):
+            post = Post.objects.create(content=f"post {number}", author=self.user)
+            post.tag.add(tag, through_defaults={"created_at": post.created_at})
+            posts.append(post)
+        Post.objects.create(content="sin etiqueta", author=self.user)
+
+        token_response = self._login_user()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token_response.data['access']}"}
+        with mock.patch.object(KeysetPagination, "page_size", 2):
+            first = self.client.get(reverse("tag-feed", args=["django"]), **auth)
+            second = self.client.get(first.data["next"], **auth)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [post["content"] for post in first.data["results"]], ["post 2", "post 1"]
+        )
+        self.assertEqual(
+            [post["content"] for post in second.data["results"]], ["post 0"]
+        )
+        self.assertIsNone(second.data["next"])
+        self.assertEqual(first.data["results"][0]["tags_names"], ["django"])
+
+        response = self.client.get(reverse("tag-feed", args=["nope"]), **auth)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
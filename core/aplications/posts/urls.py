@@ -1,5 +1,6 @@
 from django.urls import path
 from .views import (
+    AsyncListPostsFeedView,
     ListPostsOwnerView,
     ListPostsFeedView,
     CreatePostView,
@@ -7,12 +8,23 @@ from .views import (
     DeletePostView,
     CommentsView,
     LikePostView,
-    FavoritePostView
+    FavoritePostView,
+    SearchPostsView,
+    MentionsFeedView,
+    TagAutocompleteView,
+    TagFeedView,
+    TrendingTagsView,
 )
 
 urlpatterns = [
     path("get-posts/", ListPostsFeedView.as_view(), name="post-list"),
+    path("async/get-posts/", AsyncListPostsFeedView.as_view(), name="post-list-async"),
     path("get-owner-posts/", ListPostsOwnerView.as_view(), name="post-owner"),
+    path("search/", SearchPostsView.as_view(), name="post-search"),
+    path("tags/autocomplete/", TagAutocompleteView.as_view(), name="tag-autocomplete"),
+    path("tag/<str:tag_name>/", TagFeedView.as_view(), name="tag-feed"),
+    path("mentions/", MentionsFeedView.as_view(), name="mentions-feed"),
+    path("trending-tags/", TrendingTagsView.as_view(), name="trending-tags"),
     path("create/", CreatePostView.as_view(), name="post-create"),
     path("update/<int:post_id>/", UpdatePostView.as_view(), name="post-update"),
     path("delete/<int:post_id>/", DeletePostView.as_view(), name="post-delete"),
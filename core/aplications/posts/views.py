@@ -1,25 +1,74 @@
-from datetime import timedelta
-
-from django.db import models
+from asgiref.sync import sync_to_async
+from core.async_views import AsyncAPIView, gather_queries
+from core.conditional import aconditional_response, conditional_response
+from core.throttling import PostCreateRateThrottle
+from django.db import models, transaction
 from django.shortcuts import render
-from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.generics import CreateAPIView, DestroyAPIView, UpdateAPIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .models import Comment, Favorite, Like, Post
+from .helpers.caching import feeds
+from .helpers.editing import EDIT_WINDOW_ERROR, edit_window_closed
+from .helpers.hydration import (
+    comment_records,
+    paginate_post_ids,
+    serialize_comments,
+    serialize_posts,
+    with_post_relations,
+)
+from .helpers.search import index_posts, search_posts
+from .helpers.tags import normalize_tag_name, tag_autocomplete, tag_ids
+from .helpers.trending import trending_tags
+from .models import Comment, Favorite, Like, Mention, Post, PostTag, Tags
 from .serializers import (
     CommentSerializer,
     FavoriteSerializer,
+    KeysetPagination,
     PostSerializer,
     SocialMediaCursorPagination,
 )
 
 
+def serialize_feed(user):
+    """
+    Publicaciones del usuario y de los usuarios que sigue. La caché ``feeds``
+    guarda solo sus ids, ordenados; los datos salen de las entradas por
+    publicación, autor y etiqueta, así que un like o un cambio de nombre no
+    invalida el feed.
+    """
+
+    def load():
+        return list(
+            Post.objects.filter(
+                models.Q(author=user) | models.Q(author__in=user.following.values("pk"))
+            )
+            .order_by("-created_at")
+            .values_list("id", flat=True)
+        )
+
+    return serialize_posts(feeds.get_or_set("home:ids", load, group=user.pk))
+
+
+def feed_validators(user):
+    """
+    Claves de ``core.conditional`` del feed de ``user``: a quién sigue, las
+    etiquetas y ``posts:<autor>`` de cada autor del feed, leídas todas con
+    una sola lectura múltiple.
+    """
+    authors = feeds.get_or_set(
+        "home:authors",
+        lambda: [user.pk, *user.following.order_by("pk").values_list("pk", flat=True)],
+        group=user.pk,
+    )
+    return [f"feed:{user.pk}", "tags", *(f"posts:{pk}" for pk in authors)]
+
+
 class ListPostsFeedView(APIView):
     """
     Vista para listar todas las publicaciones creadas por el usuario autenticado y por los usuarios que sigue.
@@ -29,20 +78,50 @@ class ListPostsFeedView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Listar publicaciones",
-        operation_description="Lista todas las publicaciones creadas por el usuario autenticado y por los usuarios que sigue. Requiere un token JWT válido.",
-        responses={200: PostSerializer(many=True)},
+        operation_description="Lista todas las publicaciones creadas por el usuario autenticado y por los usuarios que sigue. Admite peticiones condicionales (ETag / Last-Modified). Requiere un token JWT válido.",
+        responses={
+            200: PostSerializer(many=True),
+            304: openapi.Response(description="Sin cambios"),
+        },
         security=[{"Bearer": []}],
     )
     def get(self, request, *args, **kwargs):
         """
-        Devuelve las publicaciones del usuario autenticado y de los usuarios que sigue.
+        Devuelve las publicaciones del usuario autenticado y de los usuarios
+        que sigue, o 304 si el cliente ya tiene la versión actual.
         """
-        following_users = request.user.following.all()
-        posts = Post.objects.filter(
-            models.Q(author=request.user) | models.Q(author__in=following_users)
-        ).order_by("-created_at")
-        serializer = PostSerializer(posts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        user = request.user
+        return conditional_response(
+            request,
+            feed_validators(user),
+            lambda: Response(serialize_feed(user), status=status.HTTP_200_OK),
+        )
+
+
+class AsyncListPostsFeedView(AsyncAPIView):
+    """
+    Versión async de ``ListPostsFeedView`` (servida bajo ASGI). La consulta se
+    ejecuta en el pool de ``core.async_views`` sin bloquear el event loop.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Listar publicaciones (async)",
+        operation_description="Igual que /posts/get-posts/, servida por una vista async. Admite peticiones condicionales (ETag / Last-Modified). Requiere un token JWT válido.",
+        responses={
+            200: PostSerializer(many=True),
+            304: openapi.Response(description="Sin cambios"),
+        },
+        security=[{"Bearer": []}],
+    )
+    async def get(self, request, *args, **kwargs):
+        user = request.user
+
+        async def render():
+            (data,) = await gather_queries(lambda: serialize_feed(user))
+            return Response(data, status=status.HTTP_200_OK)
+
+        keys = await sync_to_async(feed_validators)(user)
+        return await aconditional_response(request, keys, render)
 
 
 class ListPostsOwnerView(APIView):
@@ -82,12 +161,245 @@ class ListPostsOwnerView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class SearchPostsView(APIView):
+    """
+    Vista para buscar publicaciones por su contenido.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Buscar publicaciones",
+        operation_description="Búsqueda de texto completo sobre el contenido de las publicaciones, ordenada por relevancia. Admite filtros por etiqueta y autor y paginación por cursor (keyset). Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="Texto a buscar",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "tag",
+                openapi.IN_QUERY,
+                description="Nombre de la etiqueta",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "author",
+                openapi.IN_QUERY,
+                description="Username del autor",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Cursor de la siguiente página",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: PostSerializer(many=True),
+            400: openapi.Response(description="q es requerido"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Devuelve una página de publicaciones que coinciden con la búsqueda.
+        """
+        query = request.query_params.get("q", "").strip()[:200]
+        if not query:
+            return Response(
+                {"error": "q parameter is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        posts = with_post_relations(
+            search_posts(
+                query,
+                tag=request.query_params.get("tag"),
+                author=request.query_params.get("author"),
+            )
+        )
+        paginator = KeysetPagination(ordering=("-rank", "-id"))
+        page = paginator.paginate_queryset(posts, request)
+        return paginator.get_paginated_response(PostSerializer(page, many=True).data)
+
+
+class TagFeedView(APIView):
+    """
+    Vista para listar las publicaciones más recientes de una etiqueta.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Publicaciones por etiqueta",
+        operation_description="Lista las publicaciones con la etiqueta indicada, de la más reciente a la más antigua, con paginación por cursor (keyset). Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Cursor de la siguiente página",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: PostSerializer(many=True),
+            404: openapi.Response(description="Etiqueta no encontrada"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, tag_name, *args, **kwargs):
+        """
+        Cada página es un rango del índice (tag, created_at, post) de PostTag
+        y se guarda en caché como lista de ids; las publicaciones salen de la
+        caché de entidades.
+        """
+        name = normalize_tag_name(tag_name)
+        tag_id = tag_ids.get_many([name]).get(name)
+        if tag_id is None:
+            tag_id = Tags.objects.filter(name=name).values_list("id", flat=True).first()
+            if tag_id is None:
+                return Response(
+                    {"error": "Tag not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            tag_ids.set_many({name: tag_id})
+        paginator, post_ids = paginate_post_ids(
+            request,
+            PostTag.objects.filter(tag_id=tag_id),
+            f"tag:{tag_id}",
+            ordering=("-created_at", "-post_id"),
+        )
+        return paginator.get_paginated_response(serialize_posts(post_ids))
+
+
+class MentionsFeedView(APIView):
+    """
+    Vista para listar las publicaciones que mencionan al usuario autenticado.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Publicaciones que me mencionan",
+        operation_description="Lista las publicaciones que mencionan con @username al usuario autenticado, de la más reciente a la más antigua, con paginación por cursor (keyset). Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Cursor de la siguiente página",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={200: PostSerializer(many=True)},
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Recorre el índice (user, created_at, post) de Mention y resuelve las
+        publicaciones de la página con la caché de entidades.
+        """
+        paginator = KeysetPagination(ordering=("-created_at", "-post_id"))
+        page = paginator.paginate_queryset(
+            Mention.objects.filter(user=request.user).only("post_id", "created_at"),
+            request,
+        )
+        posts = serialize_posts([row.post_id for row in page])
+        return paginator.get_paginated_response(posts)
+
+
+class TrendingTagsView(APIView):
+    """
+    Vista para obtener las etiquetas en tendencia.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Etiquetas en tendencia",
+        operation_description="Devuelve las etiquetas más usadas recientemente, con una puntuación que decae exponencialmente con el tiempo. Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Número máximo de etiquetas",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Etiquetas en tendencia",
+                examples={"application/json": [{"name": "django", "score": 3.5}]},
+            ),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Devuelve el top de etiquetas, servido desde Redis o memoria en O(K).
+        """
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        return Response(trending_tags.top(max(limit, 1)), status=status.HTTP_200_OK)
+
+
+class TagAutocompleteView(APIView):
+    """
+    Vista para autocompletar etiquetas desde un índice en memoria.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Autocompletar etiquetas",
+        operation_description="Sugiere las etiquetas más usadas que empiezan por el prefijo indicado, opcionalmente de un tipo concreto. Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="Prefijo de la etiqueta",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "type",
+                openapi.IN_QUERY,
+                description="Tipo de etiqueta",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Número máximo de sugerencias (máx. 20)",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Etiquetas sugeridas",
+                examples={
+                    "application/json": [{"name": "django", "type": None, "count": 42}]
+                },
+            ),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        prefix = normalize_tag_name(request.query_params.get("q", ""))
+        if not prefix:
+            return Response([], status=status.HTTP_200_OK)
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 20)
+        except ValueError:
+            limit = 10
+        return Response(
+            tag_autocomplete.search(
+                prefix, max(limit, 1), tag_type=request.query_params.get("type")
+            ),
+            status=status.HTTP_200_OK,
+        )
+
+
 class CreatePostView(CreateAPIView):
     """
     Vista para crear una nueva publicación.
     """
 
     serializer_class = PostSerializer
+    throttle_classes = [*api_settings.DEFAULT_THROTTLE_CLASSES, PostCreateRateThrottle]
 
     @swagger_auto_schema(
         operation_summary="Crear una publicación",
@@ -116,12 +428,17 @@ class CreatePostView(CreateAPIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         """
         Crea una nueva publicación con los datos proporcionados.
         """
         return super().post(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        post = serializer.save()
+        index_posts([post.id])
+
 
 class DeletePostView(APIView):
     """
@@ -139,14 +456,15 @@ class DeletePostView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def delete(self, request, post_id, *args, **kwargs):
         """
         Elimina la publicación especificada por su ID.
         """
 
         try:
-            post = Post.objects.get(id=post_id)
-            if post.author != request.user:
+            post = Post.objects.cache().get(id=post_id)
+            if post.author_id != request.user.pk:
                 return Response(
                     {"error": "You do not have permission to delete this post."},
                     status=status.HTTP_403_FORBIDDEN,
@@ -177,29 +495,30 @@ class UpdatePostView(UpdateAPIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def patch(self, request, post_id, *args, **kwargs):
         """
         Actualiza los datos de la publicación especificada.
         """
         try:
-            post = Post.objects.get(id=post_id)
-            if post.author != request.user:
+            post = Post.objects.cache().get(id=post_id)
+            if post.author_id != request.user.pk:
                 return Response(
                     {"error": "You do not have permission to update this post."},
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
             # Validación de las 24 horas
-            if timezone.now() > post.created_at + timedelta(hours=24):
+            if edit_window_closed(post):
                 return Response(
-                    {
-                        "error": "No se puede actualizar la publicación después de 24 horas de su creación."
-                    },
+                    {"error": EDIT_WINDOW_ERROR},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             serializer = self.get_serializer(post, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            if "content" in serializer.validated_data:
+                index_posts([post.id])
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Post.DoesNotExist:
             return Response(
@@ -215,7 +534,7 @@ class CommentsView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Obtener comentarios de una publicación",
-        operation_description="Obtiene todos los comentarios asociados a una publicación específica. Requiere un token JWT válido.",
+        operation_description="Obtiene todos los comentarios asociados a una publicación específica. Requiere un token JWT válido. Admite peticiones condicionales (ETag / Last-Modified).",
         manual_parameters=[
             openapi.Parameter(
                 "post_id",
@@ -227,6 +546,7 @@ class CommentsView(APIView):
         ],
         responses={
             200: CommentSerializer(many=True),
+            304: openapi.Response(description="Sin cambios"),
             400: openapi.Response(
                 description="Solicitud incorrecta",
                 examples={"application/json": {"error": "post_id is required."}},
@@ -240,7 +560,8 @@ class CommentsView(APIView):
     )
     def get(self, request, *args, **kwargs):
         """
-        Devuelve los comentarios de una publicación específica.
+        Devuelve los comentarios de una publicación específica, o 304 si el
+        cliente ya tiene la versión actual.
         """
         post_id = request.query_params.get("post_id", None)
         if not post_id:
@@ -249,16 +570,22 @@ class CommentsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         try:
-            post = Post.objects.get(id=post_id)
-            comments = Comment.objects.filter(post=post)
-            serializer = CommentSerializer(comments, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            post = Post.objects.cache().get(id=post_id)
         except Post.DoesNotExist:
             return Response(
                 {"error": "Post not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        # Los nombres de los autores no están en la lista: sus validadores sí.
+        comments = comment_records(post)
+        authors = sorted({comment["author"] for comment in comments})
+        return conditional_response(
+            request,
+            [f"comments:{post.pk}", *(f"author:{pk}" for pk in authors)],
+            lambda: Response(serialize_comments(comments), status=status.HTTP_200_OK),
+        )
+
     @swagger_auto_schema(
         operation_summary="Crear un comentario",
         operation_description="Crea un nuevo comentario para una publicación específica. Requiere un token JWT válido.",
@@ -295,6 +622,7 @@ class CommentsView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         """
         Crea un comentario en una publicación específica.
@@ -307,7 +635,7 @@ class CommentsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             Comment.objects.create(author=request.user, post=post, content=content)
             return Response(
                 {"message": "Comment created successfully"},
@@ -358,6 +686,7 @@ class CommentsView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def patch(self, request, *args, **kwargs):
         """
         Actualiza el contenido de un comentario existente.
@@ -414,6 +743,7 @@ class CommentsView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         """
         Elimina un comentario específico.
@@ -462,12 +792,13 @@ class LikePostView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request, post_id):
         """
         Da me gusta a una publicación específica.
         """
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             like, created = Like.objects.get_or_create(user=request.user, post=post)
             if created:
                 return Response(
@@ -501,12 +832,13 @@ class LikePostView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def delete(self, request, post_id):
         """
         Quita el me gusta de una publicación específica.
         """
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             like = Like.objects.get(user=request.user, post=post)
             like.delete()
             return Response(
@@ -556,7 +888,7 @@ class FavoritePostView(APIView):
                 {"error": "post_id is required."}, status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             favorited_posts = Favorite.objects.filter(user=request.user, post=post)
             if not favorited_posts.exists():
                 return Response({"is_favorited": False}, status=status.HTTP_200_OK)
@@ -590,6 +922,7 @@ class FavoritePostView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request):
         """
         Agrega una publicación a favoritos del usuario autenticado.
@@ -600,7 +933,7 @@ class FavoritePostView(APIView):
                 {"error": "post_id is required."}, status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             favorite, created = Favorite.objects.get_or_create(
                 user=request.user, post=post
             )
@@ -637,6 +970,7 @@ class FavoritePostView(APIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def delete(self, request):
         """
         Quita una publicación de favoritos del usuario autenticado.
@@ -647,7 +981,7 @@ class FavoritePostView(APIView):
                 {"error": "post_id is required."}, status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.cache().get(id=post_id)
             favorite = Favorite.objects.get(user=request.user, post=post)
             favorite.delete()
             return Response(
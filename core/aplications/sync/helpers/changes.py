@@ -0,0 +1,240 @@
+"""
+Registro de cambios y sincronización incremental.
+
+Los signals de ``aplications.sync`` añaden una fila a ``ChangeLog`` por cada
+cambio cuando su transacción se confirma, así que el registro nunca contiene
+algo que no llegó a confirmarse. La fila se inserta fuera de esa transacción:
+si el proceso muere justo entre la confirmación y la inserción el cambio no
+se registra, y el cliente lo recibe con el siguiente cambio de esa entidad o
+al recargar todo.
+
+Un cliente guarda el ``sync_token`` de su última sincronización: un cursor
+firmado (posición en el registro y usuario) que no puede fabricar ni leer.
+``changes_since`` devuelve las filas posteriores de su audiencia (sus
+publicaciones y las de quienes sigue, con sus comentarios, y a quién sigue)
+compactadas: una por entidad, con su estado actual. Cien likes a una
+publicación son una sola entrada con sus datos de ahora.
+
+Los ids del registro se asignan al insertar y dos inserciones concurrentes
+pueden confirmarse en otro orden, así que una fila con un id menor puede
+aparecer después de que un cliente haya leído otra mayor. Como cada inserción
+es una transacción propia de una sola sentencia, ese hueco dura lo que tarda
+un ``INSERT``, no lo que dure la transacción del cambio. Por eso el cursor
+solo avanza hasta las filas con más de ``SYNC_SETTLE_SECONDS`` de antigüedad;
+las más recientes se entregan igualmente y se repiten en la siguiente
+sincronización, lo que no importa porque cada entrada es el estado completo
+de la entidad.
+"""
+
+import threading
+from datetime import timedelta
+
+from aplications.posts.helpers.hydration import serialize_posts
+from aplications.posts.models import Comment, Post
+from aplications.posts.serializers import CommentSerializer
+from aplications.users.models import Follow
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from ..models import ChangeLog
+
+TOKEN_SALT = "aplications.sync.token"
+
+_deleting = threading.local()
+
+
+class SyncTokenError(Exception):
+    """
+    Token de sincronización no válido, con el código HTTP que debe devolverse.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Escritura -----------------------------------------------------------------
+
+
+def deleting_posts():
+    """
+    Publicaciones que se están borrando en este hilo. Sus comentarios, likes
+    y favoritos se borran en cascada y no se registran uno a uno: el borrado
+    de la publicación ya los cubre.
+    """
+    if not hasattr(_deleting, "posts"):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+def post_author(post_id):
+    try:
+        return Post.objects.cache().get(pk=post_id).author_id
+    except Post.DoesNotExist:
+        return None
+
+
+def _write_on_commit(rows):
+    """
+    Inserta ``rows`` cuando se confirme la transacción en curso (o ya, fuera
+    de una), con la hora de la inserción: es la que cuenta para asentarlas.
+    """
+
+    def write():
+        now = timezone.now()
+        for row in rows:
+            row.created_at = now
+        ChangeLog.objects.bulk_create(rows)
+
+    if rows:
+        transaction.on_commit(write)
+
+
+def record_change(entity, object_id, audience_id, deleted=False):
+    if audience_id is not None:
+        _write_on_commit(
+            [
+                ChangeLog(
+                    entity=entity,
+                    object_id=object_id,
+                    audience_id=audience_id,
+                    deleted=deleted,
+                )
+            ]
+        )
+
+
+def record_follows(pairs, deleted=False):
+    """
+    Registra de una vez los seguimientos ``(follower_id, followed_id)``.
+    """
+    _write_on_commit(
+        [
+            ChangeLog(
+                entity=ChangeLog.FOLLOW,
+                object_id=followed_id,
+                audience_id=follower_id,
+                deleted=deleted,
+            )
+            for follower_id, followed_id in pairs
+        ]
+    )
+
+
+# Lectura -------------------------------------------------------------------
+
+
+def issue_token(user, cursor):
+    return signing.dumps({"u": user.pk, "c": cursor}, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(user, token):
+    """
+    Cursor del ``token`` de ``user``. Un token más antiguo que la retención
+    del registro puede apuntar a filas ya borradas: el cliente debe recargar
+    todo (410).
+    """
+    try:
+        data = signing.loads(
+            token,
+            salt=TOKEN_SALT,
+            max_age=settings.SYNC_RETENTION - settings.SYNC_SETTLE_SECONDS,
+        )
+    except signing.SignatureExpired:
+        raise SyncTokenError("Sync token expired, reload everything.", 410)
+    except signing.BadSignature:
+        raise SyncTokenError("Invalid sync token.")
+    if data.get("u") != user.pk:
+        raise SyncTokenError("Invalid sync token.")
+    return data["c"]
+
+
+def _settled_before():
+    return timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+
+def current_token(user):
+    """
+    Token para un cliente que acaba de cargarlo todo: apunta al final del
+    registro, salvo a las filas que aún pueden tener huecos delante.
+    """
+    cursor = ChangeLog.objects.filter(created_at__lte=_settled_before()).aggregate(
+        cursor=Max("id")
+    )["cursor"]
+    return issue_token(user, cursor or 0)
+
+
+def _audience(user):
+    authors = list(
+        Follow.objects.filter(follower=user).values_list("followed_id", flat=True)
+    )
+    authors.append(user.pk)
+    return ChangeLog.objects.filter(
+        Q(entity__in=[ChangeLog.POST, ChangeLog.COMMENT], audience_id__in=authors)
+        | Q(entity=ChangeLog.FOLLOW, audience_id=user.pk)
+    )
+
+
+def _compact(rows):
+    """
+    Última fila de cada entidad, en el orden de esas filas.
+    """
+    latest = {}
+    for row in rows:
+        latest.pop((row.entity, row.object_id), None)
+        latest[(row.entity, row.object_id)] = row
+    return list(latest.values())
+
+
+def _hydrate(rows):
+    post_ids = [
+        row.object_id for row in rows if row.entity == ChangeLog.POST and not row.deleted
+    ]
+    posts = {post["id"]: post for post in serialize_posts(post_ids)}
+    comment_ids = [
+        row.object_id for row in rows if row.entity == ChangeLog.COMMENT and not row.deleted
+    ]
+    comments = {
+        comment["id"]: comment
+        for comment in CommentSerializer(
+            Comment.objects.filter(pk__in=comment_ids).select_related("author"), many=True
+        ).data
+    }
+    data = {ChangeLog.POST: posts, ChangeLog.COMMENT: comments}
+    changes = []
+    for row in rows:
+        change = {"entity": row.entity, "id": row.object_id, "deleted": row.deleted}
+        if not row.deleted and row.entity in data:
+            if row.object_id not in data[row.entity]:
+                # Borrada después, en una fila que queda fuera de esta página.
+                change["deleted"] = True
+            else:
+                change["data"] = data[row.entity][row.object_id]
+        changes.append(change)
+    return changes
+
+
+def changes_since(user, cursor):
+    """
+    ``(changes, next_cursor, has_more)``: los cambios visibles para ``user``
+    posteriores a ``cursor``, compactados por entidad y con su estado actual.
+    Se leen como mucho ``SYNC_PAGE_SIZE`` filas del registro. ``next_cursor``
+    nunca pasa de la primera fila reciente, aunque la página siga: si una así
+    la corta, ``has_more`` es falso y el resto llega en la próxima
+    sincronización, cuando ya no pueda haber huecos delante.
+    """
+    size = settings.SYNC_PAGE_SIZE
+    rows = list(_audience(user).filter(id__gt=cursor).order_by("id")[: size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    next_cursor = cursor
+    settled = _settled_before()
+    for row in rows:
+        if row.created_at > settled:
+            has_more = False
+            break
+        next_cursor = row.id
+    return _hydrate(_compact(rows)), next_cursor, has_more
@@ -0,0 +1,57 @@
+"""
+Eventos en directo de ``/api/v1/sync/events/`` sobre ``core.events``.
+
+Canales:
+
+* ``posts:<autor>``: publicaciones nuevas del autor.
+* ``comments:<publicación>``: comentarios nuevos de la publicación.
+* ``user:<id>``: a quién empieza o deja de seguir el usuario, para que su
+  stream se suscriba a ``posts:<autor>`` o lo abandone sin reconectar.
+
+Los eventos solo avisan (tipo e ids); los datos se piden a la
+sincronización incremental, así que perder uno solo retrasa el cambio hasta
+la siguiente sincronización.
+"""
+
+from aplications.users.models import Follow
+from core.events import publish
+from django.db import transaction
+
+
+def publish_on_commit(channel, event):
+    transaction.on_commit(lambda: publish(channel, event))
+
+
+def announce_follows(pairs, deleted=False):
+    """
+    Avisa a los streams de los seguidores de los seguimientos
+    ``(follower_id, followed_id)``.
+    """
+    for follower_id, followed_id in pairs:
+        publish_on_commit(
+            f"user:{follower_id}",
+            {"type": "unfollow" if deleted else "follow", "followed_id": followed_id},
+        )
+
+
+def stream_channels(user_id, post_ids):
+    """
+    Canales del stream de ``user_id``: su timeline, sus seguimientos y los
+    comentarios de ``post_ids``.
+    """
+    authors = Follow.objects.filter(follower_id=user_id).values_list(
+        "followed_id", flat=True
+    )
+    return [
+        f"user:{user_id}",
+        f"posts:{user_id}",
+        *(f"posts:{author_id}" for author_id in authors),
+        *(f"comments:{post_id}" for post_id in post_ids),
+    ]
+
+
+def follow_changed(subscription, event):
+    if event["type"] == "follow":
+        subscription.add(f"posts:{event['followed_id']}")
+    elif event["type"] == "unfollow":
+        subscription.discard(f"posts:{event['followed_id']}")
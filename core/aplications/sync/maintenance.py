@@ -0,0 +1,14 @@
+from datetime import timedelta
+
+from core.maintenance import delete_in_batches, maintenance_task
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChangeLog
+
+
+@maintenance_task(interval=3600)
+def purge_change_log():
+    # Los tokens que apuntaban a estas filas ya han caducado (410).
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_RETENTION)
+    return delete_in_batches(ChangeLog.objects.filter(created_at__lt=cutoff))
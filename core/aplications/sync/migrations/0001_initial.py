@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(choices=[('post', 'Post'), ('comment', 'Comment'), ('follow', 'Follow')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('audience_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Change log entry',
+                'verbose_name_plural': 'Change log',
+                'indexes': [models.Index(fields=['audience_id', 'id'], name='sync_changelog_audience_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only record of a change to an entity that clients keep in sync.
+
+    Rows are written by the sync signals once the change commits, and only
+    ever deleted by the retention task.
+
+    Fields:
+        id (BigAutoField): Position in the log; sync tokens point at one.
+        entity (CharField): Kind of entity that changed.
+        object_id (BigIntegerField): Primary key of that entity (for follows,
+            the followed user).
+        audience_id (BigIntegerField): User whose clients receive the change:
+            the post's author for posts and comments, the follower for follows.
+            Not a foreign key, so the log outlives what it describes.
+        deleted (BooleanField): Whether the entity was deleted.
+        created_at (DateTimeField): When the row was written, after the change
+            committed.
+    """
+
+    POST = "post"
+    COMMENT = "comment"
+    FOLLOW = "follow"
+    ENTITY_CHOICES = [
+        (POST, "Post"),
+        (COMMENT, "Comment"),
+        (FOLLOW, "Follow"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=16, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    audience_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["audience_id", "id"], name="sync_changelog_audience_idx")
+        ]
+        verbose_name = "Change log entry"
+        verbose_name_plural = "Change log"
+
+    def __str__(self):
+        action = "deleted" if self.deleted else "changed"
+        return f"{self.entity} {self.object_id} {action}"
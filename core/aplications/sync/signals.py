@@ -0,0 +1,104 @@
+from aplications.media.helpers.pipeline import image_processed
+from aplications.posts.models import Comment, Favorite, Like, Post
+from aplications.users.models import Follow
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .helpers.changes import (
+    deleting_posts,
+    post_author,
+    record_change,
+    record_follows,
+)
+from .helpers.live import announce_follows, publish_on_commit
+from .models import ChangeLog
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleting_post(sender, instance, **kwargs):
+    deleting_posts().add(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def log_post(sender, instance, **kwargs):
+    deleted = kwargs["signal"] is post_delete
+    record_change(ChangeLog.POST, instance.pk, instance.author_id, deleted=deleted)
+    if deleted:
+        deleting_posts().discard(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def announce_post(sender, instance, created, **kwargs):
+    if created:
+        publish_on_commit(
+            f"posts:{instance.author_id}",
+            {"type": "post", "id": instance.pk, "author_id": instance.author_id},
+        )
+
+
+@receiver(image_processed, sender=Post)
+def log_processed_image(sender, pk, **kwargs):
+    record_change(ChangeLog.POST, pk, post_author(pk))
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def log_post_counters(sender, instance, **kwargs):
+    """
+    Los contadores van en los datos de la publicación: se registra ella.
+    """
+    if instance.post_id not in deleting_posts():
+        record_change(ChangeLog.POST, instance.post_id, post_author(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def log_comment(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    author_id = post_author(instance.post_id)
+    deleted = kwargs["signal"] is post_delete
+    record_change(ChangeLog.COMMENT, instance.pk, author_id, deleted=deleted)
+    # El número de comentarios de la publicación.
+    record_change(ChangeLog.POST, instance.post_id, author_id)
+
+
+@receiver(post_save, sender=Comment)
+def announce_comment(sender, instance, created, **kwargs):
+    if created:
+        publish_on_commit(
+            f"comments:{instance.post_id}",
+            {"type": "comment", "id": instance.pk, "post_id": instance.post_id},
+        )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def log_follow(sender, instance, **kwargs):
+    pairs = [(instance.follower_id, instance.followed_id)]
+    deleted = kwargs["signal"] is post_delete
+    record_follows(pairs, deleted=deleted)
+    announce_follows(pairs, deleted=deleted)
+
+
+@receiver(m2m_changed, sender=Follow)
+def log_following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    ``user.following.add()`` y compañía no envían post_save por cada Follow.
+    Los afectados por un clear() se leen antes de borrarlos.
+    """
+    if action == "pre_clear":
+        follows = Follow.objects.filter(
+            **{"followed" if reverse else "follower": instance}
+        ).values_list("follower_id", "followed_id")
+        pairs, deleted = list(follows), True
+    elif action in ("post_add", "post_remove"):
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        deleted = action == "post_remove"
+    else:
+        return
+    record_follows(pairs, deleted=deleted)
+    announce_follows(pairs, deleted=deleted)
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
+
+from aplications.authentication.models import CustomUser
+from aplications.posts.models import Comment, Like, Post
+from aplications.users.models import Follow
+from asgiref.sync import sync_to_async
+from core.cache import clear_near_caches
+from core.events import connection_count
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .maintenance import purge_change_log
+from .models import ChangeLog
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_near_caches()
+        self.client = APIClient()
+        self.user, self.followed, self.stranger = (
+            CustomUser.objects.create_user(
+                username=name, email=f"{name}@example.com", password="testpassword"
+            )
+            for name in ("lector", "seguido", "ajeno")
+        )
+        # El registro se escribe al confirmarse cada cambio.
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, followed=self.followed)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("sync")
+
+    def _sync(self, token=None):
+        response = self.client.get(self.url, {"sync_token": token} if token else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _entities(self, data):
+        return [(change["entity"], change["id"]) for change in data["changes"]]
+
+    @override_settings(SYNC_SETTLE_SECONDS=0)
+    def test_sync_returns_changes_compacted_per_entity(self):
+        token = self._sync()["sync_token"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.followed, content="hola")
+            for _ in range(3):
+                Like.objects.create(user=self.user, post=post).delete()
+            Like.objects.create(user=self.user, post=post)
+            comment = Comment.objects.create(post=post, author=self.user, content="¡Buena!")
+            Post.objects.create(author=self.stranger, content="no la sigo")
+            gone = Post.objects.create(author=self.user, content="borrada")
+            gone_comment = Comment.objects.create(
+                post=gone, author=self.followed, content="adiós"
+            )
+            Like.objects.create(user=self.followed, post=gone)
+        gone_id = gone.id
+        before = ChangeLog.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            gone.delete()
+        # El borrado en cascada de comentarios y likes no se registra aparte.
+        self.assertEqual(ChangeLog.objects.count(), before + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            newcomer = CustomUser.objects.create_user(
+                username="nuevo", email="nuevo@example.com", password="testpassword"
+            )
+            self.user.following.add(newcomer)
+
+        data = self._sync(token)
+        self.assertFalse(data["has_more"])
+        changes = {(change["entity"], change["id"]): change for change in data["changes"]}
+        self.assertEqual(len(changes), len(data["changes"]))
+        self.assertEqual(
+            set(changes),
+            {
+                ("post", post.id),
+                ("comment", comment.id),
+                ("post", gone_id),
+                ("comment", gone_comment.id),
+                ("follow", newcomer.id),
+            },
+        )
+        self.assertEqual(changes[("post", post.id)]["data"]["likes_count"], 1)
+        self.assertEqual(changes[("post", post.id)]["data"]["comments_count"], 1)
+        self.assertEqual(changes[("comment", comment.id)]["data"]["content"], "¡Buena!")
+        self.assertTrue(changes[("post", gone_id)]["deleted"])
+        # Creado y borrado después del token: llega como borrado.
+        self.assertTrue(changes[("comment", gone_comment.id)]["deleted"])
+        self.assertFalse(changes[("follow", newcomer.id)]["deleted"])
+
+        self.assertEqual(self._sync(data["sync_token"])["changes"], [])
+
+    def test_recent_changes_are_sent_again(self):
+        token = self._sync()["sync_token"]
+        post = self._committed(lambda: Post.objects.create(author=self.followed, content="hola"))
+        data = self._sync(token)
+        self.assertIn(("post", post.id), self._entities(data))
+        # Aún puede confirmarse una fila anterior: el cursor no la ha pasado.
+        again = self._sync(data["sync_token"])
+        self.assertIn(("post", post.id), self._entities(again))
+
+    @override_settings(SYNC_SETTLE_SECONDS=0, SYNC_PAGE_SIZE=2)
+    def test_sync_pages_through_the_log(self):
+        token = self._sync()["sync_token"]
+        with self.captureOnCommitCallbacks(execute=True):
+            posts = [
+                Post.objects.create(author=self.followed, content=str(i)) for i in range(3)
+            ]
+        data = self._sync(token)
+        self.assertTrue(data["has_more"])
+        self.assertEqual(self._entities(data), [("post", p.id) for p in posts[:2]])
+        data = self._sync(data["sync_token"])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self._entities(data), [("post", posts[2].id)])
+
+    @override_settings(SYNC_PAGE_SIZE=3)
+    def test_paging_stops_at_recent_rows(self):
+        token = self._sync()["sync_token"]
+        old = self._committed(
+            lambda: Post.objects.create(author=self.followed, content="antigua")
+        )
+        # Ya asentadas: el seguimiento de setUp y esta publicación.
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            recent = [
+                Post.objects.create(author=self.followed, content=str(i)) for i in range(2)
+            ]
+        data = self._sync(token)
+        # La página acaba en filas recientes: no se salta las que falten delante.
+        self.assertFalse(data["has_more"])
+        again = self._sync(data["sync_token"])
+        self.assertNotIn(("post", old.id), self._entities(again))
+        self.assertIn(("post", recent[0].id), self._entities(again))
+
+    def test_invalid_and_expired_tokens(self):
+        token = self._sync()["sync_token"]
+        response = self.client.get(self.url, {"sync_token": token + "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.followed)
+        response = self.client.get(self.url, {"sync_token": token})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.user)
+        later = time.time() + 30 * 24 * 3600
+        with mock.patch("django.core.signing.time.time", return_value=later):
+            response = self.client.get(self.url, {"sync_token": token})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_changes_are_logged_when_they_commit(self):
+        before = ChangeLog.objects.count()
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(author=self.followed, content="hola")
+            Comment.objects.create(post=post, author=self.user, content="¡Buena!")
+        # Hasta la confirmación no hay filas ni posición en el registro.
+        self.assertEqual(ChangeLog.objects.count(), before)
+        committed_at = timezone.now()
+        for callback in callbacks:
+            callback()
+        rows = ChangeLog.objects.order_by("-id")[:3]
+        self.assertEqual(ChangeLog.objects.count(), before + 3)
+        self.assertTrue(all(row.created_at >= committed_at for row in rows))
+
+    def test_purge_change_log(self):
+        self._committed(lambda: Post.objects.create(author=self.user, content="hola"))
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=30))
+        recent = ChangeLog.objects.create(
+            entity=ChangeLog.POST, object_id=1, audience_id=self.user.id
+        )
+        self.assertGreater(purge_change_log(), 0)
+        self.assertEqual(list(ChangeLog.objects.all()), [recent])
+
+    def _committed(self, func):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func()
+
+    async def test_event_stream(self):
+        post = await sync_to_async(Post.objects.create)(author=self.user, content="hola")
+        token = await sync_to_async(RefreshToken.for_user)(self.user)
+        headers = {"Authorization": f"Bearer {token.access_token}"}
+        response = await self.async_client.get(
+            reverse("sync-events"), {"posts": "1,x"}, headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        connections = connection_count()
+        response = await self.async_client.get(
+            reverse("sync-events"), {"posts": str(post.id)}, headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+        self.assertEqual(connection_count(), connections + 1)
+
+        async def next_event():
+            return (await asyncio.wait_for(anext(chunks), 1)).decode()
+
+        await sync_to_async(self._committed)(
+            lambda: Comment.objects.create(post=post, author=self.followed, content="hola")
+        )
+        self.assertTrue((await next_event()).startswith("event: comment\n"))
+        await sync_to_async(self._committed)(
+            lambda: Post.objects.create(author=self.followed, content="nueva")
+        )
+        self.assertTrue((await next_event()).startswith("event: post\n"))
+        # Al seguir a alguien el stream se suscribe a sus publicaciones.
+        await sync_to_async(self._committed)(
+            lambda: Post.objects.create(author=self.stranger, content="aún no")
+        )
+        await sync_to_async(self._committed)(
+            lambda: Follow.objects.create(follower=self.user, followed=self.stranger)
+        )
+        self.assertTrue((await next_event()).startswith("event: follow\n"))
+        await sync_to_async(self._committed)(
+            lambda: Post.objects.create(author=self.stranger, content="ya sí")
+        )
+        event = await next_event()
+        self.assertIn('"author_id": %d' % self.stranger.id, event)
+
+        # El servidor ASGI cancela la lectura cuando el cliente se desconecta.
+        reader = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(connection_count(), connections)
+
+    def test_event_stream_needs_asgi(self):
+        response = self.client.get(reverse("sync-events"))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
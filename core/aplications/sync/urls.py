@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import EventStreamView, SyncView
+
+urlpatterns = [
+    path("", SyncView.as_view(), name="sync"),
+    path("events/", EventStreamView.as_view(), name="sync-events"),
+]
@@ -0,0 +1,177 @@
+from asgiref.sync import sync_to_async
+from core.async_views import AsyncAPIView
+from core.events import event_stream
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .helpers.changes import (
+    SyncTokenError,
+    changes_since,
+    current_token,
+    issue_token,
+    read_token,
+)
+from .helpers.live import follow_changed, stream_channels
+
+change_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "entity": openapi.Schema(
+            type=openapi.TYPE_STRING, enum=["post", "comment", "follow"]
+        ),
+        "id": openapi.Schema(
+            type=openapi.TYPE_INTEGER,
+            description="ID de la entidad (en follow, el usuario seguido)",
+        ),
+        "deleted": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+        "data": openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            description="Estado actual de la publicación o del comentario",
+        ),
+    },
+)
+
+
+class SyncView(APIView):
+    """
+    Vista de sincronización incremental para los clientes móviles.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Sincronizar cambios",
+        operation_description=(
+            "Devuelve los cambios en las publicaciones propias y de los usuarios seguidos, "
+            "en sus comentarios y en los seguimientos del usuario desde el sync_token indicado, "
+            "una entrada por entidad con su estado actual. Sin sync_token devuelve solo un token "
+            "para la próxima vez, tras la carga completa. Si has_more es true hay que repetir "
+            "la petición con el nuevo token. Requiere un token JWT válido."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "sync_token",
+                openapi.IN_QUERY,
+                description="Token devuelto por la sincronización anterior",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Cambios desde el token",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "changes": openapi.Schema(
+                            type=openapi.TYPE_ARRAY, items=change_schema
+                        ),
+                        "sync_token": openapi.Schema(type=openapi.TYPE_STRING),
+                        "has_more": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    },
+                ),
+            ),
+            400: openapi.Response(description="Token no válido"),
+            410: openapi.Response(
+                description="Token caducado: hay que recargarlo todo y sincronizar sin token"
+            ),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Devuelve los cambios posteriores al ``sync_token`` del cliente.
+        """
+        user = request.user
+        token = request.query_params.get("sync_token")
+        if not token:
+            return Response(
+                {"changes": [], "sync_token": current_token(user), "has_more": False},
+                status=status.HTTP_200_OK,
+            )
+        try:
+            cursor = read_token(user, token)
+        except SyncTokenError as exc:
+            return Response({"error": str(exc)}, status=exc.status_code)
+        changes, cursor, has_more = changes_since(user, cursor)
+        return Response(
+            {
+                "changes": changes,
+                "sync_token": issue_token(user, cursor),
+                "has_more": has_more,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class EventStreamView(AsyncAPIView):
+    """
+    Stream de eventos (Server-Sent Events) con las publicaciones nuevas del
+    timeline y los comentarios nuevos de las publicaciones observadas.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Eventos en directo",
+        operation_description=(
+            "Stream text/event-stream (solo con el servidor ASGI, core/asgi.py). Eventos: "
+            "post (publicación nueva del usuario o de un usuario seguido), comment (comentario "
+            "nuevo en una publicación de posts), follow/unfollow, resync (pueden haberse "
+            "perdido eventos: sincronizar) y overflow (el cliente no leía a tiempo: el stream "
+            "se cierra; reconectar y sincronizar). Los eventos solo llevan ids; los datos se "
+            "obtienen con /sync/. Requiere un token JWT válido."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "posts",
+                openapi.IN_QUERY,
+                description="IDs de publicaciones, separados por comas, cuyos comentarios se quieren recibir",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: openapi.Response(description="Stream de eventos"),
+            400: openapi.Response(description="Parámetro posts no válido"),
+            501: openapi.Response(description="Servidor sin ASGI"),
+        },
+        security=[{"Bearer": []}],
+    )
+    async def get(self, request, *args, **kwargs):
+        """
+        Abre el stream de eventos del usuario autenticado.
+        """
+        if not isinstance(request._request, ASGIRequest):
+            # Bajo WSGI la respuesta se consumiría entera antes de enviarse.
+            return Response(
+                {"error": "Event streams are only served by the ASGI application."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        try:
+            post_ids = {
+                int(post_id)
+                for post_id in request.query_params.get("posts", "").split(",")
+                if post_id.strip()
+            }
+        except ValueError:
+            return Response(
+                {"error": "posts must be a comma-separated list of post IDs."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(post_ids) > settings.EVENTS_MAX_WATCHED_POSTS:
+            return Response(
+                {"error": f"At most {settings.EVENTS_MAX_WATCHED_POSTS} posts can be watched."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        channels = await sync_to_async(stream_channels)(request.user.pk, post_ids)
+        response = StreamingHttpResponse(
+            event_stream(channels, on_event=follow_changed),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Sin buffer en nginx: cada evento sale en cuanto se escribe.
+        response["X-Accel-Buffering"] = "no"
+        return response
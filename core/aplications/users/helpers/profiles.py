@@ -0,0 +1,132 @@
+"""
+Cabecera del perfil público (nombre, foto, contadores, fecha de alta).
+
+Se guarda en el namespace ``profiles`` de ``core.cache`` con un grupo por
+usuario. Los signals invalidan el grupo cuando cambia algo que aparece en la
+cabecera (sus datos, sus seguidores o sus publicaciones).
+"""
+
+from aplications.authentication.models import CustomUser
+from aplications.posts.models import Post
+from asgiref.sync import sync_to_async
+from core.async_views import gather_queries
+from core.cache import CacheNamespace
+from core.conditional import bump
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ..models import Follow
+from ..serializers import CustomUserProfileSerializer
+
+# Los perfiles muy visitados se sirven desde la memoria del proceso.
+profile_headers = CacheNamespace(
+    "profiles",
+    timeout=settings.PROFILE_HEADER_TIMEOUT,
+    near_timeout=settings.PROFILE_HEADER_NEAR_TIMEOUT,
+)
+
+
+def _count(model, field):
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def invalidate_profiles(*user_ids):
+    """
+    Descarta las cabeceras de ``user_ids`` y renueva su validador HTTP
+    (``profile:<id>``) cuando se confirme la transacción.
+    """
+    user_ids = set(user_ids)
+
+    def flush():
+        profile_headers.invalidate(*user_ids)
+        bump(*(f"profile:{pk}" for pk in user_ids))
+
+    transaction.on_commit(flush)
+
+
+def _header_timeout(header):
+    # Con la foto aún en el pipeline las variantes llegan sin pasar por
+    # save(), así que esa cabecera solo se guarda unos segundos.
+    if header is None or (header["profile_photo"] and header["_pending_photo"]):
+        return settings.PROFILE_HEADER_PENDING_TIMEOUT
+    return settings.PROFILE_HEADER_TIMEOUT
+
+
+def _serialize_header(user):
+    if user is None:
+        return None
+    header = CustomUserProfileSerializer(user).data
+    header["_pending_photo"] = user.profile_photo_width is None
+    return header
+
+
+def _public(header):
+    if header is None:
+        return None
+    return {key: value for key, value in header.items() if key != "_pending_photo"}
+
+
+def _load_header(user_id):
+    """
+    Usuario y contadores en una única consulta con subconsultas indexadas,
+    sin cargar las publicaciones.
+    """
+    user = (
+        CustomUser.objects.filter(pk=user_id)
+        .annotate(
+            followers_total=_count(Follow, "followed"),
+            following_total=_count(Follow, "follower"),
+            posts_total=_count(Post, "author"),
+        )
+        .first()
+    )
+    return _serialize_header(user)
+
+
+def get_profile_header(user_id):
+    """
+    Devuelve la cabecera serializada del usuario ``user_id`` o ``None`` si no
+    existe.
+    """
+    header = profile_headers.get_or_set(
+        user_id,
+        lambda: _load_header(user_id),
+        group=user_id,
+        timeout=_header_timeout,
+    )
+    return _public(header)
+
+
+async def aget_profile_header(user_id):
+    """
+    Versión async de ``get_profile_header``: si la cabecera no está en caché,
+    el usuario y los tres contadores se consultan a la vez.
+    """
+    header = await sync_to_async(profile_headers.get)(user_id, group=user_id)
+    if header is not None:
+        return _public(header)
+    user, followers, following, posts = await gather_queries(
+        CustomUser.objects.filter(pk=user_id).first,
+        Follow.objects.filter(followed_id=user_id).count,
+        Follow.objects.filter(follower_id=user_id).count,
+        Post.objects.filter(author_id=user_id).count,
+    )
+    if user is not None:
+        user.followers_total = followers
+        user.following_total = following
+        user.posts_total = posts
+    header = _serialize_header(user)
+    if header is not None:
+        await sync_to_async(profile_headers.set)(
+            user_id, header, group=user_id, timeout=_header_timeout(header)
+        )
+    return _public(header)
@@ -0,0 +1,88 @@
+from aplications.authentication.models import CustomUser
+from core.prefix_index import RefreshedPrefixIndex
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Greatest
+
+from ..serializers import UserCardSerializer
+
+SEARCH_FIELDS = ("username", "first_name", "last_name")
+
+
+def search_users(query):
+    """
+    Devuelve los usuarios que coinciden con ``query`` anotados con ``rank``
+    (entero, mayor es mejor) para ordenarlos por ``("-rank", "id")``.
+
+    En Postgres usa los índices GIN ``gin_trgm_ops`` y ordena por similitud de
+    trigramas; en SQLite se recurre a ``icontains`` con un ranking por prefijo.
+    """
+    users = CustomUser.objects.filter(is_active=True)
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        matches = Q(username__startswith=query.lower())
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f"{field}__trigram_similar": query})
+        similarity = Greatest(
+            *(TrigramSimilarity(field, query) for field in SEARCH_FIELDS)
+        )
+        # Entero para que el cursor compare valores exactos.
+        rank = Cast(similarity * 10000, IntegerField())
+        return users.filter(matches).annotate(rank=rank)
+
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f"{field}__icontains": query})
+    rank = Case(
+        When(username__istartswith=query, then=Value(3)),
+        When(
+            Q(first_name__istartswith=query) | Q(last_name__istartswith=query),
+            then=Value(2),
+        ),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    return users.filter(matches).annotate(rank=rank)
+
+
+class PopularUsernameIndex(RefreshedPrefixIndex):
+    """
+    Índice en memoria de los usernames de los usuarios con más seguidores,
+    para autocompletar sin consultar la base de datos. Se reconstruye en
+    segundo plano cada ``USER_AUTOCOMPLETE_REFRESH`` segundos; hasta tenerlo
+    se buscan los usernames por prefijo en la base de datos.
+    """
+
+    thread_name = "username-autocomplete"
+
+    def refresh_interval(self):
+        return settings.USER_AUTOCOMPLETE_REFRESH
+
+    @staticmethod
+    def _popular(users):
+        return users.filter(is_active=True, username__isnull=False).annotate(
+            followers_total=Count("follower_relations")
+        )
+
+    def entries(self):
+        users = self._popular(CustomUser.objects.all()).order_by(
+            "-followers_total", "id"
+        )[: settings.USER_AUTOCOMPLETE_SIZE]
+        return (
+            (user.username, user.followers_total, UserCardSerializer(user).data)
+            for user in users.iterator(chunk_size=5000)
+        )
+
+    def search(self, prefix, limit):
+        index = self.index()
+        if index is None:
+            users = self._popular(
+                CustomUser.objects.filter(username__startswith=prefix.lower())
+            ).order_by("-followers_total", "id")[:limit]
+            return UserCardSerializer(users, many=True).data
+        return index.search(prefix, limit)
+
+
+popular_usernames = PopularUsernameIndex()
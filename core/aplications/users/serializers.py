@@ -1,4 +1,9 @@
 from aplications.authentication.models import CustomUser
+from aplications.media.helpers.pipeline import (
+    InvalidImage,
+    validate_image_upload,
+    variant_urls,
+)
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
@@ -20,30 +25,62 @@ class FollowSerializer(ModelSerializer):
 
 
 class CustomUserProfileSerializer(ModelSerializer):
+    """
+    Cabecera del perfil público. Los contadores se leen de las anotaciones
+    ``followers_total``, ``following_total`` y ``posts_total`` si existen;
+    las publicaciones se paginan aparte.
+    """
+
     followers_count = serializers.SerializerMethodField()
     following_count = serializers.SerializerMethodField()
+    posts_count = serializers.SerializerMethodField()
     date_joined = serializers.DateTimeField(format="%d/%m/%Y", read_only=True)
-    posts = PostSummarySerializer(source="post_set", many=True, read_only=True)  # Agrega este campo
+    profile_photo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
         fields = (
+            "id",
             "username",
             "first_name",
             "last_name",
             "profile_photo",
+            "profile_photo_blurhash",
+            "profile_photo_variants",
             "date_joined",
             "followers_count",
             "following_count",
-            "posts",  # Incluye el campo posts
+            "posts_count",
         )
 
+    def get_profile_photo_variants(self, obj):
+        return variant_urls(obj.profile_photo_variants)
+
     def get_followers_count(self, obj):
+        if hasattr(obj, "followers_total"):
+            return obj.followers_total
         return obj.followers.count()
 
     def get_following_count(self, obj):
+        if hasattr(obj, "following_total"):
+            return obj.following_total
         return obj.following.count()
 
+    def get_posts_count(self, obj):
+        if hasattr(obj, "posts_total"):
+            return obj.posts_total
+        return obj.post_set.count()
+
+
+class UserCardSerializer(ModelSerializer):
+    """
+    Representación compacta de un usuario para búsquedas y autocompletado.
+    """
+
+    class Meta:
+        model = CustomUser
+        fields = ("id", "username", "first_name", "last_name", "profile_photo")
+
 
 class CustomUserSettingsSerializer(ModelSerializer):
     class Meta:
@@ -61,4 +98,16 @@ class CustomUserSettingsSerializer(ModelSerializer):
             "created_at",
             "date_joined",
             "following",
+            "profile_photo_width",
+            "profile_photo_height",
+            "profile_photo_blurhash",
+            "profile_photo_variants",
         ]
+
+    def validate_profile_photo(self, value):
+        if value:
+            try:
+                validate_image_upload(value)
+            except InvalidImage as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
@@ -0,0 +1,63 @@
+from aplications.authentication.models import CustomUser
+from aplications.media.helpers.pipeline import image_processed
+from aplications.posts.helpers.caching import invalidate_feeds, invalidate_records
+from aplications.posts.models import Post
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .helpers.profiles import invalidate_profiles
+from .models import Follow
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_saved_user(sender, instance, update_fields=None, **kwargs):
+    # El login solo actualiza last_login, que no aparece en el perfil.
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_profiles(instance.pk)
+    # El nombre del autor aparece en sus publicaciones.
+    invalidate_records(author_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    invalidate_profiles(instance.follower_id, instance.followed_id)
+    invalidate_feeds(user_ids=[instance.follower_id])
+
+
+@receiver(m2m_changed, sender=Follow)
+def invalidate_following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    ``user.following.add()`` y compañía no envían post_save por cada Follow.
+    Tras un clear() pk_set es None, así que los afectados se leen antes.
+    """
+    if action == "pre_clear":
+        instance._cleared_follow_ids = list(
+            Follow.objects.filter(
+                **{"followed" if reverse else "follower": instance}
+            ).values_list("follower_id" if reverse else "followed_id", flat=True)
+        )
+        return
+    if action == "post_clear":
+        others = instance.__dict__.pop("_cleared_follow_ids", ())
+    elif action in ("post_add", "post_remove"):
+        others = pk_set
+    else:
+        return
+    invalidate_profiles(instance.pk, *others)
+    # Cambia el feed de quien sigue: ``instance`` o, desde user.followers, los otros.
+    invalidate_feeds(user_ids=others if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_author(sender, instance, created=True, **kwargs):
+    # Editar una publicación no cambia el número de publicaciones.
+    if created:
+        invalidate_profiles(instance.author_id)
+
+
+@receiver(image_processed, sender=CustomUser)
+def invalidate_processed_photo(sender, pk, **kwargs):
+    invalidate_profiles(pk)
@@ -1,11 +1,24 @@
-from rest_framework.test import APIClient, APITestCase
+import time
+from unittest import mock
+
+from core.cache import clear_near_caches
+from django.core.cache import cache
+
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
 from django.urls import reverse
 from rest_framework import status
 from aplications.authentication.models import CustomUser
+from aplications.posts.models import Post
+from aplications.posts.serializers import KeysetPagination
+
+from .helpers.search import popular_usernames
+from .models import Follow
 # Create your tests here.
 
 class UserViewTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+        clear_near_caches()
         # Create a user and authenticate
         self.client = APIClient()
         self.user1 = CustomUser.objects.create_user(
@@ -49,6 +62,121 @@ class UserViewTestCase(APITestCase):
 
         print(response.data)
 
+    def test_profile_header_is_cached_and_posts_are_paginated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(12):
+                Post.objects.create(author=self.user2, content=f"post {number}")
+        url = reverse("user-profile", args=[self.user2.username])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["posts_count"], 12)
+        self.assertEqual(response.data["followers_count"], 0)
+        self.assertEqual(len(response.data["posts"]["results"]), 10)
+        self.assertEqual(response.data["posts"]["results"][0]["content"], "post 11")
+
+        second = self.client.get(response.data["posts"]["next"])
+        self.assertEqual(
+            [post["content"] for post in second.data["results"]], ["post 1", "post 0"]
+        )
+        self.assertIsNone(second.data["next"])
+
+        # La cabecera, los ids de la página y las publicaciones salen de la
+        # caché: solo se busca el id del usuario.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("follow"), {"followed": self.user2.id}, format="json")
+        response = self.client.get(url)
+        self.assertEqual(response.data["followers_count"], 1)
+
+        self.assertEqual(
+            self.client.get(reverse("user-profile", args=["missing"])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_clearing_following_invalidates_profiles(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.following.add(self.user2, self.user3)
+        urls = [reverse("user-profile", args=[user.username]) for user in (self.user2, self.user3)]
+        for url in urls:
+            self.assertEqual(self.client.get(url).data["followers_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.following.clear()
+        for url in urls:
+            self.assertEqual(self.client.get(url).data["followers_count"], 0)
+
+        # Desde el otro lado de la relación se invalida a los seguidores.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user2.following.add(self.user1)
+        url = reverse("user-profile", args=[self.user2.username])
+        self.assertEqual(self.client.get(url).data["following_count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.followers.clear()
+        self.assertEqual(self.client.get(url).data["following_count"], 0)
+
+    def test_forged_cursors_are_not_found(self):
+        url = reverse("user-posts", args=[self.user2.username])
+        forged = [["not-a-date", 1], [{"a": 1}, 2], ["2024-01-01T00:00:00", "x"]]
+        # Sin firma, o firmados para otra ordenación (la búsqueda de usuarios).
+        search = KeysetPagination(ordering=("-rank", "id"))
+        cursors = [search.encode_cursor(position) for position in forged]
+        cursors += [cursor.rsplit(":", 1)[0] for cursor in cursors]
+        for cursor in cursors:
+            response = self.client.get(url, {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, cursor)
+
+    def test_profile_answers_conditional_requests(self):
+        url = reverse("user-profile", args=[self.user2.username])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Last-Modified solo se envía cuando ya ha pasado ese segundo.
+        with mock.patch("core.conditional.time.time", return_value=time.time() + 5):
+            last_modified = self.client.get(url)["Last-Modified"]
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("follow"), {"followed": self.user2.id}, format="json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["followers_count"], 1)
+
+    def test_async_profile_matches_sync_profile(self):
+        Follow.objects.create(follower=self.user1, followed=self.user2)
+        for number in range(12):
+            Post.objects.create(author=self.user2, content=f"post {number}")
+        cache.clear()
+        async_response = self.client.get(
+            reverse("user-profile-async", args=[self.user2.username])
+        )
+        cache.clear()
+        response = self.client.get(reverse("user-profile", args=[self.user2.username]))
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.content, response.content)
+        # Los validadores se borraron con la caché: se comparan los actuales.
+        async_response = self.client.get(
+            reverse("user-profile-async", args=[self.user2.username])
+        )
+        for header in ("ETag", "Cache-Control"):
+            self.assertEqual(async_response[header], response[header])
+        async_response = self.client.get(
+            reverse("user-profile-async", args=[self.user2.username]),
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(async_response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(async_response.content, b"")
+
+        missing = self.client.get(reverse("user-profile-async", args=["missing"]))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.logout()
+        anonymous = self.client.get(reverse("user-profile-async", args=["user2"]))
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_follow_user(self):
         url = reverse("follow")
         data = {"followed": self.user2.id}
@@ -141,3 +269,75 @@ class UserViewTestCase(APITestCase):
         data = {"followed": self.user2.id}
         response = self.client.post(url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_search_users_keyset_pagination(self):
+        CustomUser.objects.create_user(
+            username="maria", email="maria@example.com", password="x",
+            first_name="Maria", last_name="Lopez",
+        )
+        CustomUser.objects.create_user(
+            username="jlopez", email="jl@example.com", password="x",
+            first_name="Juan", last_name="Lopez",
+        )
+        CustomUser.objects.create_user(
+            username="lopezz", email="lz@example.com", password="x",
+            first_name="Ana", last_name="Perez",
+        )
+        url = reverse("user-search")
+        response = self.client.get(url, {"q": "lopez"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Primero el prefijo de username, después el de apellido, por id
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]],
+            ["lopezz", "maria", "jlopez"],
+        )
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(
+            set(response.data["results"][0]),
+            {"id", "username", "first_name", "last_name", "profile_photo"},
+        )
+
+        with mock.patch.object(KeysetPagination, "page_size", 2):
+            first = self.client.get(url, {"q": "lopez"})
+            second = self.client.get(first.data["next"])
+        self.assertEqual(len(first.data["results"]), 2)
+        self.assertEqual(
+            [user["username"] for user in second.data["results"]], ["jlopez"]
+        )
+
+    def test_autocomplete_prefers_followed_users(self):
+        Follow.objects.create(follower=self.user1, followed=self.user3)
+        # Hasta que el hilo de fondo construye el índice responde la base de datos.
+        with mock.patch.object(popular_usernames, "index", return_value=None):
+            fallback = self.client.get(reverse("user-autocomplete"), {"q": "USER"})
+        popular_usernames.rebuild()
+        response = self.client.get(reverse("user-autocomplete"), {"q": "USER"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["username"], "user3")
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(fallback.data, response.data)
+
+
+class AsyncProfileConcurrencyTestCase(APITransactionTestCase):
+    """
+    Fuera de una transacción las consultas van a hilos con su propia conexión.
+    """
+
+    def test_concurrent_queries_match_sync_profile(self):
+        user = CustomUser.objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        reader = CustomUser.objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        Follow.objects.create(follower=reader, followed=user)
+        Post.objects.create(author=user, content="hola #mundo")
+        self.client.force_authenticate(user=reader)
+
+        cache.clear()
+        async_response = self.client.get(reverse("user-profile-async", args=["writer"]))
+        cache.clear()
+        response = self.client.get(reverse("user-profile", args=["writer"]))
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.data["followers_count"], 1)
+        self.assertEqual(async_response.content, response.content)
@@ -2,15 +2,27 @@
 from django.urls import path
 
 from .views import (
+    AsyncUserProfileView,
     FollowUserView,
     ProfileSettingsView,
     UnfollowUserView,
+    UserAutocompleteView,
+    UserPostsView,
     UserProfileView,
+    UserSearchView,
 )
 
 urlpatterns = [
     path("profile/", ProfileSettingsView.as_view(), name="profile"),
     path("follow/", FollowUserView.as_view(), name="follow"),
     path("unfollow/", UnfollowUserView.as_view(), name="unfollow"),
+    path("search/", UserSearchView.as_view(), name="user-search"),
+    path("autocomplete/", UserAutocompleteView.as_view(), name="user-autocomplete"),
     path("user/<str:username>/", UserProfileView.as_view(), name="user-profile"),
+    path("user/<str:username>/posts/", UserPostsView.as_view(), name="user-posts"),
+    path(
+        "async/user/<str:username>/",
+        AsyncUserProfileView.as_view(),
+        name="user-profile-async",
+    ),
 ]
@@ -1,16 +1,29 @@
-from aplications.posts.serializers import PostSerializer, SocialMediaCursorPagination
-from django.shortcuts import get_object_or_404, render
+import asyncio
+
+from aplications.posts.helpers.hydration import paginate_post_ids, serialize_posts
+from aplications.posts.models import Post
+from aplications.posts.serializers import KeysetPagination, PostSerializer
+from core.async_views import AsyncAPIView, gather_queries
+from core.conditional import aconditional_response, conditional_response
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import render
+from django.urls import reverse
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from .helpers.profiles import aget_profile_header, get_profile_header
+from .helpers.search import popular_usernames, search_users
 from .models import Follow
 from .serializers import (
     CustomUser,
     CustomUserProfileSerializer,
     CustomUserSettingsSerializer,
     FollowSerializer,
+    UserCardSerializer,
 )
 
 # Create your views here.
@@ -60,35 +73,145 @@ class ProfileSettingsView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def paginate_user_posts(request, user_id):
+    """
+    Página de publicaciones de ``user_id`` recorriendo el índice
+    (author, created_at, id): el coste depende del tamaño de la página, no
+    del número total de publicaciones. Los ids de cada página quedan en caché
+    hasta que el usuario publique o borre algo.
+    """
+    paginator, post_ids = paginate_post_ids(
+        request,
+        Post.objects.filter(author_id=user_id),
+        f"author:{user_id}",
+        page_size=10,
+    )
+    return paginator, serialize_posts(post_ids)
+
+
+def profile_response(request, username, header, paginator, posts):
+    if header is None:
+        raise Http404("User not found.")
+    next_link = None
+    if paginator.next_position is not None:
+        next_link = replace_query_param(
+            request.build_absolute_uri(reverse("user-posts", args=[username])),
+            paginator.cursor_query_param,
+            paginator.encode_cursor(paginator.next_position),
+        )
+    return Response(
+        {**header, "posts": {"next": next_link, "results": posts}},
+        status=status.HTTP_200_OK,
+    )
+
+
+def get_user_id(username):
+    try:
+        return CustomUser.objects.cache().get(username=username).pk
+    except CustomUser.DoesNotExist:
+        raise Http404("User not found.")
+
+
 class UserProfileView(generics.GenericAPIView):
     """
-    Vista para obtener el perfil de un usuario con posts paginados (scroll infinito).
+    Vista para obtener el perfil público de un usuario: la cabecera (en caché)
+    y la primera página de sus publicaciones.
     """
 
     serializer_class = CustomUserProfileSerializer
-    pagination_class = (
-        SocialMediaCursorPagination  # Usa el paginador de scroll infinito
-    )
 
+    @swagger_auto_schema(
+        operation_summary="Perfil público de un usuario",
+        operation_description="Devuelve nombre, foto, contadores y fecha de alta del usuario junto a la primera página de sus publicaciones. Las siguientes páginas se piden a posts.next. Admite peticiones condicionales (ETag / Last-Modified). Requiere un token JWT válido.",
+        responses={
+            200: CustomUserProfileSerializer,
+            304: openapi.Response(description="Sin cambios"),
+            404: openapi.Response(description="Usuario no encontrado"),
+        },
+        security=[{"Bearer": []}],
+    )
     def get(self, request, username, *args, **kwargs):
-        if not username:
-            return Response(
-                {"error": "Username is required"}, status=status.HTTP_400_BAD_REQUEST
+        """
+        Con ``If-None-Match`` o ``If-Modified-Since`` vigentes responde 304
+        sin cargar la cabecera ni las publicaciones.
+        """
+        user_id = get_user_id(username)
+
+        def render():
+            header = get_profile_header(user_id)
+            paginator, posts = paginate_user_posts(request, user_id)
+            return profile_response(request, username, header, paginator, posts)
+
+        return conditional_response(
+            request, [f"profile:{user_id}", f"posts:{user_id}", "tags"], render
+        )
+
+
+class AsyncUserProfileView(AsyncAPIView):
+    """
+    Versión async de ``UserProfileView`` (servida bajo ASGI): la cabecera y
+    la página de publicaciones se consultan a la vez.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Perfil público de un usuario (async)",
+        operation_description="Igual que /users/user/<username>/, pero las consultas independientes se ejecutan en paralelo. Admite peticiones condicionales (ETag / Last-Modified). Requiere un token JWT válido.",
+        responses={
+            200: CustomUserProfileSerializer,
+            304: openapi.Response(description="Sin cambios"),
+            404: openapi.Response(description="Usuario no encontrado"),
+        },
+        security=[{"Bearer": []}],
+    )
+    async def get(self, request, username, *args, **kwargs):
+        try:
+            user = await CustomUser.objects.cache().aget(username=username)
+        except CustomUser.DoesNotExist:
+            raise Http404("User not found.")
+        user_id = user.pk
+
+        async def render():
+            header, (page,) = await asyncio.gather(
+                aget_profile_header(user_id),
+                gather_queries(lambda: paginate_user_posts(request, user_id)),
             )
-        user = get_object_or_404(CustomUser, username=username)
+            return profile_response(request, username, header, *page)
 
-        # Paginar los posts del usuario
-        posts_qs = user.post_set.all().order_by("-created_at")
-        paginator = self.pagination_class()
-        page = paginator.paginate_queryset(posts_qs, request)
-        posts_serializer = PostSerializer(page, many=True)
+        return await aconditional_response(
+            request, [f"profile:{user_id}", f"posts:{user_id}", "tags"], render
+        )
 
-        # Serializar el usuario y reemplazar el campo 'posts' por los paginados
-        user_serializer = CustomUserProfileSerializer(user)
-        data = user_serializer.data
-        data["posts"] = posts_serializer.data
 
-        return paginator.get_paginated_response(data)
+class UserPostsView(generics.GenericAPIView):
+    """
+    Vista para paginar las publicaciones de un usuario (scroll infinito).
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Publicaciones de un usuario",
+        operation_description="Lista las publicaciones del usuario de la más reciente a la más antigua, con paginación por cursor (keyset). Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Cursor de la siguiente página",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: PostSerializer(many=True),
+            404: openapi.Response(description="Usuario no encontrado"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, username, *args, **kwargs):
+        user_id = get_user_id(username)
+
+        def render():
+            paginator, posts = paginate_user_posts(request, user_id)
+            return paginator.get_paginated_response(posts)
+
+        return conditional_response(request, [f"posts:{user_id}", "tags"], render)
 
 
 class FollowUserView(generics.GenericAPIView):
@@ -114,6 +237,7 @@ class FollowUserView(generics.GenericAPIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request, *args, **kwargs) -> Response:
         """
         Permite al usuario autenticado seguir a otro usuario.
@@ -153,6 +277,7 @@ class UnfollowUserView(generics.GenericAPIView):
         },
         security=[{"Bearer": []}],
     )
+    @transaction.atomic
     def post(self, request, *args, **kwargs) -> Response:
         """
         Permite al usuario autenticado dejar de seguir a otro usuario.
@@ -170,3 +295,85 @@ class UnfollowUserView(generics.GenericAPIView):
                 {"error": "The relationship does not exist"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+
+class UserSearchView(generics.GenericAPIView):
+    """
+    Vista para buscar usuarios por username, nombre o apellido.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Buscar usuarios",
+        operation_description="Busca usuarios por username, nombre o apellido, ordenados por relevancia. Paginación por cursor (keyset). Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="Texto a buscar",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="Cursor de la siguiente página",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            200: UserCardSerializer(many=True),
+            400: openapi.Response(description="q es requerido"),
+        },
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()[:100]
+        if not query:
+            return Response(
+                {"error": "q parameter is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        paginator = KeysetPagination(ordering=("-rank", "id"))
+        page = paginator.paginate_queryset(
+            search_users(query).only(*UserCardSerializer.Meta.fields), request
+        )
+        return paginator.get_paginated_response(UserCardSerializer(page, many=True).data)
+
+
+class UserAutocompleteView(generics.GenericAPIView):
+    """
+    Vista para autocompletar usernames populares desde un índice en memoria.
+    """
+
+    @swagger_auto_schema(
+        operation_summary="Autocompletar usernames",
+        operation_description="Sugiere los usernames con más seguidores que empiezan por el prefijo indicado. Requiere un token JWT válido.",
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="Prefijo del username",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description="Número máximo de sugerencias (máx. 20)",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={200: UserCardSerializer(many=True)},
+        security=[{"Bearer": []}],
+    )
+    def get(self, request, *args, **kwargs):
+        prefix = request.query_params.get("q", "").strip()
+        if not prefix:
+            return Response([], status=status.HTTP_200_OK)
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 20)
+        except ValueError:
+            limit = 10
+        return Response(
+            popular_usernames.search(prefix, max(limit, 1)), status=status.HTTP_200_OK
+        )
@@ -0,0 +1,562 @@
+"""
+Project cache layer on top of Django's cache framework.
+
+Values live in namespaces (``CacheNamespace``). Keys are built as
+``<namespace>:<namespace version>:<group version>:<key>``, so a whole
+namespace, or one group inside it (the posts of a user, the comments of a
+post...), is invalidated by replacing its version token: stale entries are
+never read again and expire on their own. Version tokens are random rather
+than counters, so an evicted version key can never bring old entries back.
+
+``get_or_set`` protects expensive values against stampedes in two ways:
+
+* probabilistic early expiry ("XFetch"): each entry remembers how long it
+  took to compute, and a reader may recompute it shortly before it expires,
+  with a probability that grows as expiry approaches;
+* single-flight: only the reader that takes the ``add()`` lock recomputes;
+  the others keep serving the stale value, or wait briefly for the fresh one
+  when there is none.
+
+The ``default`` cache is Redis when ``REDIS_URL`` is set. If a call fails the
+layer switches to the per-process ``local`` cache for ``REDIS_RETRY_INTERVAL``
+seconds (shared with ``core.redis_client``) instead of failing the request.
+Writes made meanwhile (invalidations, deletions, ``set``/``set_many``, which
+validator bumps use) never reach Redis, so every namespace written during
+the outage gets a new namespace version in Redis as soon as it is back.
+
+Version tokens expire after ``CACHE_VERSION_TIMEOUT`` seconds, which must be
+longer than any namespace timeout: a version that expires while its entries
+are alive only turns them into misses.
+
+Namespaces created with ``near_timeout`` add a near-cache tier: a bounded
+LRU in each process, in front of the shared cache, that also holds the
+version tokens. A near hit costs no network round trip. ``invalidate()``
+publishes the namespace and groups on ``CACHE_INVALIDATION_CHANNEL`` and a
+listener thread in every process drops its local tokens for them; the short
+``near_timeout`` bounds staleness if a message is lost, and the whole tier is
+cleared whenever the listener reconnects.
+
+Hits (per tier) and misses are counted per namespace in each process and
+added to shared counters every ``CACHE_STATS_INTERVAL`` seconds;
+``cache_stats`` reads them back (``manage.py cache_stats``). Near-tier
+evictions are counted too: many evictions with a low near hit ratio mean the
+LRU is too small for the working set.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django_redis.exceptions import ConnectionInterrupted
+
+from .redis_client import get_redis, mark_unavailable, redis_available
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ERRORS = (redis.RedisError, ConnectionInterrupted)
+STATS_PREFIX = "cache-stats"
+STATS_COUNTERS = ("near_hits", "hits", "misses", "stale", "early", "near_evictions")
+
+_namespaces = {}
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+_listener_pid = None
+_listener_lock = threading.Lock()
+_stale_namespaces = set()
+_stale_lock = threading.Lock()
+
+
+def _uses_redis():
+    return settings.CACHES["default"]["BACKEND"].startswith("django_redis")
+
+
+def _backend():
+    if _uses_redis():
+        if not redis_available():
+            return caches["local"]
+        if _stale_namespaces:
+            _flush_stale_namespaces()
+    return caches["default"]
+
+
+def _call(method, *args, **kwargs):
+    backend = _backend()
+    try:
+        return getattr(backend, method)(*args, **kwargs)
+    except BACKEND_ERRORS as exc:
+        mark_unavailable(exc)
+        return getattr(caches["local"], method)(*args, **kwargs)
+
+
+def _write(namespace, method, *args, **kwargs):
+    """
+    ``_call`` for a write to ``namespace``. If it only reached the local
+    cache, the namespace is flushed in Redis when Redis comes back.
+    """
+    result = _call(method, *args, **kwargs)
+    if _uses_redis() and not redis_available():
+        with _stale_lock:
+            _stale_namespaces.add(namespace)
+    return result
+
+
+def _flush_stale_namespaces():
+    """
+    Give the namespaces written during an outage new versions in Redis, and
+    tell every process to drop its near-cached ones.
+    """
+    with _stale_lock:
+        names = set(_stale_namespaces)
+        _stale_namespaces.clear()
+    namespaces = [_namespaces[name] for name in names]
+    try:
+        caches["default"].set_many(
+            {namespace._version_key(): _new_version() for namespace in namespaces},
+            timeout=settings.CACHE_VERSION_TIMEOUT,
+        )
+    except BACKEND_ERRORS as exc:
+        mark_unavailable(exc)
+        with _stale_lock:
+            _stale_namespaces.update(names)
+        return
+    for namespace in namespaces:
+        if namespace.near is not None:
+            namespace.forget_versions(())
+            _publish(namespace.name, ())
+
+
+def _record(namespace, counter, amount=1):
+    global _stats_flushed_at
+    with _stats_lock:
+        _stats[(namespace, counter)] += amount
+        if time.monotonic() - _stats_flushed_at < settings.CACHE_STATS_INTERVAL:
+            return
+        _stats_flushed_at = time.monotonic()
+        pending = dict(_stats)
+        _stats.clear()
+    flush_stats(pending)
+
+
+def flush_stats(pending=None):
+    """
+    Add this process's counters to the shared ones.
+    """
+    if pending is None:
+        with _stats_lock:
+            pending = dict(_stats)
+            _stats.clear()
+    for (namespace, counter), amount in pending.items():
+        key = f"{STATS_PREFIX}:{namespace}:{counter}"
+        _call("add", key, 0, timeout=None)
+        try:
+            _call("incr", key, amount)
+        except ValueError:
+            # Evicted between add() and incr().
+            _call("set", key, amount, timeout=None)
+
+
+def cache_stats():
+    """
+    Shared counters and hit ratios of every registered namespace.
+    """
+    flush_stats()
+    keys = [
+        f"{STATS_PREFIX}:{name}:{counter}"
+        for name in sorted(_namespaces)
+        for counter in STATS_COUNTERS
+    ]
+    values = _call("get_many", keys)
+    stats = {}
+    for name in sorted(_namespaces):
+        row = {
+            counter: values.get(f"{STATS_PREFIX}:{name}:{counter}", 0)
+            for counter in STATS_COUNTERS
+        }
+        lookups = row["near_hits"] + row["hits"] + row["misses"]
+        row["hit_ratio"] = (
+            round((row["near_hits"] + row["hits"]) / lookups, 4) if lookups else None
+        )
+        row["near_hit_ratio"] = round(row["near_hits"] / lookups, 4) if lookups else None
+        stats[name] = row
+    return stats
+
+
+class NearCache:
+    """
+    Bounded LRU with a per-entry TTL, local to the process.
+    """
+
+    def __init__(self, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            _record(self.namespace, "near_evictions", evicted)
+
+    def discard(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def clear_near_caches():
+    for namespace in _namespaces.values():
+        if namespace.near is not None:
+            namespace.near.clear()
+
+
+def apply_invalidation(message):
+    namespace = _namespaces.get(message.get("namespace"))
+    if namespace is not None and namespace.near is not None:
+        namespace.forget_versions(message.get("groups") or ())
+
+
+def _ensure_listener():
+    """
+    Start the invalidation listener of this process (once per PID, so it is
+    started again in forked workers).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid() or not settings.REDIS_URL:
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name="cache-invalidation", daemon=True).start()
+
+
+def _listen():
+    while True:
+        try:
+            # Dedicated connection without socket_timeout: listen() blocks.
+            client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                health_check_interval=30,
+            )
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            # Messages published while not subscribed are lost.
+            clear_near_caches()
+            for message in pubsub.listen():
+                try:
+                    apply_invalidation(json.loads(message["data"]))
+                except (ValueError, AttributeError):
+                    logger.warning("Ignoring cache invalidation message %r", message)
+        except redis.RedisError as exc:
+            logger.warning("Cache invalidation listener disconnected: %s", exc)
+            clear_near_caches()
+            time.sleep(settings.REDIS_RETRY_INTERVAL)
+
+
+def _publish(namespace, groups):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(
+            settings.CACHE_INVALIDATION_CHANNEL,
+            json.dumps({"namespace": namespace, "groups": list(groups)}),
+        )
+    except redis.RedisError as exc:
+        mark_unavailable(exc)
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _key_part(key):
+    if isinstance(key, (tuple, list)):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class CacheNamespace:
+    """
+    Group of cache entries sharing a key prefix, a default timeout and a
+    version that invalidates all of them at once. With ``near_timeout``,
+    entries and versions are also kept in a per-process LRU of
+    ``near_max_entries`` for that many seconds.
+    """
+
+    def __init__(
+        self, name, timeout=300, beta=1.0, near_timeout=None, near_max_entries=None
+    ):
+        if timeout >= settings.CACHE_VERSION_TIMEOUT:
+            raise ValueError(
+                f"Cache namespace {name!r} outlives its version (CACHE_VERSION_TIMEOUT)."
+            )
+        self.name = name
+        self.timeout = timeout
+        self.beta = beta
+        self.near_timeout = near_timeout
+        self.near = None
+        if near_timeout:
+            self.near = NearCache(
+                name, near_max_entries or settings.CACHE_NEAR_MAX_ENTRIES
+            )
+        _namespaces[name] = self
+
+    # Versions ---------------------------------------------------------
+
+    def _version_key(self, group=None):
+        if group is None:
+            return f"{self.name}:version"
+        return f"{self.name}:version:{group}"
+
+    def _versions(self, groups):
+        """
+        Version tokens of the namespace and of ``groups``, creating the
+        missing ones, in a single round trip when they all exist (none if
+        they are in the near cache).
+        """
+        keys = {group: self._version_key(group) for group in {None, *groups}}
+        versions = {}
+        if self.near is not None:
+            _ensure_listener()
+            for group, key in keys.items():
+                version = self.near.get(key)
+                if version is not None:
+                    versions[group] = version
+        missing = [key for group, key in keys.items() if group not in versions]
+        found = _call("get_many", missing) if missing else {}
+        for group, key in keys.items():
+            if group in versions:
+                continue
+            version = found.get(key)
+            if version is None:
+                version = _new_version()
+                if not _call("add", key, version, timeout=settings.CACHE_VERSION_TIMEOUT):
+                    version = _call("get", key) or version
+            versions[group] = version
+            if self.near is not None:
+                self.near.set(key, version, self.near_timeout)
+        return versions
+
+    def invalidate(self, *groups):
+        """
+        Invalidate ``groups``, or the whole namespace when none are given.
+        """
+        keys = [self._version_key(group) for group in groups] or [self._version_key()]
+        _write(
+            self.name,
+            "set_many",
+            {key: _new_version() for key in keys},
+            timeout=settings.CACHE_VERSION_TIMEOUT,
+        )
+        if self.near is not None:
+            self.forget_versions(groups)
+            _publish(self.name, groups)
+
+    def forget_versions(self, groups):
+        """
+        Drop the near-cached version tokens of ``groups`` (or of the
+        namespace) so the next read fetches the current ones.
+        """
+        keys = [self._version_key(group) for group in groups] or [self._version_key()]
+        self.near.discard(*keys)
+
+    def version(self, group=None):
+        """
+        Current version token of ``group`` (or of the namespace), useful as a
+        validator for everything cached under it.
+        """
+        versions = self._versions([] if group is None else [group])
+        if group is None:
+            return versions[None]
+        return f"{versions[None]}.{versions[group]}"
+
+    def _full_key(self, key, group, versions):
+        group_version = "-" if group is None else versions[group]
+        return f"{self.name}:{versions[None]}:{group_version}:{_key_part(key)}"
+
+    # Tiers --------------------------------------------------------------
+
+    def _remember(self, full_key, entry):
+        if self.near is None:
+            return
+        ttl = min(self.near_timeout, entry[1] - time.time())
+        if ttl > 0:
+            self.near.set(full_key, entry, ttl)
+
+    def _lookup(self, full_keys):
+        """
+        Entries of ``full_keys``, from the near cache first and then from the
+        shared cache, counting hits per tier.
+        """
+        found = {}
+        if self.near is not None:
+            for full_key in full_keys:
+                entry = self.near.get(full_key)
+                if entry is not None:
+                    found[full_key] = entry
+        near_hits = len(found)
+        missing = [full_key for full_key in full_keys if full_key not in found]
+        if len(missing) == 1:
+            entry = _call("get", missing[0])
+            remote = {} if entry is None else {missing[0]: entry}
+        elif missing:
+            remote = _call("get_many", missing)
+        else:
+            remote = {}
+        for full_key, entry in remote.items():
+            self._remember(full_key, entry)
+        found.update(remote)
+        for counter, amount in (
+            ("near_hits", near_hits),
+            ("hits", len(remote)),
+            ("misses", len(missing) - len(remote)),
+        ):
+            if amount:
+                _record(self.name, counter, amount)
+        return found
+
+    # Plain access -------------------------------------------------------
+
+    def _envelope(self, value, timeout, delta=0.0):
+        return (value, time.time() + timeout, delta)
+
+    def get(self, key, group=None, default=None):
+        versions = self._versions([] if group is None else [group])
+        full_key = self._full_key(key, group, versions)
+        entry = self._lookup([full_key]).get(full_key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, group=None, timeout=None):
+        self.set_many({key: value}, group=group, timeout=timeout)
+
+    def delete(self, key, group=None):
+        self.delete_many([key], group=group)
+
+    def delete_many(self, keys, group=None):
+        if not keys:
+            return
+        versions = self._versions([] if group is None else [group])
+        full_keys = [self._full_key(key, group, versions) for key in keys]
+        _write(self.name, "delete_many", full_keys)
+        if self.near is not None:
+            self.near.discard(*full_keys)
+
+    def get_many(self, keys, group=None):
+        """
+        Return ``{key: value}`` for the ``keys`` found, in one round trip.
+        """
+        versions = self._versions([] if group is None else [group])
+        full_keys = {self._full_key(key, group, versions): key for key in keys}
+        found = self._lookup(list(full_keys))
+        return {full_keys[full]: entry[0] for full, entry in found.items()}
+
+    def set_many(self, mapping, group=None, timeout=None):
+        if not mapping:
+            return
+        timeout = self.timeout if timeout is None else timeout
+        versions = self._versions([] if group is None else [group])
+        entries = {
+            self._full_key(key, group, versions): self._envelope(value, timeout)
+            for key, value in mapping.items()
+        }
+        _write(self.name, "set_many", entries, timeout=timeout)
+        for full_key, entry in entries.items():
+            self._remember(full_key, entry)
+
+    # Stampede-protected access ----------------------------------------
+
+    def _expires_early(self, expires_at, delta):
+        # XFetch: -log(U) is exponentially distributed, so recomputations
+        # spread out over the last few "deltas" before expiry.
+        jitter = -delta * self.beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= expires_at
+
+    def get_or_set(self, key, compute, group=None, timeout=None):
+        """
+        Return the cached value of ``key``, computing it with ``compute()``
+        at most once at a time across all workers. ``timeout`` may be a
+        callable that receives the computed value.
+        """
+        versions = self._versions([] if group is None else [group])
+        full_key = self._full_key(key, group, versions)
+        entry = self._lookup([full_key]).get(full_key)
+        if entry is not None and not self._expires_early(entry[1], entry[2]):
+            return entry[0]
+
+        lock_key = f"{full_key}:lock"
+        if not _call("add", lock_key, 1, timeout=settings.CACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                # Someone else is refreshing it; the old value is still valid.
+                _record(self.name, "stale")
+                return entry[0]
+            entry = self._wait_for(full_key)
+            if entry is not None:
+                self._remember(full_key, entry)
+                return entry[0]
+            lock_key = None
+        elif entry is not None:
+            _record(self.name, "early")
+
+        try:
+            started = time.monotonic()
+            value = compute()
+            delta = time.monotonic() - started
+            if timeout is None:
+                timeout = self.timeout
+            elif callable(timeout):
+                timeout = timeout(value)
+            entry = self._envelope(value, timeout, delta)
+            _call("set", full_key, entry, timeout=timeout)
+            self._remember(full_key, entry)
+        finally:
+            if lock_key is not None:
+                _call("delete", lock_key)
+        return value
+
+    def _wait_for(self, full_key):
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+        pause = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(pause)
+            entry = _call("get", full_key)
+            if entry is not None:
+                return entry
+            pause = min(pause * 2, 0.2)
+        return None
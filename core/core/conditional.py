@@ -0,0 +1,102 @@
+"""
+Conditional GETs (``ETag`` / ``Last-Modified``) for cached API responses.
+
+Each response is described by a few validator keys (``feed:<user id>``,
+``comments:<post id>``...). A validator is a random token plus the time it
+was last bumped, kept in the shared cache. Writes call ``bump()`` for every
+key whose response they change, after committing and after invalidating the
+cached data. A GET reads its validators in one round trip, before reading any
+data, and answers 304 without querying or serializing anything when the
+client already has them.
+
+A validator that is missing (evicted, or never bumped) is created on read
+with a new token and the current time, so losing one can only cause an extra
+200, never a stale 304. ``Last-Modified`` has one-second resolution, so it is
+left out while the newest validator is from the current second.
+"""
+
+import hashlib
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache import CacheNamespace
+
+validators = CacheNamespace("validators", timeout=settings.HTTP_VALIDATOR_TIMEOUT)
+
+
+def _new_validator():
+    return (uuid.uuid4().hex[:12], int(time.time()))
+
+
+def bump(*keys):
+    """
+    Give ``keys`` new tokens, modified now.
+    """
+    validators.set_many({key: _new_validator() for key in keys})
+
+
+def current_validators(request, keys):
+    """
+    ``(etag, last_modified)`` of the response to ``request`` described by
+    ``keys``. The query string is part of the ETag, so every page of a
+    listing has its own.
+    """
+    found = validators.get_many(keys)
+    missing = {key: _new_validator() for key in keys if key not in found}
+    if missing:
+        validators.set_many(missing)
+        found.update(missing)
+    digest = hashlib.sha256(request.GET.urlencode().encode())
+    for key in keys:
+        digest.update(f"|{key}={found[key][0]}".encode())
+    etag = f'W/"{digest.hexdigest()[:20]}"'
+    return etag, max(modified for _, modified in found.values())
+
+
+def _not_modified(request, etag, last_modified):
+    if last_modified >= int(time.time()):
+        # A second bump within this second would keep the same date.
+        last_modified = None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    return response, last_modified
+
+
+def conditional_response(request, keys, render):
+    """
+    304 if the client's ``If-None-Match`` / ``If-Modified-Since`` still match
+    the validators of ``keys``; otherwise the response of ``render()``. Both
+    carry the validators and ask clients to revalidate every time.
+    """
+    etag, last_modified = current_validators(request, keys)
+    response, last_modified = _not_modified(request, etag, last_modified)
+    if response is None:
+        response = render()
+    return _with_validators(response, etag, last_modified)
+
+
+async def aconditional_response(request, keys, render):
+    """
+    ``conditional_response`` for async views: the validators are read in a
+    thread and ``render`` is a coroutine function.
+    """
+    etag, last_modified = await sync_to_async(current_validators)(request, keys)
+    response, last_modified = _not_modified(request, etag, last_modified)
+    if response is None:
+        response = await render()
+    return _with_validators(response, etag, last_modified)
+
+
+def _with_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
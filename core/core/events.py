@@ -0,0 +1,307 @@
+"""
+Publish/subscribe for server-sent event streams.
+
+Each open stream holds a ``Subscription``: a set of channel names
+(``posts:<author id>``, ``comments:<post id>``...) and a bounded
+``asyncio.Queue`` read by the stream on the event loop. ``publish()`` may be
+called from any thread, usually from an ``on_commit`` callback.
+
+Without Redis, ``publish()`` hands the event straight to this process's
+subscribers. With ``REDIS_URL`` it publishes it on ``EVENTS_CHANNEL``
+instead, and a listener thread in every process with open streams delivers
+it to its own subscribers, so a post written by one worker reaches streams
+held by the others. Messages published while a listener is disconnected
+are lost; after reconnecting it sends every stream a ``resync`` event.
+
+A subscriber whose queue is full is not waited for: it is dropped, its
+queue is replaced by a single ``overflow`` event and the stream ends. The
+client reconnects and catches up through the sync endpoint, so one slow
+client never holds events or memory for the others.
+
+Open connections, and how many were opened, closed and dropped and how many
+events were delivered, are counted per process. The listener reports them
+to Redis every ``EVENTS_STATS_INTERVAL`` seconds; ``event_stats()`` adds up
+the processes that reported recently (``manage.py event_stats``).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+import redis
+from django.conf import settings
+
+from .redis_client import get_redis, mark_unavailable
+
+logger = logging.getLogger(__name__)
+
+STATS_COUNTERS = ("opened", "closed", "dropped", "delivered")
+
+_channels = defaultdict(set)
+_subscriptions = set()
+_lock = threading.Lock()
+_stats = Counter()
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _count(counter, amount=1):
+    with _lock:
+        _stats[counter] += amount
+
+
+class Subscription:
+    """
+    The channels and queue of one stream. Created and read on the event
+    loop; events may be delivered from any thread.
+    """
+
+    def __init__(self, channels=()):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.channels = set()
+        self.dropped = False
+        with _lock:
+            _subscriptions.add(self)
+            _stats["opened"] += 1
+        self.add(*channels)
+        _ensure_listener()
+
+    def add(self, *channels):
+        with _lock:
+            for channel in channels:
+                _channels[channel].add(self)
+                self.channels.add(channel)
+
+    def discard(self, *channels):
+        with _lock:
+            for channel in channels:
+                subscribers = _channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(self)
+                    if not subscribers:
+                        del _channels[channel]
+                self.channels.discard(channel)
+
+    def close(self):
+        with _lock:
+            if self not in _subscriptions:
+                return
+            _subscriptions.discard(self)
+            _stats["closed"] += 1
+            channels = list(self.channels)
+        self.discard(*channels)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop of a stream that is already gone.
+            self.close()
+
+    def _put(self, event):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._drop()
+        else:
+            _count("delivered")
+
+    def _drop(self):
+        self.dropped = True
+        logger.info("Dropping slow event stream subscriber %s", sorted(self.channels))
+        self.close()
+        _count("dropped")
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "overflow"})
+
+    async def get(self, timeout):
+        """
+        Next event, or None when there is none within ``timeout`` seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def connection_count():
+    with _lock:
+        return len(_subscriptions)
+
+
+def dispatch(channel, event):
+    """
+    Deliver ``event`` to the subscribers of ``channel`` in this process.
+    """
+    with _lock:
+        subscribers = list(_channels.get(channel, ()))
+    for subscription in subscribers:
+        subscription.deliver(event)
+
+
+def _broadcast(event):
+    with _lock:
+        subscribers = list(_subscriptions)
+    for subscription in subscribers:
+        subscription.deliver(event)
+
+
+def publish(channel, event):
+    """
+    Deliver ``event`` (a JSON-serialisable dict with a ``type``) to the
+    subscribers of ``channel`` in every process.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            client.publish(
+                settings.EVENTS_CHANNEL, json.dumps({"channel": channel, "event": event})
+            )
+            return
+        except redis.RedisError as exc:
+            mark_unavailable(exc)
+    dispatch(channel, event)
+
+
+def format_event(event):
+    """
+    ``event`` in the ``text/event-stream`` format.
+    """
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(channels, on_event=None):
+    """
+    Body of a ``text/event-stream`` response subscribed to ``channels``: its
+    events, comments as keep-alives while idle, and nothing more after an
+    ``overflow``. ``on_event(subscription, event)`` may change the channels
+    as events arrive. The subscription starts with the response and is
+    closed when the client goes away.
+    """
+    subscription = Subscription(channels)
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            event = await subscription.get(settings.EVENTS_KEEPALIVE)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            if on_event is not None:
+                on_event(subscription, event)
+            yield format_event(event)
+            if event["type"] == "overflow":
+                return
+    finally:
+        subscription.close()
+
+
+# Redis bridge and stats -------------------------------------------------------
+
+
+def _stats_field():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _local_stats():
+    with _lock:
+        row = {counter: _stats[counter] for counter in STATS_COUNTERS}
+        row["connections"] = len(_subscriptions)
+    return row
+
+
+def _report(client):
+    client.hset(
+        settings.EVENTS_STATS_KEY,
+        _stats_field(),
+        json.dumps({**_local_stats(), "at": time.time()}),
+    )
+
+
+def event_stats():
+    """
+    Counters of the processes that reported in the last few intervals, or
+    of this process alone without Redis.
+    """
+    cutoff = time.time() - 3 * settings.EVENTS_STATS_INTERVAL
+    reports = []
+    client = get_redis()
+    if client is not None:
+        try:
+            stale = []
+            for field, row in client.hgetall(settings.EVENTS_STATS_KEY).items():
+                report = json.loads(row)
+                if report["at"] >= cutoff:
+                    reports.append(report)
+                else:
+                    stale.append(field)
+            if stale:
+                # Processes that have exited.
+                client.hdel(settings.EVENTS_STATS_KEY, *stale)
+        except redis.RedisError as exc:
+            mark_unavailable(exc)
+    if not reports:
+        reports = [_local_stats()]
+    total = {
+        counter: sum(report[counter] for report in reports)
+        for counter in (*STATS_COUNTERS, "connections")
+    }
+    total["processes"] = len(reports)
+    return total
+
+
+def _ensure_listener():
+    """
+    Start the Redis listener of this process (once per PID, so it is started
+    again in forked workers).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid() or not settings.REDIS_URL:
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name="event-listener", daemon=True).start()
+
+
+def _listen():
+    reconnecting = False
+    while True:
+        try:
+            # Dedicated connection: get_message() waits on the socket.
+            client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                health_check_interval=30,
+            )
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.EVENTS_CHANNEL)
+            if reconnecting:
+                # Anything published while disconnected was missed.
+                _broadcast({"type": "resync"})
+                reconnecting = False
+            reported_at = 0.0
+            while True:
+                message = pubsub.get_message(timeout=settings.EVENTS_STATS_INTERVAL)
+                if message is not None:
+                    try:
+                        data = json.loads(message["data"])
+                        dispatch(data["channel"], data["event"])
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Ignoring event message %r", message)
+                if time.monotonic() - reported_at >= settings.EVENTS_STATS_INTERVAL:
+                    _report(client)
+                    reported_at = time.monotonic()
+        except redis.RedisError as exc:
+            logger.warning("Event listener disconnected: %s", exc)
+            reconnecting = True
+            time.sleep(settings.REDIS_RETRY_INTERVAL)
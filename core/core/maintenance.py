@@ -0,0 +1,65 @@
+"""
+Registry of periodic maintenance tasks run by ``manage.py run_maintenance``.
+
+Apps declare their tasks in a ``maintenance.py`` module, which is discovered
+automatically::
+
+    @maintenance_task(interval=300)
+    def purge_expired_things():
+        return delete_in_batches(Thing.objects.filter(expires_at__lt=timezone.now()))
+
+A task returns the number of rows (or files) it removed.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.utils.module_loading import autodiscover_modules
+
+_registry = {}
+
+
+@dataclass
+class MaintenanceTask:
+    name: str
+    func: Callable[[], int]
+    interval: int  # segundos entre ejecuciones
+
+
+def maintenance_task(interval, name=None):
+    def decorator(func):
+        task_name = name or f"{func.__module__.rsplit('.', 2)[-2]}.{func.__name__}"
+        _registry[task_name] = MaintenanceTask(task_name, func, interval)
+        return func
+
+    return decorator
+
+
+def get_tasks():
+    autodiscover_modules("maintenance")
+    return sorted(_registry.values(), key=lambda task: task.name)
+
+
+def delete_in_batches(queryset, batch_size=None, pause=None):
+    """
+    Deletes the rows matched by ``queryset`` in short transactions of at most
+    ``batch_size`` primary keys, each selected with ``LIMIT`` over the
+    queryset's (indexed) filter, so no delete holds locks for long. Returns
+    the number of rows of ``queryset.model`` removed.
+    """
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    pause = settings.MAINTENANCE_BATCH_PAUSE if pause is None else pause
+    model = queryset.model
+    pks = queryset.order_by().values_list("pk", flat=True)
+    total = 0
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return total
+        _, per_model = model._base_manager.filter(pk__in=batch).delete()
+        total += per_model.get(model._meta.label, 0)
+        if len(batch) < batch_size:
+            return total
+        time.sleep(pause)
@@ -0,0 +1,291 @@
+"""
+Weighted prefix index for autocomplete.
+
+Every prefix of up to ``depth`` characters keeps a table with its ``top_k``
+heaviest keys, so a short query is a dictionary lookup and a slice. Longer
+queries scan the bucket of keys sharing their first ``depth`` characters,
+which is small. Entries may belong to a ``group`` (the tag type, for
+instance) with its own tables, so filtered searches are exact too.
+
+Writes update only the tables on the key's path. Raising a weight, the usual
+case for usage counters, costs one comparison per prefix. Removing a key (or
+lowering its weight) refills each table it was in from the bucket at
+``depth`` and from the tables of the next level. The lightest key, evicted
+when a bounded index is full, comes from a min-heap with lazy deletion.
+Lookups never touch the database.
+
+``RefreshedPrefixIndex`` rebuilds an index from the database periodically in
+a background thread, so no request pays for the rebuild.
+"""
+
+import heapq
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    def __init__(self, entries=(), max_size=None, top_k=20, depth=4):
+        """
+        ``entries`` is an iterable of ``(key, weight, payload)`` or
+        ``(key, weight, payload, group)``. Keys are matched
+        case-insensitively. When ``max_size`` is set, inserting into a full
+        index evicts the lightest entry. Searches return at most ``top_k``
+        results.
+        """
+        self.max_size = max_size
+        self.top_k = top_k
+        self.depth = depth
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (weight, payload, group)
+        self._tables = {}  # (group, prefix) -> keys, heaviest first
+        self._children = {}  # (group, prefix) -> next characters in use
+        self._buckets = {}  # (group, key[:depth]) -> keys
+        self._heap = []  # (weight, key), stale when the weight changed
+
+        for key, weight, payload, *group in entries:
+            self._entries[key.lower()] = (weight, payload, group[0] if group else None)
+        # Heaviest first: each table takes the first top_k keys it sees.
+        for key in sorted(self._entries, key=self._rank):
+            for scope in self._scopes(self._entries[key][2]):
+                self._link(scope, key)
+                for prefix in self._prefixes(key):
+                    table = self._tables[(scope, prefix)]
+                    if len(table) < self.top_k:
+                        table.append(key)
+        self._heap = [(weight, key) for key, (weight, _, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _scopes(group):
+        return (None,) if group is None else (None, group)
+
+    def _prefixes(self, key):
+        return [key[:length] for length in range(1, min(len(key), self.depth) + 1)]
+
+    def _rank(self, key):
+        return -self._entries[key][0], key
+
+    def _link(self, scope, key):
+        self._buckets.setdefault((scope, key[: self.depth]), set()).add(key)
+        for prefix in self._prefixes(key):
+            if (scope, prefix) not in self._tables:
+                self._tables[(scope, prefix)] = []
+                self._children.setdefault((scope, prefix[:-1]), set()).add(prefix[-1])
+
+    def _unlink(self, scope, key):
+        bucket = self._buckets[(scope, key[: self.depth])]
+        bucket.discard(key)
+        if bucket:
+            return
+        del self._buckets[(scope, key[: self.depth])]
+        # Branches left without keys stop being children of their parent.
+        for length in range(min(len(key), self.depth) - 1, -1, -1):
+            prefix = key[: length + 1]
+            if (scope, prefix) in self._tables and self._tables[(scope, prefix)]:
+                break
+            self._tables.pop((scope, prefix), None)
+            children = self._children[(scope, key[:length])]
+            children.discard(key[length])
+            if children:
+                break
+            del self._children[(scope, key[:length])]
+
+    def search(self, prefix, limit=10, group=None):
+        """
+        Returns the payloads of the ``limit`` heaviest keys starting with
+        ``prefix`` (of ``group``, if given), heaviest first.
+        """
+        prefix = prefix.lower()
+        limit = min(limit, self.top_k)
+        with self._lock:
+            if len(prefix) <= self.depth:
+                keys = self._tables.get((group, prefix), ())[:limit]
+            else:
+                bucket = self._buckets.get((group, prefix[: self.depth]), ())
+                keys = heapq.nsmallest(
+                    limit,
+                    (key for key in bucket if key.startswith(prefix)),
+                    key=self._rank,
+                )
+            return [self._entries[key][1] for key in keys]
+
+    def get(self, key):
+        """
+        Returns ``(weight, payload)`` for ``key`` or ``None``.
+        """
+        entry = self._entries.get(key.lower())
+        return None if entry is None else entry[:2]
+
+    def upsert(self, key, weight, payload, group=None):
+        """
+        Inserts ``key`` or replaces its weight, payload and group.
+        """
+        with self._lock:
+            self._upsert(key.lower(), weight, payload, group)
+
+    def upsert_many(self, entries):
+        """
+        ``upsert`` for an iterable of ``(key, weight, payload[, group])``,
+        taking the lock once.
+        """
+        with self._lock:
+            for key, weight, payload, *group in entries:
+                self._upsert(key.lower(), weight, payload, group[0] if group else None)
+
+    def _upsert(self, key, weight, payload, group):
+        current = self._entries.get(key)
+        if current is None and self.max_size and len(self._entries) >= self.max_size:
+            if not self._evict(weight):
+                return
+        if current is not None and current[2] != group:
+            self._remove(key)
+            current = None
+        self._entries[key] = (weight, payload, group)
+        if current is None or current[0] != weight:
+            heapq.heappush(self._heap, (weight, key))
+            self._compact_heap()
+        for scope in self._scopes(group):
+            if current is None:
+                self._link(scope, key)
+            if current is not None and weight < current[0]:
+                self._refill(scope, key)
+            else:
+                self._promote(scope, key)
+
+    def _promote(self, scope, key):
+        """
+        Places ``key``, new or heavier than before, in its tables.
+        """
+        rank = self._rank(key)
+        for prefix in self._prefixes(key):
+            table = self._tables.get((scope, prefix), [])
+            if key not in table:
+                if len(table) >= self.top_k and self._rank(table[-1]) < rank:
+                    continue
+                table = table + [key]
+            self._tables[(scope, prefix)] = sorted(table, key=self._rank)[: self.top_k]
+
+    def _refill(self, scope, key):
+        """
+        Rebuilds, deepest first, the tables that held ``key`` before it was
+        removed or lost weight: each one from the bucket or from the tables
+        of the next level, which are already up to date.
+        """
+        for prefix in reversed(self._prefixes(key)):
+            table = self._tables.get((scope, prefix))
+            if table is None or key not in table:
+                continue
+            if len(prefix) == self.depth:
+                candidates = self._buckets.get((scope, prefix), ())
+            else:
+                candidates = {
+                    candidate
+                    for char in self._children.get((scope, prefix), ())
+                    for candidate in self._tables.get((scope, prefix + char), ())
+                }
+                # A key equal to the prefix is in none of the child tables.
+                entry = self._entries.get(prefix)
+                if entry is not None and scope in self._scopes(entry[2]):
+                    candidates.add(prefix)
+            self._tables[(scope, prefix)] = heapq.nsmallest(
+                self.top_k,
+                (candidate for candidate in candidates if candidate in self._entries),
+                key=self._rank,
+            )
+
+    def _remove(self, key):
+        _, _, group = self._entries.pop(key)
+        for scope in self._scopes(group):
+            self._refill(scope, key)
+            self._unlink(scope, key)
+
+    def _evict(self, weight):
+        """
+        Removes the lightest entry if it weighs less than ``weight``.
+        """
+        while self._heap:
+            lightest, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != lightest:
+                heapq.heappop(self._heap)
+                continue
+            if lightest >= weight:
+                return False
+            heapq.heappop(self._heap)
+            self._remove(key)
+            return True
+        return True
+
+    def _compact_heap(self):
+        # Every weight change leaves a stale entry behind.
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(weight, key) for key, (weight, _, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+
+class RefreshedPrefixIndex:
+    """
+    A ``PrefixIndex`` built from ``entries()`` and rebuilt in a background
+    thread once it is older than ``refresh_interval()`` seconds. Searches
+    keep using the previous index meanwhile; before the first build
+    finishes, ``index()`` returns ``None`` and callers fall back to the
+    database. Subclasses implement ``entries`` and ``refresh_interval`` and
+    may override ``make_index``.
+    """
+
+    thread_name = "prefix-index"
+
+    def __init__(self):
+        self._index = None
+        self._checked_at = None
+        self._rebuilding = threading.Lock()
+
+    def entries(self):
+        raise NotImplementedError
+
+    def refresh_interval(self):
+        raise NotImplementedError
+
+    def make_index(self, entries):
+        return PrefixIndex(entries)
+
+    def rebuild(self):
+        """
+        Builds a new index and swaps it in, in the calling thread.
+        """
+        self._checked_at = time.monotonic()
+        self._index = self.make_index(self.entries())
+
+    def index(self):
+        """
+        The current index (or ``None``), scheduling a rebuild if it is due.
+        """
+        checked_at = self._checked_at
+        if (
+            checked_at is None
+            or time.monotonic() - checked_at > self.refresh_interval()
+        ) and self._rebuilding.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background, name=self.thread_name, daemon=True
+            ).start()
+        return self._index
+
+    def _rebuild_in_background(self):
+        close_old_connections()
+        try:
+            self.rebuild()
+        except Exception:
+            # A failed build is retried after refresh_interval().
+            self._checked_at = time.monotonic()
+            logger.exception("Could not rebuild %s", type(self).__name__)
+        finally:
+            connections.close_all()
+            self._rebuilding.release()
@@ -0,0 +1,379 @@
+"""
+Opt-in ORM query cache on top of ``core.cache``.
+
+A model opts in by using a manager built on ``CachedQuerySet`` (for example
+``objects = CachedManager()``); its querysets then have a ``cache()`` method:
+
+* ``Model.objects.cache().get(pk=...)``, or ``get()`` by any other unique
+  field, is cached per row, in a group of the model's namespace that is
+  invalidated when that row is saved or deleted. Lookups by a unique field
+  other than the primary key store a pointer to the primary key; the row it
+  leads to is checked against the looked-up value, so pointers never need
+  invalidating.
+* Other querysets over the model's own table whose filters compare columns
+  with plain values (``cache().filter(...)``, ``values_list()``,
+  ``first()``...) are cached per table: any write to the table invalidates
+  them. Anything else (joins, subqueries, ``select_related``, annotations...)
+  runs against the database as usual.
+
+Writes are picked up through ``post_save``, ``post_delete`` and, for through
+models, ``m2m_changed``. Queryset writes that send no per-row signal are
+covered too: ``update()`` invalidates the rows its filters restrict it to by
+primary key (or the whole model), ``bulk_create()`` the table queries and
+``bulk_update()`` the whole model. Invalidations are applied when the
+transaction commits. Inside a transaction, tables it has written are read
+from the database, and results are only stored once the transaction commits
+and if the row or table version has not changed since the query ran.
+
+Entries are stored pickled, so every read returns fresh instances that the
+caller may modify freely.
+"""
+
+import hashlib
+import pickle
+import threading
+
+from django.conf import settings
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.query import (
+    FlatValuesListIterable,
+    ModelIterable,
+    ValuesIterable,
+    ValuesListIterable,
+)
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.models.sql.where import WhereNode
+
+from .cache import CacheNamespace
+
+CACHEABLE_ITERABLES = (
+    ModelIterable,
+    ValuesIterable,
+    ValuesListIterable,
+    FlatValuesListIterable,
+)
+TABLE = "table"
+
+_namespaces = {}
+_local = threading.local()
+
+
+def cache_model(model):
+    """
+    Register ``model`` for query caching. Called by the managers below when
+    they are attached to a model, so writes are tracked in every process even
+    before it reads from the cache.
+    """
+    if model in _namespaces or model._meta.abstract:
+        return
+    _namespaces[model] = CacheNamespace(
+        f"orm:{model._meta.label_lower}",
+        timeout=settings.ORM_CACHE_TIMEOUT,
+        near_timeout=settings.ORM_CACHE_NEAR_TIMEOUT,
+    )
+    post_save.connect(_row_changed, sender=model, weak=False)
+    post_delete.connect(_row_changed, sender=model, weak=False)
+
+
+def _state(using):
+    if not hasattr(_local, "aliases"):
+        _local.aliases = {}
+    return _local.aliases.setdefault(using, {"dirty": set(), "pending": {}})
+
+
+def _written(model, using):
+    """
+    Whether the current transaction has written ``model``'s table.
+    """
+    state = _state(using)
+    if not connections[using].in_atomic_block:
+        # Left over from a rolled back transaction.
+        state["dirty"].clear()
+    return model in state["dirty"]
+
+
+def invalidate_model(model, pks=None, using=DEFAULT_DB_ALIAS):
+    """
+    Invalidate the cached rows ``pks`` of ``model`` and its table queries,
+    or everything cached for it when ``pks`` is None, once the transaction
+    commits.
+    """
+    if model not in _namespaces:
+        return
+    state = _state(using)
+    if connections[using].in_atomic_block:
+        state["dirty"].add(model)
+    pending = state["pending"]
+    if pks is None:
+        pending[model] = None
+    elif model not in pending:
+        pending[model] = set(pks)
+    elif pending[model] is not None:
+        pending[model].update(pks)
+    # Every callback flushes everything pending; the later ones do nothing.
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def _flush(using):
+    state = _state(using)
+    pending = dict(state["pending"])
+    state["pending"].clear()
+    state["dirty"].clear()
+    for model, pks in pending.items():
+        if pks is None:
+            _namespaces[model].invalidate()
+        else:
+            _namespaces[model].invalidate(TABLE, *pks)
+
+
+def _row_changed(sender, instance, using, **kwargs):
+    invalidate_model(sender, [instance.pk], using=using)
+
+
+def _through_changed(sender, action, using, **kwargs):
+    # add() inserts the through rows with bulk_create, without post_save.
+    if action.startswith("post_"):
+        invalidate_model(sender, using=using)
+
+
+m2m_changed.connect(_through_changed, weak=False)
+
+
+def _plain_value(value):
+    values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    return not any(hasattr(item, "resolve_expression") for item in values)
+
+
+def _plain_where(node):
+    for child in node.children:
+        if isinstance(child, WhereNode):
+            if not _plain_where(child):
+                return False
+        elif not (
+            isinstance(child, Lookup)
+            and isinstance(child.lhs, Col)
+            and _plain_value(child.rhs)
+        ):
+            return False
+    return True
+
+
+class CachedQuerySet(models.QuerySet):
+    """
+    ``QuerySet`` with an opt-in ``cache()``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_enabled = False
+        self._cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_enabled = self._cache_enabled
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def cache(self, timeout=None):
+        """
+        Serve this queryset from the cache when it is simple enough.
+        """
+        clone = self._chain()
+        clone._cache_enabled = self.model in _namespaces
+        clone._cache_timeout = timeout
+        return clone
+
+    # Eligibility ------------------------------------------------------
+
+    def _plain(self):
+        query = self.query
+        return (
+            self._iterable_class in CACHEABLE_ITERABLES
+            and not self._prefetch_related_lookups
+            and query.select_related is False
+            and not query.annotations
+            and not query.extra
+            and not query.select_for_update
+            and not query.combinator
+            and not query.distinct_fields
+            and query.deferred_loading == (frozenset(), True)
+            and all(isinstance(field, str) for field in query.order_by)
+        )
+
+    def _single_table(self):
+        tables = {join.table_name for join in self.query.alias_map.values()}
+        return tables <= {self.model._meta.db_table} and len(self.query.alias_map) <= 1
+
+    def _unique_field(self, kwargs):
+        """
+        ``(field, value)`` when ``kwargs`` is a single exact lookup on the
+        primary key or on a unique column.
+        """
+        if len(kwargs) != 1:
+            return None
+        ((name, value),) = kwargs.items()
+        name = name.removesuffix("__exact")
+        opts = self.model._meta
+        try:
+            field = opts.pk if name == "pk" else opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation or not (field.primary_key or field.unique):
+            return None
+        if value is None or not _plain_value(value):
+            return None
+        try:
+            return field, field.to_python(value)
+        except ValidationError:
+            return None
+
+    # Row cache ----------------------------------------------------------
+
+    def get(self, *args, **kwargs):
+        if (
+            self._cache_enabled
+            and not args
+            and not self.query.where
+            and self._iterable_class is ModelIterable
+            and self._plain()
+            and self.query.low_mark == 0
+            and self.query.high_mark is None
+        ):
+            lookup = self._unique_field(kwargs)
+            if lookup is not None:
+                return self._cached_get(*lookup)
+        return super().get(*args, **kwargs)
+
+    def _cached_get(self, field, value):
+        namespace = _namespaces[self.model]
+        pk = value if field.primary_key else None
+        if not _written(self.model, self.db):
+            if pk is None:
+                pk = namespace.get(("key", field.attname, value))
+            if pk is not None:
+                data = namespace.get("row", group=pk)
+                if data is not None:
+                    instance = pickle.loads(data)
+                    if getattr(instance, field.attname) == value:
+                        return instance
+        token = namespace.version(pk) if field.primary_key else None
+        uncached = self._chain()
+        uncached._cache_enabled = False
+        instance = uncached.get(**{field.name: value})
+        if token is None:
+            token = namespace.version(instance.pk)
+        data = pickle.dumps(instance)
+        timeout = self._cache_timeout
+
+        def store():
+            if namespace.version(instance.pk) != token:
+                return
+            namespace.set("row", data, group=instance.pk, timeout=timeout)
+            if not field.primary_key:
+                namespace.set(("key", field.attname, value), instance.pk, timeout=timeout)
+
+        transaction.on_commit(store, using=self.db)
+        return instance
+
+    # Table cache --------------------------------------------------------
+
+    def _cacheable(self):
+        return (
+            self._cache_enabled
+            and self._plain()
+            and self._single_table()
+            and _plain_where(self.query.where)
+        )
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cacheable():
+            try:
+                sql, params = self.query.get_compiler(using=self.db).as_sql()
+            except EmptyResultSet:
+                pass
+            else:
+                self._result_cache = self._cached_results(sql, params)
+        super()._fetch_all()
+
+    def _cached_results(self, sql, params):
+        namespace = _namespaces[self.model]
+        digest = hashlib.sha256(
+            repr((self._iterable_class.__name__, sql, params)).encode()
+        ).hexdigest()
+        key = ("query", digest)
+        if not _written(self.model, self.db):
+            data = namespace.get(key, group=TABLE)
+            if data is not None:
+                return pickle.loads(data)
+        token = namespace.version(TABLE)
+        results = list(self._iterable_class(self))
+        data = pickle.dumps(results)
+        timeout = self._cache_timeout
+
+        def store():
+            if namespace.version(TABLE) == token:
+                namespace.set(key, data, group=TABLE, timeout=timeout)
+
+        transaction.on_commit(store, using=self.db)
+        return results
+
+    # Writes that send no per-row signal ---------------------------------
+
+    def _filtered_pks(self):
+        """
+        Primary keys the filters restrict the queryset to, or None when they
+        do not.
+        """
+        where = self.query.where
+        if where.connector != "AND" or where.negated:
+            return None
+        for child in where.children:
+            if (
+                isinstance(child, Lookup)
+                and isinstance(child.lhs, Col)
+                and child.lhs.target.primary_key
+                and child.lookup_name in ("exact", "in")
+                and _plain_value(child.rhs)
+            ):
+                return [child.rhs] if child.lookup_name == "exact" else list(child.rhs)
+        return None
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        invalidate_model(self.model, self._filtered_pks(), using=self.db)
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        invalidate_model(self.model, [], using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        invalidate_model(self.model, using=self.db)
+        return rows
+
+    bulk_update.alters_data = True
+
+
+class CachedManagerMixin:
+    """
+    Registers the model for query caching when the manager is attached.
+    """
+
+    def contribute_to_class(self, cls, name):
+        super().contribute_to_class(cls, name)
+        cache_model(cls)
+
+
+class CachedManager(CachedManagerMixin, models.Manager.from_queryset(CachedQuerySet)):
+    pass
@@ -0,0 +1,62 @@
+"""
+Shared Redis connection for the project.
+
+The client is created lazily from ``settings.REDIS_URL``. When Redis is not
+configured, or a call against it fails, ``get_redis`` returns ``None`` for a
+short cool-down period so callers can fall back to local behaviour without
+paying a connection timeout on every request.
+"""
+
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_unavailable_until = 0.0
+
+
+def get_redis():
+    """
+    Return the shared Redis client, or ``None`` if Redis should not be used.
+    """
+    global _client
+    url = getattr(settings, "REDIS_URL", None)
+    if not url or time.monotonic() < _unavailable_until:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    url,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    health_check_interval=30,
+                )
+    return _client
+
+
+def redis_available():
+    """
+    Whether Redis is configured and not in its cool-down period.
+    """
+    url = getattr(settings, "REDIS_URL", None)
+    return bool(url) and time.monotonic() >= _unavailable_until
+
+
+def mark_unavailable(exc=None):
+    """
+    Stop handing out the client for ``REDIS_RETRY_INTERVAL`` seconds.
+    """
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + settings.REDIS_RETRY_INTERVAL
+    logger.warning(
+        "Redis unavailable, using local fallback for %ss: %s",
+        settings.REDIS_RETRY_INTERVAL,
+        exc,
+    )
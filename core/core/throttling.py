@@ -0,0 +1,129 @@
+"""
+Throttle classes backed by a Redis sliding-window log.
+
+Every check is a single ``EVALSHA`` round trip: the Lua script drops the
+timestamps that fell out of the window, counts the remaining ones and records
+the current request atomically, so the limit is shared by every worker and
+survives restarts. When Redis is not configured or cannot be reached the
+classes fall back to DRF's cache-based implementation.
+"""
+
+import uuid
+
+import redis
+from django.core.cache import caches
+from rest_framework import throttling
+
+from .redis_client import get_redis, mark_unavailable
+
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, math.ceil(window * 1000))
+    return {1, '0'}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, tostring(tonumber(oldest[2]) + window - now)}
+"""
+
+_scripts = {}
+
+
+def _sliding_window_script(client):
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(SLIDING_WINDOW_SCRIPT)
+    return script
+
+
+class RedisSlidingWindowMixin:
+    """
+    Replaces the cache-based history of ``SimpleRateThrottle`` with a Redis
+    sorted set. Must be mixed in before a ``SimpleRateThrottle`` subclass.
+    """
+
+    cache_format = "throttle:%(scope)s:%(ident)s"
+    # The fallback must not depend on Redis, which may be the default cache.
+    cache = caches["local"]
+    redis_wait = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        client = get_redis()
+        if client is None:
+            return super().allow_request(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        try:
+            allowed, wait = _sliding_window_script(client)(
+                keys=[self.key],
+                args=[self.now, self.duration, self.num_requests, uuid.uuid4().hex],
+            )
+        except redis.RedisError as exc:
+            mark_unavailable(exc)
+            return super().allow_request(request, view)
+
+        self.redis_wait = max(float(wait), 0.0)
+        return bool(allowed)
+
+    def wait(self):
+        if self.redis_wait is not None:
+            return self.redis_wait
+        return super().wait()
+
+
+class RedisAnonRateThrottle(RedisSlidingWindowMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class RedisUserRateThrottle(RedisSlidingWindowMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ClientIPRateThrottle(RedisSlidingWindowMixin, throttling.SimpleRateThrottle):
+    """
+    Limits an endpoint per client IP, whether or not the request is
+    authenticated. Subclasses only need to set ``scope``.
+    """
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class LoginRateThrottle(ClientIPRateThrottle):
+    scope = "login"
+
+
+class SendCodeRateThrottle(ClientIPRateThrottle):
+    scope = "send_code"
+
+
+class AvailabilityRateThrottle(ClientIPRateThrottle):
+    scope = "availability"
+
+
+class PostCreateRateThrottle(RedisSlidingWindowMixin, throttling.UserRateThrottle):
+    scope = "post_create"
+
+
+class TransformRenderRateThrottle(ClientIPRateThrottle):
+    """
+    Limits how many uncached image variants a client can have rendered.
+    """
+
+    scope = "media_transform"
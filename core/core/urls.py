@@ -15,8 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from aplications.media.views import serve_media
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path, re_path
 from drf_yasg import openapi
@@ -47,4 +47,7 @@ urlpatterns = [
     path("api/v1/auth/", include("aplications.authentication.urls")),
     path("api/v1/posts/", include("aplications.posts.urls")),
     path("api/v1/users/", include("aplications.users.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("api/v1/media/", include("aplications.media.urls")),
+    path("api/v1/sync/", include("aplications.sync.urls")),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", serve_media, name="media-file"),
+]
@@ -0,0 +1,16 @@
+"""
+Helpers for running Django code inside ``concurrent.futures`` process pools.
+"""
+
+import os
+
+import django
+
+
+def init_django_worker(settings_module):
+    """
+    Pool initializer: configures Django in the worker process. Needed when the
+    pool uses the ``spawn`` start method; harmless with ``fork``.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
@@ -30,6 +30,7 @@ environ.Env.read_env(os.path.join(BASE_DIR.parent, ".env"))
 
 DEFAULT_APPS = [
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -37,7 +38,13 @@ DEFAULT_APPS = [
     "django.contrib.staticfiles",
 ]
 
-LOCAL_APPS = ["aplications.authentication", "aplications.posts", "aplications.users"]
+LOCAL_APPS = [
+    "aplications.authentication",
+    "aplications.posts",
+    "aplications.users",
+    "aplications.media",
+    "aplications.sync",
+]
 
 THIRD_PARTY_APPS = [
     "rest_framework",
@@ -99,12 +106,117 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "aplications.posts.serializers.SocialMediaCursorPagination",
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "core.throttling.RedisAnonRateThrottle",
+        "core.throttling.RedisUserRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "1000/day",
+        "login": "10/min",
+        "send_code": "5/hour",
+        "availability": "60/min",
+        "post_create": "30/hour",
+        "media_transform": "120/hour",
+    },
 }
 
+# Redis (throttling). Sin REDIS_URL se usa la caché local de cada proceso.
+REDIS_URL = env("REDIS_URL", default=None)
+REDIS_SOCKET_TIMEOUT = 0.5  # segundos
+REDIS_RETRY_INTERVAL = 30  # segundos sin intentar reconectar tras un fallo
+
+# Caché (core.cache). "default" es Redis si hay REDIS_URL; "local" es la caché
+# de cada proceso, usada como respaldo cuando Redis no responde.
+LOCAL_CACHE = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "rootnet-local",
+    "OPTIONS": {"MAX_ENTRIES": 10_000},
+}
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "rootnet",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "SOCKET_CONNECT_TIMEOUT": REDIS_SOCKET_TIMEOUT,
+                "SOCKET_TIMEOUT": REDIS_SOCKET_TIMEOUT,
+            },
+        },
+        "local": LOCAL_CACHE,
+    }
+else:
+    CACHES = {"default": LOCAL_CACHE, "local": LOCAL_CACHE}
+CACHE_LOCK_TIMEOUT = 5  # segundos que un proceso puede tardar en recalcular un valor
+CACHE_STATS_INTERVAL = 60  # segundos entre envíos de los contadores de aciertos
+CACHE_NEAR_MAX_ENTRIES = 1000  # entradas por namespace en la caché de cada proceso
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"  # canal pub/sub de Redis
+CACHE_VERSION_TIMEOUT = 8 * 24 * 3600  # segundos; más que el timeout de cualquier namespace
+ORM_CACHE_TIMEOUT = 600  # segundos, consultas con .cache() (core.querycache)
+ORM_CACHE_NEAR_TIMEOUT = 5  # segundos en la memoria de cada proceso
+HTTP_VALIDATOR_TIMEOUT = 7 * 24 * 3600  # segundos que se guardan los ETag
+FEED_CACHE_TIMEOUT = 60  # segundos
+POST_LIST_CACHE_TIMEOUT = 300  # segundos, páginas de ids por autor y etiqueta
+ENTITY_CACHE_TIMEOUT = 3600  # segundos; cada escritura borra su propia entrada
+POST_RECORD_PENDING_TIMEOUT = 10  # segundos, con la imagen aún en el pipeline
+COMMENTS_CACHE_TIMEOUT = 300  # segundos
+
+# Filtro Bloom para comprobar disponibilidad de username/email en el registro
+AVAILABILITY_FILTER_ERROR_RATE = 0.01
+AVAILABILITY_FILTER_MIN_CAPACITY = 10_000
+AVAILABILITY_FILTER_REBUILD_INTERVAL = 600  # segundos
+
+# Autocompletado de usernames (índice en memoria por proceso)
+USER_AUTOCOMPLETE_SIZE = 50_000  # usuarios con más seguidores indexados
+USER_AUTOCOMPLETE_REFRESH = 300  # segundos
+
+# Cabecera del perfil público en la caché de Django (aplications.users)
+PROFILE_HEADER_TIMEOUT = 3600  # segundos; los cambios la invalidan antes
+PROFILE_HEADER_PENDING_TIMEOUT = 10  # segundos, con la foto aún en el pipeline
+PROFILE_HEADER_NEAR_TIMEOUT = 5  # segundos en la memoria de cada proceso
+
+# Hilos (cada uno con su conexión) para las consultas en paralelo de las
+# vistas async (core.async_views)
+ASYNC_QUERY_WORKERS = env.int("ASYNC_QUERY_WORKERS", default=8)
+
+# Búsqueda de publicaciones (configuración de texto de Postgres)
+POST_SEARCH_CONFIG = "spanish"
+
+# Etiquetas en tendencia
+TRENDING_TAGS_HALF_LIFE = 6 * 3600  # segundos en que un uso pierde la mitad de peso
+TRENDING_TAGS_BUCKET = 300  # segundos por intervalo de agregación
+TRENDING_TAGS_TOP_K = 50
+TRENDING_TAGS_MIN_SCORE = 0.01  # peso actual por debajo del cual un proceso olvida una etiqueta
+TRENDING_TAGS_LOCAL_MAX = 100_000  # etiquetas que guarda como mucho cada proceso sin Redis
+TRENDING_TAGS_CACHE_TIMEOUT = 10  # segundos que se reutiliza el ranking calculado
+
+# Caché por proceso de nombre de etiqueta -> id
+TAG_ID_CACHE_SIZE = 10_000
+
+# Autocompletado de etiquetas (índice en memoria por proceso)
+TAG_AUTOCOMPLETE_SIZE = 100_000  # etiquetas más usadas indexadas
+TAG_AUTOCOMPLETE_REFRESH = 1800  # segundos entre reconstrucciones completas
+
+# Sincronización incremental de los clientes (aplications.sync)
+SYNC_RETENTION = 7 * 24 * 3600  # segundos que se conserva el registro de cambios
+SYNC_SETTLE_SECONDS = 5  # segundos tras los que una fila ya no puede tener huecos delante
+SYNC_PAGE_SIZE = 500  # filas del registro leídas por petición
+
+# Eventos en directo por SSE (core.events, /api/v1/sync/events/)
+EVENTS_CHANNEL = "events"  # canal pub/sub de Redis entre procesos
+EVENTS_QUEUE_SIZE = 100  # eventos pendientes por conexión antes de descartarla
+EVENTS_KEEPALIVE = 15  # segundos sin eventos antes de enviar un keep-alive
+EVENTS_RETRY_MS = 5000  # milisegundos que espera el cliente para reconectar
+EVENTS_STATS_INTERVAL = 30  # segundos entre informes de conexiones de cada proceso
+EVENTS_STATS_KEY = "events:stats"
+EVENTS_MAX_WATCHED_POSTS = 20  # publicaciones cuyos comentarios sigue un stream
+
+# Tareas de mantenimiento (manage.py run_maintenance)
+MAINTENANCE_BATCH_SIZE = 500  # filas borradas por transacción
+MAINTENANCE_BATCH_PAUSE = 0.05  # segundos entre lotes
+USED_CODE_RETENTION = 3600  # segundos que se conserva un código ya validado
+
 
 # Configuración de JWT
 SIMPLE_JWT = {
@@ -179,6 +291,42 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static/")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Los ficheros subidos se guardan por hash de contenido (aplications.media)
+STORAGES = {
+    "default": {"BACKEND": "aplications.media.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+MEDIA_BLOB_GRACE = 600  # segundos antes de borrar un fichero subido sin referencias
+
+# Entrega de media: "nginx" (X-Accel-Redirect), "xsendfile" (X-Sendfile) o
+# vacío para que la sirva el servidor WSGI.
+MEDIA_SENDFILE_BACKEND = env("MEDIA_SENDFILE_BACKEND", default=None)
+MEDIA_SENDFILE_PREFIX = "/protected-media/"  # location internal de nginx
+MEDIA_CACHE_MAX_AGE = 3600  # segundos, ficheros no direccionados por contenido
+
+# Pipeline de imágenes (aplications.media)
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024  # bytes
+IMAGE_MAX_PIXELS = 40_000_000  # ancho x alto máximo aceptado
+IMAGE_ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ("webp", "jpeg")
+IMAGE_VARIANT_QUALITY = 82
+IMAGE_PIPELINE_WORKERS = env.int("IMAGE_PIPELINE_WORKERS", default=2)  # 0: en el propio proceso
+
+# Redimensionado bajo demanda en /api/v1/media/transform/ (aplications.media)
+MEDIA_TRANSFORM_SIZES = (64, 128, 256, 320, 480, 640, 960, 1280, 1920)
+MEDIA_TRANSFORM_FORMATS = ("webp", "jpeg")
+MEDIA_TRANSFORM_CACHE_DIR = "cache/transforms"  # relativo a MEDIA_ROOT
+MEDIA_TRANSFORM_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Subidas por partes (aplications.media)
+UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, "uploads_tmp")
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # tamaño de parte recomendado al cliente
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024  # bytes máximos por PUT
+UPLOAD_TEMP_MAX_BYTES = 2 * 1024 * 1024 * 1024  # reservado entre todas las sesiones
+UPLOAD_MAX_SESSIONS_PER_USER = 5
+UPLOAD_SESSION_TTL = 24 * 3600  # segundos sin recibir partes antes de borrarla
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 